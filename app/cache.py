@@ -0,0 +1,66 @@
+import os
+import threading
+from cachetools import TLRUCache
+
+# Durée de vie par défaut des compteurs en cache (secondes)
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+# Préfixe des entrées invalidées à chaque écriture sur familles / membres
+PREFIXE_COMPTEURS = "compteurs:"
+
+# Utilisateurs authentifiés (voir routers/auth.py), invalidés à la suppression d'un compte
+PREFIXE_UTILISATEURS = "utilisateurs:"
+
+
+class MemoryBackend:
+    """Cache local au processus ; chaque entrée porte sa propre durée de vie"""
+
+    def __init__(self, maxsize: int = 1024):
+        self._cache = TLRUCache(maxsize=maxsize, ttu=lambda cle, valeur, maintenant: maintenant + valeur[1])
+        self._lock = threading.Lock()
+
+    def get(self, cle: str):
+        with self._lock:
+            entree = self._cache.get(cle)
+        return entree[0] if entree else None
+
+    def set(self, cle: str, valeur, ttl: int):
+        with self._lock:
+            self._cache[cle] = (valeur, ttl)
+
+    def delete_prefix(self, prefixe: str):
+        with self._lock:
+            for cle in [c for c in self._cache.keys() if c.startswith(prefixe)]:
+                self._cache.pop(cle, None)
+
+
+# Remplaçable par tout objet exposant get / set / delete_prefix (ex. un client Redis)
+backend = MemoryBackend()
+
+
+def set_backend(nouveau_backend):
+    global backend
+    backend = nouveau_backend
+
+
+def cached(cle: str, calcul, ttl: int = CACHE_TTL_SECONDS):
+    """Retourne la valeur en cache, ou la calcule avec `calcul()` et la met en cache"""
+    valeur = backend.get(cle)
+    if valeur is None:
+        valeur = calcul()
+        backend.set(cle, valeur, ttl)
+    return valeur
+
+
+def invalider(prefixe: str):
+    backend.delete_prefix(prefixe)
+
+
+def invalider_compteurs():
+    """À appeler après toute création, modification ou suppression de famille ou de membre"""
+    invalider(PREFIXE_COMPTEURS)
+
+
+def invalider_utilisateur(username: str):
+    """À appeler après toute modification ou suppression d'un utilisateur"""
+    invalider(f"{PREFIXE_UTILISATEURS}{username}:")
@@ -1,6 +1,18 @@
-from sqlalchemy.orm import Session
+import time
+import base64
+import logging
+import datetime
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session, joinedload, selectinload
 from app import models, schemas
-from app.security import get_password_hash, verify_password
+from starlette.concurrency import run_in_threadpool
+from app.security import get_password_hash, verify_and_update, verify_and_update_async
+from app.utils.identite import cle_identite, normaliser_date, annee_naissance
+from app.utils.geo import bbox, point_dans_zone
+from app.cache import invalider_compteurs, invalider_utilisateur
+from app.deltas import CHAMPS_MEMBRE, enregistrer_delta, valeurs_membre
+
+logger = logging.getLogger(__name__)
 
 # --- Utilisateurs ---
 def create_utilisateur(db: Session, utilisateur: schemas.UtilisateurCreate):
@@ -33,8 +45,10 @@ def get_utilisateur_by_id(db: Session, user_id: int):
 def delete_utilisateur(db: Session, user_id: int):
     db_user = get_utilisateur_by_id(db, user_id)
     if db_user:
+        username = db_user.username
         db.delete(db_user)
         db.commit()
+        invalider_utilisateur(username)
         return True
     return False
 
@@ -43,8 +57,34 @@ def authenticate_user(db: Session, username: str, password: str):
     user = db.query(models.Utilisateur).filter(models.Utilisateur.username == username).first()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valide, nouveau_hash = verify_and_update(password, user.hashed_password)
+    if not valide:
+        return None
+    if nouveau_hash:
+        # 🔐 Coût bcrypt modifié (BCRYPT_ROUNDS) : hash recalculé à la connexion
+        user.hashed_password = nouveau_hash
+        db.commit()
+    return user
+
+
+async def authenticate_user_async(db: Session, username: str, password: str):
+    """
+    Comme authenticate_user pour les routes async : bcrypt est calculé dans le pool de
+    processus (security.py), les threads ne servent qu'aux deux requêtes SQL.
+    Session synchrone : la connexion doit rester possible sans pilote async (SQLite).
+    """
+    user = await run_in_threadpool(
+        lambda: db.query(models.Utilisateur).filter(models.Utilisateur.username == username).first()
+    )
+    if not user:
+        return None
+    valide, nouveau_hash = await verify_and_update_async(password, user.hashed_password)
+    if not valide:
         return None
+    if nouveau_hash:
+        user.hashed_password = nouveau_hash
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, user)  # pas de rechargement implicite sur la boucle
     return user
 
 
@@ -72,12 +112,77 @@ def create_famille(db: Session, famille: schemas.FamilleCreate, current_user_id:
     )
     db.add(db_famille)
     db.commit()
+    invalider_compteurs()
     db.refresh(db_famille)
     return db_famille
 
 
-def list_familles(db: Session):
-    return db.query(models.Famille).all()
+# --- Pagination par curseur (keyset sur created_at, id) ---
+def encode_curseur(famille: models.Famille) -> str:
+    brut = f"{famille.created_at.isoformat()}|{famille.id}"
+    return base64.urlsafe_b64encode(brut.encode()).decode()
+
+
+def decode_curseur(curseur: str):
+    """Retourne (created_at, id) ; lève ValueError si le curseur est invalide"""
+    try:
+        brut = base64.urlsafe_b64decode(curseur.encode()).decode()
+        created_at, famille_id = brut.split("|")
+        return datetime.datetime.fromisoformat(created_at), int(famille_id)
+    except Exception as exc:
+        raise ValueError("Curseur invalide") from exc
+
+
+def list_familles(
+    db: Session,
+    province: str = None,
+    city: str = None,
+    district: str = None,
+    agent_id: int = None,
+    is_validated: bool = None,
+    curseur: str = None,
+    limit: int = 50,
+):
+    """
+    Retourne une page de familles (plus récentes d'abord) et le curseur de la page suivante.
+    Le coût d'une page est constant : on reprend après le dernier (created_at, id) vu
+    au lieu d'un OFFSET qui relirait toutes les lignes précédentes.
+    """
+    query = db.query(models.Famille).options(
+        joinedload(models.Famille.created_by).joinedload(models.Utilisateur.province),
+        selectinload(models.Famille.membres),
+    )
+
+    if province:
+        query = query.filter(func.lower(models.Famille.province) == province.lower())
+    if city:
+        query = query.filter(func.lower(models.Famille.city) == city.lower())
+    if district:
+        query = query.filter(func.lower(models.Famille.district) == district.lower())
+    if agent_id is not None:
+        query = query.filter(models.Famille.created_by_id == agent_id)
+    if is_validated is not None:
+        query = query.filter(models.Famille.is_validated == is_validated)
+
+    if curseur:
+        created_at, famille_id = decode_curseur(curseur)
+        query = query.filter(or_(
+            models.Famille.created_at < created_at,
+            and_(models.Famille.created_at == created_at, models.Famille.id < famille_id),
+        ))
+
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    familles = (
+        query.order_by(models.Famille.created_at.desc(), models.Famille.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    curseur_suivant = None
+    if len(familles) > limit:
+        familles = familles[:limit]
+        curseur_suivant = encode_curseur(familles[-1])
+    return familles, curseur_suivant
 
 
 def get_famille_by_id(db: Session, famille_id: int):
@@ -89,10 +194,74 @@ def delete_famille(db: Session, famille_id: int):
     if db_famille:
         db.delete(db_famille)
         db.commit()
+        invalider_compteurs()
         return True
     return False
 
 
+# Champs de la personne racine recopiés dans le membre "Personne cible"
+CHAMPS_PERSONNE = (
+    "first_name", "last_name", "date_of_birth", "gender", "nationality", "id_type",
+    "id_number", "place_of_birth", "province", "city", "district",
+)
+
+
+def bulk_create_familles(db: Session, familles: list[schemas.FamilleSync], current_user_id: int):
+    """
+    Insère un lot de familles (et leurs membres) en une seule transaction,
+    avec deux INSERT groupés au lieu de plusieurs commits par famille.
+    Retourne les identifiants créés, dans l'ordre du lot.
+    """
+    if not familles:
+        return []
+
+    # L'INSERT groupé ne déclenche pas les événements ORM : champs dérivés et numéro de changement posés ici
+    change = {"change_seq": models.prochain_change_seq(db.connection()), "updated_at": datetime.datetime.utcnow()}
+    lignes_familles = [
+        {
+            **f.model_dump(exclude={"client_id", "membres"}),
+            "birth_date": normaliser_date(f.date_of_birth),
+            "birth_year": annee_naissance(f.date_of_birth),
+            "created_by_id": current_user_id,
+            "is_validated": True,
+            "is_synced": False,
+            **change,
+        }
+        for f in familles
+    ]
+    famille_ids = db.scalars(
+        insert(models.Famille).returning(models.Famille.id, sort_by_parameter_order=True),
+        lignes_familles,
+    ).all()
+
+    lignes_membres = []
+    for famille_id, f in zip(famille_ids, familles):
+        # Même règle que le formulaire agent : la personne racine devient "Personne cible"
+        if f.first_name and f.last_name:
+            racine = {champ: getattr(f, champ) for champ in CHAMPS_PERSONNE}
+            lignes_membres.append({**racine, "role": "Personne cible", "famille_id": famille_id})
+        for m in f.membres:
+            lignes_membres.append({**m.model_dump(), "famille_id": famille_id})
+
+    for ligne in lignes_membres:
+        ligne.update(change)
+        ligne["identity_key"] = cle_identite(ligne["first_name"], ligne["last_name"], ligne["date_of_birth"])
+        ligne["birth_date"] = normaliser_date(ligne["date_of_birth"])
+        ligne["birth_year"] = annee_naissance(ligne["date_of_birth"])
+
+    if lignes_membres:
+        db.execute(insert(models.Membre), lignes_membres)
+    enregistrer_delta(
+        db,
+        familles=len(famille_ids),
+        membres_ajoutes=[valeurs_membre(l) for l in lignes_membres],
+    )
+
+    db.commit()
+    invalider_compteurs()
+    return famille_ids
+
+
 # --- Membres ---
 def add_member(db: Session, famille_id: int, membre: schemas.MembreCreate):
     db_membre = models.Membre(
@@ -112,6 +281,7 @@ def add_member(db: Session, famille_id: int, membre: schemas.MembreCreate):
     )
     db.add(db_membre)
     db.commit()
+    invalider_compteurs()
     db.refresh(db_membre)
     return db_membre
 
@@ -129,10 +299,152 @@ def delete_member(db: Session, membre_id: int):
     if db_membre:
         db.delete(db_membre)
         db.commit()
+        invalider_compteurs()
         return True
     return False
 
 
+# --- Doublons ---
+def requete_groupes_doublons(db: Session):
+    """Clés d'identité partagées par plusieurs membres (parcours de l'index sur identity_key)"""
+    return (
+        db.query(models.Membre.identity_key, func.count(models.Membre.id).label("nb"))
+        .filter(models.Membre.identity_key.isnot(None))
+        .group_by(models.Membre.identity_key)
+        .having(func.count(models.Membre.id) > 1)
+    )
+
+
+def _repointer_candidats(db: Session, correspondance):
+    """
+    Fait pointer les paires candidates des membres supprimés vers le survivant de leur groupe.
+    `correspondance` est une sous-requête (perdant_id, survivant_id).
+    """
+    ma, mb = correspondance.alias("ma"), correspondance.alias("mb")
+    candidats = db.execute(
+        select(
+            models.CandidatDoublon.id,
+            func.coalesce(ma.c.survivant_id, models.CandidatDoublon.membre_a_id).label("a"),
+            func.coalesce(mb.c.survivant_id, models.CandidatDoublon.membre_b_id).label("b"),
+        )
+        .outerjoin(ma, ma.c.perdant_id == models.CandidatDoublon.membre_a_id)
+        .outerjoin(mb, mb.c.perdant_id == models.CandidatDoublon.membre_b_id)
+        .where(or_(ma.c.perdant_id.isnot(None), mb.c.perdant_id.isnot(None)))
+    ).all()
+    if not candidats:
+        return 0, 0
+
+    repointes = {c.id for c in candidats}
+    survivants = {c.a for c in candidats} | {c.b for c in candidats}
+    existantes = set(db.execute(
+        select(models.CandidatDoublon.membre_a_id, models.CandidatDoublon.membre_b_id)
+        .where(
+            or_(models.CandidatDoublon.membre_a_id.in_(survivants), models.CandidatDoublon.membre_b_id.in_(survivants)),
+            models.CandidatDoublon.id.notin_(repointes),
+        )
+    ).all())
+
+    a_mettre_a_jour, a_supprimer = [], []
+    for c in candidats:
+        paire = (min(c.a, c.b), max(c.a, c.b))
+        if c.a == c.b or paire in existantes:
+            a_supprimer.append(c.id)  # paire interne au groupe, ou déjà connue pour le survivant
+        else:
+            existantes.add(paire)
+            a_mettre_a_jour.append({"id": c.id, "membre_a_id": paire[0], "membre_b_id": paire[1]})
+
+    if a_supprimer:
+        db.execute(delete(models.CandidatDoublon).where(models.CandidatDoublon.id.in_(a_supprimer)))
+    if a_mettre_a_jour:
+        db.execute(update(models.CandidatDoublon), a_mettre_a_jour)
+    return len(a_mettre_a_jour), len(a_supprimer)
+
+
+def resoudre_doublons(
+    db: Session,
+    province: str = None,
+    cle: str = None,
+    survivant: str = "ancien",
+    taille_lot: int = 500,
+):
+    """
+    Résout les groupes de doublons exacts (même identity_key) : un survivant par groupe
+    (le plus ancien ou le plus récent), les autres membres sont supprimés.
+    Traitement par lots de `taille_lot` groupes, un commit par lot : les verrous sur
+    membres restent courts et une exécution interrompue reprend là où elle s'est arrêtée.
+    """
+    filtres = [models.Membre.identity_key.isnot(None)]
+    if province:
+        filtres.append(func.lower(models.Membre.province) == province.lower())
+    if cle:
+        filtres.append(models.Membre.identity_key == cle)
+    ordre = models.Membre.id.asc() if survivant == "ancien" else models.Membre.id.desc()
+
+    rapport = {"lots": 0, "groupes": 0, "membres_supprimes": 0, "candidats_repointes": 0, "candidats_supprimes": 0}
+    apres = None
+    while True:
+        cles = select(models.Membre.identity_key).where(*filtres)
+        if apres is not None:
+            cles = cles.where(models.Membre.identity_key > apres)
+        cles = db.scalars(
+            cles.group_by(models.Membre.identity_key)
+            .having(func.count(models.Membre.id) > 1)
+            .order_by(models.Membre.identity_key)
+            .limit(taille_lot)
+        ).all()
+        if not cles:
+            break
+
+        classement = (
+            select(
+                models.Membre.id,
+                models.Membre.identity_key,
+                func.row_number().over(partition_by=models.Membre.identity_key, order_by=ordre).label("rang"),
+            )
+            .where(*filtres, models.Membre.identity_key.in_(cles))
+            .subquery()
+        )
+        survivants = classement.alias("survivants")
+        correspondance = (
+            select(classement.c.id.label("perdant_id"), survivants.c.id.label("survivant_id"))
+            .join(survivants, and_(survivants.c.identity_key == classement.c.identity_key, survivants.c.rang == 1))
+            .where(classement.c.rang > 1)
+            .subquery()
+        )
+
+        repointes, supprimes = _repointer_candidats(db, correspondance)
+        perdants = db.execute(
+            select(*[getattr(models.Membre, champ) for champ in CHAMPS_MEMBRE])
+            .where(models.Membre.id.in_(select(correspondance.c.perdant_id)))
+        ).all()
+        # DELETE groupé (sans événements ORM) : les familles concernées repartent vers les appareils
+        db.execute(
+            update(models.Famille)
+            .where(models.Famille.id.in_(
+                select(models.Membre.famille_id).where(models.Membre.id.in_(select(correspondance.c.perdant_id)))
+            ))
+            .values(change_seq=models.prochain_change_seq(db.connection()), updated_at=datetime.datetime.utcnow()),
+            execution_options={"synchronize_session": False},
+        )
+        resultat = db.execute(
+            delete(models.Membre).where(models.Membre.id.in_(select(correspondance.c.perdant_id))),
+            execution_options={"synchronize_session": False},
+        )
+        enregistrer_delta(db, membres_supprimes=[tuple(p) for p in perdants])
+        db.commit()
+
+        rapport["lots"] += 1
+        rapport["groupes"] += len(cles)
+        rapport["membres_supprimes"] += resultat.rowcount
+        rapport["candidats_repointes"] += repointes
+        rapport["candidats_supprimes"] += supprimes
+        apres = cles[-1]
+
+    if rapport["membres_supprimes"]:
+        invalider_compteurs()
+    return rapport
+
+
 # --- Synchronisation ---
 def get_pending_records(db: Session, user_id: int):
     """Retourne les familles non synchronisées pour un utilisateur donné"""
@@ -142,10 +454,179 @@ def get_pending_records(db: Session, user_id: int):
     ).all()
 
 
-def force_synchronisation(db: Session, user_id: int):
-    """Marque comme synchronisées toutes les familles en attente de l'utilisateur"""
-    pending = get_pending_records(db, user_id)
-    for record in pending:
-        record.is_synced = True
+def force_synchronisation(
+    db: Session,
+    agent_id: int = None,
+    zone: dict = None,
+    apres_id: int = 0,
+    taille_lot: int = 1000,
+    duree_max: float = None,
+):
+    """
+    Marque comme synchronisées les familles en attente, par lots de `taille_lot` :
+    un UPDATE ... RETURNING par lot (parcours de l'index partiel ix_familles_non_synchronisees)
+    et un commit par lot, les verrous ne durent que le temps d'un lot.
+
+    Périmètre : familles de `agent_id` et/ou situées dans `zone` (GeoJSON) ; sans filtre, toutes.
+    Reprise : les lots déjà validés ne sont plus en attente, relancer suffit ; `apres_id`
+    (rapport["dernier_id"]) évite de reparcourir les familles hors zone déjà examinées.
+    `duree_max` (secondes) rend la main avant la fin avec rapport["termine"] = False.
+    """
+    debut = time.monotonic()
+    filtres = [models.Famille.is_synced == False]
+    if agent_id is not None:
+        filtres.append(models.Famille.created_by_id == agent_id)
+    emprise = bbox(zone) if zone else None
+    if zone:
+        if emprise is None:
+            return {"lots": 0, "familles": 0, "dernier_id": apres_id, "termine": True}
+        lon_min, lat_min, lon_max, lat_max = emprise
+        filtres += [models.Famille.longitude.between(lon_min, lon_max), models.Famille.latitude.between(lat_min, lat_max)]
+
+    rapport = {"lots": 0, "familles": 0, "dernier_id": apres_id, "termine": False}
+    while True:
+        lot = select(models.Famille.id).where(*filtres, models.Famille.id > rapport["dernier_id"])
+        if zone:
+            # Zone : test exact (point dans le polygone) sur les candidats de l'emprise
+            candidats = db.execute(
+                lot.add_columns(models.Famille.longitude, models.Famille.latitude)
+                .order_by(models.Famille.id).limit(taille_lot)
+            ).all()
+            if not candidats:
+                rapport["termine"] = True
+                break
+            rapport["dernier_id"] = candidats[-1].id
+            ids = [c.id for c in candidats if point_dans_zone(c.longitude, c.latitude, zone)]
+        else:
+            ids = lot.order_by(models.Famille.id).limit(taille_lot).scalar_subquery()
+
+        marques = db.scalars(
+            update(models.Famille)
+            .where(models.Famille.id.in_(ids), models.Famille.is_synced == False)
+            .values(is_synced=True)
+            .returning(models.Famille.id),
+            execution_options={"synchronize_session": False},
+        ).all()
+        db.commit()
+
+        if not zone:
+            if not marques:
+                rapport["termine"] = True
+                break
+            rapport["dernier_id"] = max(marques)
+        rapport["lots"] += 1
+        rapport["familles"] += len(marques)
+        logger.info("Synchronisation forcée : lot %s, %s familles (jusqu'à l'id %s)",
+                    rapport["lots"], len(marques), rapport["dernier_id"])
+        if duree_max is not None and time.monotonic() - debut >= duree_max:
+            break
+    return rapport
+
+
+# --- Synchronisation différentielle (flux de changements) ---
+# Rôles qui reçoivent toutes les familles ; les autres : les leurs et celles de leurs zones
+ROLES_SYNC_GLOBALE = ("super_admin", "super_utilisateur")
+# Curseur "tout le numéro de changement a été transmis"
+ID_MAX = 2**31 - 1
+
+
+def encode_curseur_sync(change_seq: int, famille_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{change_seq}|{famille_id}".encode()).decode()
+
+
+def decode_curseur_sync(curseur: str):
+    """Retourne (change_seq, famille_id) ; lève ValueError si le curseur est invalide"""
+    try:
+        change_seq, famille_id = base64.urlsafe_b64decode(curseur.encode()).decode().split("|")
+        return int(change_seq), int(famille_id)
+    except Exception as exc:
+        raise ValueError("Curseur invalide") from exc
+
+
+def _zones_sync(db: Session, utilisateur: models.Utilisateur):
+    """GeoJSON des zones de l'utilisateur, ou None s'il reçoit tout (ROLES_SYNC_GLOBALE)"""
+    if utilisateur.role in ROLES_SYNC_GLOBALE:
+        return None
+    return [z.geometrie for z in db.query(models.Zone).filter(models.Zone.utilisateur_id == utilisateur.id)]
+
+
+def _filtre_perimetre(modele, utilisateur_id: int, zones: list):
+    """Filtre SQL large : lignes de l'agent, ou dans l'emprise (rectangle) d'une de ses zones"""
+    conditions = [modele.created_by_id == utilisateur_id]
+    for lon_min, lat_min, lon_max, lat_max in filter(None, map(bbox, zones)):
+        conditions.append(and_(
+            modele.longitude.between(lon_min, lon_max),
+            modele.latitude.between(lat_min, lat_max),
+        ))
+    return or_(*conditions)
+
+
+def _dans_perimetre(ligne, utilisateur_id: int, zones: list) -> bool:
+    """Test exact (point dans le polygone), pour écarter les faux positifs de l'emprise"""
+    return ligne.created_by_id == utilisateur_id or any(
+        point_dans_zone(ligne.longitude, ligne.latitude, zone) for zone in zones
+    )
+
+
+def lire_curseur_sync(db: Session, utilisateur_id: int, appareil: str):
+    curseur = db.get(models.CurseurSync, (utilisateur_id, appareil))
+    return (curseur.change_seq, curseur.famille_id) if curseur else (0, 0)
+
+
+def changements_depuis(db: Session, utilisateur: models.Utilisateur, change_seq: int, famille_id: int, limit: int = 200):
+    """
+    Familles (avec leurs membres) et suppressions postérieures au curseur (change_seq, famille_id),
+    dans le périmètre de l'utilisateur. Retourne (familles, ids supprimés, curseur suivant, a_suivre).
+
+    Seuls les numéros dont toutes les transactions sont terminées sont lus : voir models.change_seq_visible.
+    """
+    borne = models.change_seq_visible(db.connection())
+    zones = _zones_sync(db, utilisateur)
+
+    query = db.query(models.Famille).options(selectinload(models.Famille.membres)).filter(
+        models.Famille.change_seq <= borne,
+        or_(
+            models.Famille.change_seq > change_seq,
+            and_(models.Famille.change_seq == change_seq, models.Famille.id > famille_id),
+        ),
+    )
+    if zones is not None:
+        query = query.filter(_filtre_perimetre(models.Famille, utilisateur.id, zones))
+    # Une ligne de plus pour savoir s'il existe une page suivante
+    familles = query.order_by(models.Famille.change_seq, models.Famille.id).limit(limit + 1).all()
+
+    a_suivre = len(familles) > limit
+    if a_suivre:
+        familles = familles[:limit]
+        # Page pleine : suppressions jusqu'au numéro de la dernière famille transmise
+        borne = familles[-1].change_seq
+        curseur_suivant = (familles[-1].change_seq, familles[-1].id)
+    else:
+        # Tout ce qui est validé jusqu'à `borne` a été transmis
+        curseur_suivant = (borne, ID_MAX) if borne >= change_seq else (change_seq, famille_id)
+
+    suppressions = db.query(models.SuppressionSync).filter(
+        models.SuppressionSync.change_seq > change_seq,
+        models.SuppressionSync.change_seq <= borne,
+    )
+    if zones is not None:
+        suppressions = suppressions.filter(_filtre_perimetre(models.SuppressionSync, utilisateur.id, zones))
+    suppressions = suppressions.order_by(models.SuppressionSync.change_seq).all()
+
+    if zones is not None:
+        familles = [f for f in familles if _dans_perimetre(f, utilisateur.id, zones)]
+        suppressions = [s for s in suppressions if _dans_perimetre(s, utilisateur.id, zones)]
+    return familles, [s.famille_id for s in suppressions], curseur_suivant, a_suivre
+
+
+def acquitter_curseur_sync(db: Session, utilisateur_id: int, appareil: str, change_seq: int, famille_id: int):
+    """Enregistre le curseur appliqué par l'appareil (jamais de retour en arrière)"""
+    curseur = db.get(models.CurseurSync, (utilisateur_id, appareil))
+    if curseur is None:
+        curseur = models.CurseurSync(utilisateur_id=utilisateur_id, appareil=appareil, change_seq=0, famille_id=0)
+        db.add(curseur)
+    if (change_seq, famille_id) > (curseur.change_seq, curseur.famille_id):
+        curseur.change_seq, curseur.famille_id = change_seq, famille_id
+        curseur.updated_at = datetime.datetime.utcnow()
     db.commit()
-    return len(pending)
+    return curseur
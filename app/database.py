@@ -1,18 +1,79 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os
 from dotenv import load_dotenv
+from app.metrics import instrumenter_engine
+from app import slow_queries
 
 # Charger les variables d'environnement
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Réplique en lecture seule (optionnelle) pour les pages de consultation
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+# ⚙️ Pool de connexions (par worker : prévoir workers × (taille + débordement) ≤ max_connections)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))          # attente d'une connexion libre (s)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # renouvelle avant la coupure côté serveur (s)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 : pas de limite
+
+
+def options_moteur(url: str) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    backend = make_url(url).get_backend_name()
+    if backend != "sqlite":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if backend == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def creer_moteur(url: str):
+    moteur = create_engine(url, **options_moteur(url))
+    instrumenter_engine(moteur)  # 📊 nombre d'instructions SQL et temps en base par route (/metrics)
+    slow_queries.activer(moteur)  # 🐢 journal des requêtes lentes si SLOW_QUERY_MS est défini
+    return moteur
+
 
 # Créer le moteur SQLAlchemy
-engine = create_engine(DATABASE_URL)
+engine = creer_moteur(DATABASE_URL)
+# Sans réplique, les lectures passent par le moteur principal
+read_engine = creer_moteur(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
 
 # Créer la session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# ⚡ Moteur asynchrone pour les routes async : créé au premier usage,
+# psycopg 3 sur PostgreSQL, aiosqlite sur une base SQLite de développement ou de test
+_async_engine = None
+# expire_on_commit=False : pas de rechargement implicite (interdit en async) après un commit
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+
+def url_async(url: str):
+    url = make_url(url)
+    pilotes = {"postgresql": "postgresql+psycopg", "sqlite": "sqlite+aiosqlite"}
+    return url.set(drivername=pilotes.get(url.get_backend_name(), url.drivername))
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(url_async(DATABASE_URL), **options_moteur(DATABASE_URL))
+        instrumenter_engine(_async_engine.sync_engine)
+        slow_queries.activer(_async_engine.sync_engine)
+    return _async_engine
+
+
+async def fermer_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
 
 # Base pour les modèles
 Base = declarative_base()
@@ -24,3 +85,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dépendance asynchrone : les requêtes n'occupent ni la boucle d'événements ni un thread
+async def get_async_db():
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+# Dépendance pour les pages de consultation (statistiques, listes, doublons, carte) :
+# la réplique peut avoir quelques secondes de retard, ne jamais l'utiliser pour écrire
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
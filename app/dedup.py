@@ -0,0 +1,169 @@
+"""
+Détection approximative des doublons parmi les membres.
+
+Les personnes racines des familles sont déjà enregistrées comme membres
+"Personne cible" : elles sont donc couvertes par l'analyse des membres.
+
+1. Blocage : on ne compare que les membres qui partagent un code phonétique
+   (prénom+nom, dans n'importe quel ordre) ET la même province ou la même année de naissance.
+2. Score vectorisé (numpy) : similarité cosinus des bigrammes de caractères, en testant
+   aussi l'inversion prénom/nom, combinée à la concordance des dates de naissance.
+3. Les paires au-dessus du seuil sont enregistrées dans candidats_doublons.
+"""
+import datetime
+import zlib
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, delete, insert
+from sqlalchemy.orm import Session
+from app import models
+from app.database import SessionLocal
+from app.utils.identite import normaliser_nom, normaliser_date
+
+SEUIL_SCORE = 0.80
+POIDS_NOM, POIDS_DATE = 0.75, 0.25
+DIMENSION = 128           # taille des vecteurs de bigrammes (hachage)
+TAILLE_MAX_BLOC = 500     # au-delà, le bloc est trop peu discriminant pour être comparé
+LIGNES_PAR_LOT = 20000    # borne la mémoire : les vecteurs sont calculés lot par lot
+
+_SOUNDEX = {c: str(d) for d, lettres in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for c in lettres}
+
+
+def code_phonetique(nom: str) -> str:
+    """Soundex sur le nom normalisé : 'Mbah' et 'Mba' donnent le même code"""
+    lettres = [c for c in nom if c.isalpha()]
+    if not lettres:
+        return ""
+    code, precedent = lettres[0], _SOUNDEX.get(lettres[0], "")
+    for c in lettres[1:]:
+        chiffre = _SOUNDEX.get(c, "")
+        if chiffre and chiffre != "0" and chiffre != precedent:
+            code += chiffre
+        if c not in "hw":
+            precedent = chiffre
+    return (code + "000")[:4]
+
+
+def vecteurs_bigrammes(noms: pd.Series) -> np.ndarray:
+    """Matrice (n, DIMENSION) de bigrammes hachés, normalisée pour un produit scalaire = cosinus"""
+    matrice = np.zeros((len(noms), DIMENSION), dtype=np.float32)
+    for i, nom in enumerate(noms):
+        nom = f" {nom} "
+        for j in range(len(nom) - 1):
+            matrice[i, zlib.crc32(nom[j:j + 2].encode()) % DIMENSION] += 1
+    normes = np.linalg.norm(matrice, axis=1, keepdims=True)
+    return matrice / np.where(normes == 0, 1, normes)
+
+
+def charger_membres(db: Session) -> pd.DataFrame:
+    lignes = db.execute(select(
+        models.Membre.id, models.Membre.first_name, models.Membre.last_name,
+        models.Membre.date_of_birth, models.Membre.province,
+    )).all()
+    df = pd.DataFrame(lignes, columns=["id", "first_name", "last_name", "date_of_birth", "province"])
+    texte = ["first_name", "last_name", "date_of_birth", "province"]
+    df[texte] = df[texte].fillna("")
+
+    df["prenom"] = df["first_name"].map(normaliser_nom)
+    df["nom"] = df["last_name"].map(normaliser_nom)
+    dates = df["date_of_birth"].map(normaliser_date)
+    df["date"] = dates.map(lambda d: d.isoformat() if d else "")
+    df["annee"] = dates.map(lambda d: str(d.year) if d else "")
+    df["province"] = df["province"].map(normaliser_nom)
+
+    codes = [sorted((code_phonetique(p), code_phonetique(n))) for p, n in zip(df["prenom"], df["nom"])]
+    df["phonetique"] = ["-".join(c) for c in codes]
+    return df
+
+
+def generer_paires(df: pd.DataFrame) -> pd.DataFrame:
+    """Paires (a, b) d'indices de lignes partageant au moins une clé de blocage"""
+    paires = []
+    for colonne in ("province", "annee"):
+        blocs = df[df[colonne] != ""].assign(bloc=lambda d: d["phonetique"] + "|" + d[colonne])
+        tailles = blocs.groupby("bloc")["id"].transform("size")
+        blocs = blocs[(tailles > 1) & (tailles <= TAILLE_MAX_BLOC)]
+        fusion = blocs[["bloc"]].reset_index().merge(blocs[["bloc"]].reset_index(), on="bloc")
+        paires.append(fusion.loc[fusion["index_x"] < fusion["index_y"], ["index_x", "index_y"]])
+    return pd.concat(paires).drop_duplicates().rename(columns={"index_x": "a", "index_y": "b"})
+
+
+def scorer_paires(df: pd.DataFrame, paires: pd.DataFrame) -> pd.DataFrame:
+    """Scores vectorisés pour toutes les paires (calcul par lots de lignes)"""
+    resultats = []
+    paires = paires.sort_values("a")
+    for debut in range(0, len(paires), LIGNES_PAR_LOT):
+        lot = paires.iloc[debut:debut + LIGNES_PAR_LOT]
+        lignes = np.unique(np.concatenate([lot["a"].to_numpy(), lot["b"].to_numpy()]))
+        position = pd.Series(np.arange(len(lignes)), index=lignes)
+        ia, ib = position[lot["a"]].to_numpy(), position[lot["b"]].to_numpy()
+
+        prenoms = vecteurs_bigrammes(df["prenom"].to_numpy()[lignes])
+        noms = vecteurs_bigrammes(df["nom"].to_numpy()[lignes])
+
+        def sim(x, y):
+            return np.einsum("ij,ij->i", x, y)
+
+        direct = (sim(prenoms[ia], prenoms[ib]) + sim(noms[ia], noms[ib])) / 2
+        croise = (sim(prenoms[ia], noms[ib]) + sim(noms[ia], prenoms[ib])) / 2
+        score_nom = np.maximum(direct, croise)
+
+        date_a, date_b = df["date"].to_numpy()[lot["a"]], df["date"].to_numpy()[lot["b"]]
+        annee_a, annee_b = df["annee"].to_numpy()[lot["a"]], df["annee"].to_numpy()[lot["b"]]
+        score_date = np.select(
+            [(date_a == "") | (date_b == ""), date_a == date_b, annee_a == annee_b],
+            [0.5, 1.0, 0.6],
+            default=0.0,
+        )
+
+        resultats.append(pd.DataFrame({
+            "membre_a_id": df["id"].to_numpy()[lot["a"]],
+            "membre_b_id": df["id"].to_numpy()[lot["b"]],
+            "score_nom": score_nom,
+            "score_date": score_date,
+            "score": POIDS_NOM * score_nom + POIDS_DATE * score_date,
+        }))
+
+    if not resultats:
+        return pd.DataFrame(columns=["membre_a_id", "membre_b_id", "score_nom", "score_date", "score"])
+    return pd.concat(resultats)
+
+
+def analyser_doublons(db: Session, seuil: float = SEUIL_SCORE) -> int:
+    """Recalcule les paires candidates ; les paires déjà traitées (statut ≠ a_verifier) sont conservées"""
+    df = charger_membres(db)
+    scores = scorer_paires(df, generer_paires(df)) if len(df) > 1 else pd.DataFrame()
+    if len(scores):
+        scores = scores[scores["score"] >= seuil]
+        # Ordre canonique (plus petit id en premier) pour l'unicité des paires
+        a = np.minimum(scores["membre_a_id"], scores["membre_b_id"])
+        b = np.maximum(scores["membre_a_id"], scores["membre_b_id"])
+        scores = scores.assign(membre_a_id=a, membre_b_id=b)
+
+    db.execute(delete(models.CandidatDoublon).where(models.CandidatDoublon.statut == "a_verifier"))
+    deja_traitees = set(db.execute(select(models.CandidatDoublon.membre_a_id, models.CandidatDoublon.membre_b_id)).all())
+
+    maintenant = datetime.datetime.utcnow()
+    lignes = [
+        {
+            "membre_a_id": int(r.membre_a_id), "membre_b_id": int(r.membre_b_id),
+            "score": round(float(r.score), 4), "score_nom": round(float(r.score_nom), 4),
+            "score_date": float(r.score_date), "statut": "a_verifier", "created_at": maintenant,
+        }
+        for r in scores.itertuples()
+        if (int(r.membre_a_id), int(r.membre_b_id)) not in deja_traitees
+    ] if len(scores) else []
+
+    if lignes:
+        db.execute(insert(models.CandidatDoublon), lignes)
+    db.commit()
+    return len(lignes)
+
+
+def executer_analyse():
+    """Point d'entrée pour les tâches d'arrière-plan (session dédiée)"""
+    db = SessionLocal()
+    try:
+        return analyser_doublons(db)
+    finally:
+        db.close()
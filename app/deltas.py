@@ -0,0 +1,140 @@
+"""
+Variations des compteurs après chaque écriture qui crée, modifie ou supprime des familles,
+membres ou utilisateurs :
+
+- ajoutées à statistiques_variations dans la transaction de l'écriture (totaux, provinces,
+  villes, genres, rôles, naissances) : stats.lire_agregats les additionne aux agrégats, les
+  pages sont à jour sans attendre le prochain recalcul ;
+- publiées sur le bus après le commit (sujet "compteurs"), pour les tableaux de bord en direct :
+
+    {"familles": 1, "membres": 3, "libreville": 3, "doublons": 1, "provinces": {"Estuaire": 3}}
+
+Le nombre de groupes de doublons demande une requête : il n'est pas suivi dans les
+variations (recalculé par le planificateur), seulement dans les messages du bus, et
+uniquement quand un tableau de bord est abonné (voir tableau_de_bord.py).
+
+Les écritures ORM sont couvertes par le hook after_flush ; les INSERT / DELETE groupés
+(crud.bulk_create_familles, crud.resoudre_doublons) appellent enregistrer_delta eux-mêmes.
+Les clés à zéro sont omises.
+"""
+from collections import Counter
+from sqlalchemy import event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+from app import events, models
+
+SUJET = "compteurs"
+
+# Valeurs d'un membre passées à enregistrer_delta, dans cet ordre
+CHAMPS_MEMBRE = ("province", "city", "gender", "role", "birth_year", "identity_key")
+# Dimension des agrégats -> champ du membre (voir stats.DIMENSIONS)
+DIMENSIONS_MEMBRE = {"provinces": "province", "villes": "city", "genres": "gender", "roles": "role", "naissances": "birth_year"}
+
+
+def _est_libreville(city) -> bool:
+    return bool(city) and city.lower() == "libreville"
+
+
+def _doublons(connection, cles: Counter) -> int:
+    """
+    Variation du nombre de groupes de doublons (identity_key partagée par 2 membres ou plus),
+    à partir des effectifs après écriture et de la variation nette de chaque clé.
+    """
+    cles = {cle: n for cle, n in cles.items() if cle and n}
+    if not cles:
+        return 0
+    apres = dict(connection.execute(
+        select(models.Membre.identity_key, func.count())
+        .where(models.Membre.identity_key.in_(list(cles)))
+        .group_by(models.Membre.identity_key)
+    ).all())
+    variation = 0
+    for cle, net in cles.items():
+        nb_apres = apres.get(cle, 0)
+        variation += (nb_apres >= 2) - (nb_apres - net >= 2)
+    return variation
+
+
+def enregistrer_delta(session: Session, familles: int = 0, utilisateurs: int = 0, membres_ajoutes=(), membres_supprimes=()):
+    """
+    Enregistre les variations (statistiques_variations) et les met en attente de publication
+    au commit. membres_* : tuples de valeurs dans l'ordre de CHAMPS_MEMBRE.
+    À appeler après l'écriture, avant le commit.
+    """
+    variations = Counter({("totaux", "familles"): familles, ("totaux", "utilisateurs"): utilisateurs})
+    cles = Counter()
+    for signe, membres in ((1, membres_ajoutes), (-1, membres_supprimes)):
+        for membre in membres:
+            valeurs = dict(zip(CHAMPS_MEMBRE, membre))
+            variations[("totaux", "membres")] += signe
+            variations[("totaux", "libreville")] += signe * _est_libreville(valeurs["city"])
+            for dimension, champ in DIMENSIONS_MEMBRE.items():
+                if valeurs[champ] not in (None, ""):
+                    variations[(dimension, str(valeurs[champ]))] += signe
+            cles[valeurs["identity_key"]] += signe
+    variations = {cle: n for cle, n in variations.items() if n}
+
+    connection = session.connection()
+    if variations:
+        connection.execute(insert(models.VariationStatistique), [
+            {"dimension": dimension, "valeur": valeur, "variation": n}
+            for (dimension, valeur), n in variations.items()
+        ])
+
+    if not events.a_des_abonnes(SUJET):
+        return  # aucun tableau de bord en direct dans ce worker : pas de requête des doublons
+    donnees = {valeur: n for (dimension, valeur), n in variations.items() if dimension == "totaux"}
+    doublons = _doublons(connection, cles)
+    if doublons:
+        donnees["doublons"] = doublons
+    provinces = {valeur: n for (dimension, valeur), n in variations.items() if dimension == "provinces"}
+    if provinces:
+        donnees["provinces"] = provinces
+    if donnees:
+        events.publier_apres_commit(session, SUJET, donnees)
+
+
+def valeurs_membre(ligne: dict) -> tuple:
+    """Tuple CHAMPS_MEMBRE d'un membre inséré par INSERT groupé (dict de colonnes)"""
+    return tuple(ligne.get(champ) for champ in CHAMPS_MEMBRE)
+
+
+def _valeurs_membre(membre, avant: bool = False):
+    """Tuple CHAMPS_MEMBRE actuel, ou tel que chargé avant modification"""
+    etat = inspect(membre)
+    valeurs = []
+    for nom in CHAMPS_MEMBRE:
+        historique = etat.attrs[nom].history
+        if avant and historique.has_changes():
+            valeurs.append(historique.deleted[0] if historique.deleted else None)
+        else:
+            valeurs.append(getattr(membre, nom))
+    return tuple(valeurs)
+
+
+@event.listens_for(Session, "after_flush")
+def compter_flush(session, flush_context):
+    familles = utilisateurs = 0
+    ajoutes, supprimes = [], []
+    for objet in session.new:
+        if isinstance(objet, models.Famille):
+            familles += 1
+        elif isinstance(objet, models.Membre):
+            ajoutes.append(_valeurs_membre(objet))
+        elif isinstance(objet, models.Utilisateur):
+            utilisateurs += 1
+    for objet in session.deleted:
+        if isinstance(objet, models.Famille):
+            familles -= 1
+        elif isinstance(objet, models.Membre):
+            supprimes.append(_valeurs_membre(objet, avant=True))
+        elif isinstance(objet, models.Utilisateur):
+            utilisateurs -= 1
+    for objet in session.dirty:
+        if isinstance(objet, models.Membre) and objet not in session.deleted:
+            avant, apres = _valeurs_membre(objet, avant=True), _valeurs_membre(objet)
+            if avant != apres:
+                supprimes.append(avant)
+                ajoutes.append(apres)
+
+    if familles or utilisateurs or ajoutes or supprimes:
+        enregistrer_delta(session, familles, utilisateurs, ajoutes, supprimes)
@@ -0,0 +1,69 @@
+"""
+Bus d'événements interne au processus.
+
+    events.abonner("compteurs", fonction)          # fonction(donnees: dict)
+    events.publier("compteurs", {"familles": 1})
+    events.publier_apres_commit(session, "compteurs", {...})
+
+Les abonnés sont appelés dans le thread de l'émetteur (thread de requête, planificateur,
+boucle async) : ils doivent rendre la main tout de suite, sans I/O. Une erreur d'abonné
+est journalisée et n'interrompt pas l'écriture qui a publié.
+
+publier_apres_commit garde l'événement dans session.info jusqu'au commit : une
+transaction annulée ne publie rien.
+
+Chaque worker a son propre bus : un événement n'est vu que des clients connectés au
+même processus (les tableaux de bord se recalent sur les agrégats, voir tableau_de_bord.py).
+"""
+import logging
+import threading
+from collections import defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_abonnes = defaultdict(list)   # sujet -> [fonction]
+_lock = threading.Lock()
+CLE_SESSION = "evenements_a_publier"
+
+
+def abonner(sujet: str, fonction):
+    with _lock:
+        _abonnes[sujet].append(fonction)
+
+
+def desabonner(sujet: str, fonction):
+    with _lock:
+        if fonction in _abonnes[sujet]:
+            _abonnes[sujet].remove(fonction)
+
+
+def a_des_abonnes(sujet: str) -> bool:
+    """Permet à l'émetteur d'éviter de calculer un événement que personne n'écoute"""
+    return bool(_abonnes.get(sujet))
+
+
+def publier(sujet: str, donnees: dict):
+    with _lock:
+        fonctions = list(_abonnes[sujet])
+    for fonction in fonctions:
+        try:
+            fonction(donnees)
+        except Exception:
+            logger.exception("Abonné en erreur sur '%s'", sujet)
+
+
+def publier_apres_commit(session: Session, sujet: str, donnees: dict):
+    session.info.setdefault(CLE_SESSION, []).append((sujet, donnees))
+
+
+@event.listens_for(Session, "after_commit")
+def _publier_en_attente(session):
+    for sujet, donnees in session.info.pop(CLE_SESSION, []):
+        publier(sujet, donnees)
+
+
+@event.listens_for(Session, "after_rollback")
+def _oublier_en_attente(session):
+    session.info.pop(CLE_SESSION, None)
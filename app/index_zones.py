@@ -0,0 +1,211 @@
+"""
+Index spatial en mémoire des zones attribuées : « quelles zones contiennent ce point ? »,
+« quelles zones chevauchent celle-ci ? » sans relire ni analyser tout le GeoJSON.
+
+- Chaque zone est préparée une fois (coordonnées converties en float, emprise de chaque
+  polygone) ;
+- les emprises sont rangées dans un arbre STR (R-tree compacté par tranches) : une recherche
+  ne descend que dans les nœuds dont l'emprise couvre le point, puis le test exact
+  (point dans polygone) n'est fait que sur les quelques candidats ;
+- les écritures validées (bus, sujet "zones") s'ajoutent à une petite liste à part, parcourue
+  à chaque recherche ; l'arbre n'est reconstruit qu'au-delà de ZONES_INDEX_DELTA_MAX zones modifiées ;
+- chaque worker a son propre index : il est rechargé depuis la base toutes les
+  ZONES_INDEX_TTL_SECONDS pour rattraper les écritures des autres workers.
+"""
+import os
+import math
+import time
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import events, models
+from app.utils.geo import bbox, emprises_se_coupent, point_dans_polygone, polygones, polygones_se_chevauchent
+
+ZONES_INDEX_TTL_SECONDS = float(os.getenv("ZONES_INDEX_TTL_SECONDS", "300"))
+ZONES_INDEX_DELTA_MAX = int(os.getenv("ZONES_INDEX_DELTA_MAX", "64"))
+CAPACITE_NOEUD = 16
+SUJET = "zones"
+
+
+class ZonePreparee:
+    def __init__(self, zone_id: int, utilisateur_id: int, geometrie):
+        self.id = zone_id
+        self.utilisateur_id = utilisateur_id
+        self.emprise = bbox(geometrie)
+        self.polygones = []
+        for polygone in polygones(geometrie):
+            anneaux = [[(float(p[0]), float(p[1])) for p in anneau] for anneau in polygone if anneau]
+            if anneaux:
+                self.polygones.append((bbox({"type": "Polygon", "coordinates": anneaux}), anneaux))
+
+    def contient(self, lon: float, lat: float) -> bool:
+        return any(
+            emprise[0] <= lon <= emprise[2] and emprise[1] <= lat <= emprise[3]
+            and point_dans_polygone(lon, lat, anneaux)
+            for emprise, anneaux in self.polygones
+        )
+
+    def chevauche(self, autre: "ZonePreparee") -> bool:
+        return any(
+            emprises_se_coupent(emprise_a, emprise_b) and polygones_se_chevauchent(a, b)
+            for emprise_a, a in self.polygones
+            for emprise_b, b in autre.polygones
+        )
+
+
+class ArbreSTR:
+    """
+    R-tree statique rempli par Sort-Tile-Recursive : les entrées sont triées par longitude,
+    découpées en tranches verticales, puis triées par latitude dans chaque tranche et
+    regroupées par CAPACITE_NOEUD ; on recommence sur les nœuds obtenus jusqu'à la racine.
+    Nœud : (emprise, enfants, feuille).
+    """
+    def __init__(self, entrees, capacite: int = CAPACITE_NOEUD):
+        self.capacite = capacite
+        niveau = [(emprise, valeur, True) for emprise, valeur in entrees]
+        feuilles = True
+        while len(niveau) > capacite:
+            niveau = [(self._union(groupe), groupe, feuilles) for groupe in self._paquets(niveau)]
+            feuilles = False
+        self.racine = (self._union(niveau), niveau, feuilles) if niveau else None
+
+    def _paquets(self, noeuds):
+        nb_paquets = math.ceil(len(noeuds) / self.capacite)
+        par_tranche = math.ceil(math.sqrt(nb_paquets)) * self.capacite
+        noeuds = sorted(noeuds, key=lambda n: n[0][0] + n[0][2])
+        for debut in range(0, len(noeuds), par_tranche):
+            tranche = sorted(noeuds[debut:debut + par_tranche], key=lambda n: n[0][1] + n[0][3])
+            for i in range(0, len(tranche), self.capacite):
+                yield tranche[i:i + self.capacite]
+
+    @staticmethod
+    def _union(noeuds):
+        if not noeuds:
+            return None
+        return (
+            min(n[0][0] for n in noeuds), min(n[0][1] for n in noeuds),
+            max(n[0][2] for n in noeuds), max(n[0][3] for n in noeuds),
+        )
+
+    def chercher(self, emprise):
+        """Valeurs dont l'emprise coupe `emprise`"""
+        if self.racine is None:
+            return
+        pile = [self.racine]
+        while pile:
+            boite, enfants, feuilles = pile.pop()
+            if not emprises_se_coupent(boite, emprise):
+                continue
+            if feuilles:
+                for emprise_enfant, valeur, _ in enfants:
+                    if emprises_se_coupent(emprise_enfant, emprise):
+                        yield valeur
+            else:
+                pile.extend(enfants)
+
+
+class IndexZones:
+    def __init__(self, zones):
+        self.zones = {zone.id: zone for zone in zones if zone.emprise}
+        self._arbre = ArbreSTR([(zone.emprise, zone.id) for zone in self.zones.values()])
+        self._modifiees = set()   # zones ajoutées ou modifiées depuis la construction de l'arbre
+        self.charge_a = time.monotonic()
+
+    def appliquer(self, modifiees, supprimees):
+        for zone in modifiees:
+            if zone.emprise:
+                self.zones[zone.id] = zone
+                self._modifiees.add(zone.id)
+            else:
+                self.zones.pop(zone.id, None)
+        for zone_id in supprimees:
+            self.zones.pop(zone_id, None)
+        if len(self._modifiees) > ZONES_INDEX_DELTA_MAX:
+            self._arbre = ArbreSTR([(zone.emprise, zone.id) for zone in self.zones.values()])
+            self._modifiees = set()
+
+    def candidats(self, emprise):
+        ids = set(self._arbre.chercher(emprise))
+        # Entrées de l'arbre périmées (zone modifiée ou supprimée depuis) : emprise relue ici
+        ids |= {zone_id for zone_id in self._modifiees if zone_id in self.zones}
+        for zone_id in ids:
+            zone = self.zones.get(zone_id)
+            if zone is not None and emprises_se_coupent(zone.emprise, emprise):
+                yield zone
+
+    def contenant(self, lon: float, lat: float):
+        return sorted(
+            (zone for zone in self.candidats((lon, lat, lon, lat)) if zone.contient(lon, lat)),
+            key=lambda zone: zone.id,
+        )
+
+    def chevauchant(self, cible: ZonePreparee):
+        if not cible.emprise:
+            return []
+        return sorted(
+            (zone for zone in self.candidats(cible.emprise) if zone.id != cible.id and zone.chevauche(cible)),
+            key=lambda zone: zone.id,
+        )
+
+
+_index: IndexZones = None
+_lock = threading.Lock()
+
+
+def _charger(db: Session) -> IndexZones:
+    lignes = db.query(models.Zone.id, models.Zone.utilisateur_id, models.Zone.geometrie)
+    return IndexZones(ZonePreparee(*ligne) for ligne in lignes)
+
+
+def index(db: Session) -> IndexZones:
+    """Index courant ; (re)chargé depuis `db` au premier appel et après ZONES_INDEX_TTL_SECONDS"""
+    global _index
+    with _lock:
+        courant = _index
+    if courant is None or time.monotonic() - courant.charge_a > ZONES_INDEX_TTL_SECONDS:
+        courant = _charger(db)
+        with _lock:
+            _index = courant
+    return courant
+
+
+def zones_contenant(db: Session, lon: float, lat: float):
+    courant = index(db)
+    with _lock:
+        return courant.contenant(lon, lat)
+
+
+def zones_chevauchant(db: Session, zone: models.Zone):
+    cible = ZonePreparee(zone.id, zone.utilisateur_id, zone.geometrie)
+    courant = index(db)
+    with _lock:
+        return courant.chevauchant(cible)
+
+
+def oublier():
+    global _index
+    with _lock:
+        _index = None
+
+
+# --- Mise à jour incrémentale : écritures ORM sur les zones, appliquées après commit ---
+@event.listens_for(Session, "after_flush")
+def suivre_zones(session, flush_context):
+    modifiees = [
+        (zone.id, zone.utilisateur_id, zone.geometrie)
+        for zone in list(session.new) + list(session.dirty)
+        if isinstance(zone, models.Zone) and zone not in session.deleted
+    ]
+    supprimees = [zone.id for zone in session.deleted if isinstance(zone, models.Zone)]
+    if modifiees or supprimees:
+        events.publier_apres_commit(session, SUJET, {"modifiees": modifiees, "supprimees": supprimees})
+
+
+def _recevoir_zones(donnees: dict):
+    modifiees = [ZonePreparee(*zone) for zone in donnees["modifiees"]]
+    with _lock:
+        if _index is not None:
+            _index.appliquer(modifiees, donnees["supprimees"])
+
+
+events.abonner(SUJET, _recevoir_zones)
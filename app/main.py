@@ -16,13 +16,19 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 
-from app.database import Base, engine, SessionLocal
+from app.database import SessionLocal, fermer_async_engine
 from app.routers import familles, utilisateurs, statistiques, pages, auth, admin, doublons, zones
 from app import models, schemas, crud
 from app.routers import attribution
+from app.routers import sync, photos, metrics
+from app.metrics import MetricsMiddleware
+from app.utils.images import arreter_pool
+from app import security, sync_status, tableau_de_bord
+from app import scheduler
 
 # 📦 Initialisation de l'application
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)  # 📊 latence et SQL par route, exposés sur /metrics
 templates = Jinja2Templates(directory="app/templates")
 
 from fastapi.responses import FileResponse
@@ -51,6 +57,15 @@ async def custom_http_exception_handler(request: Request, exc: StarletteHTTPExce
         )
     return PlainTextResponse(f"Erreur {exc.status_code} : {exc.detail}", status_code=exc.status_code)
 
+# ⏳ File de hachage des mots de passe pleine (pic de connexions) : réessayer plus tard
+@app.exception_handler(security.HachageSature)
+async def hachage_sature_handler(request: Request, exc: security.HachageSature):
+    return PlainTextResponse(
+        "Erreur 503 : serveur occupé, réessayez dans quelques secondes",
+        status_code=503,
+        headers={"Retry-After": str(security.HASH_RETRY_AFTER_SECONDS)},
+    )
+
 # 📁 Fichiers statiques
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -66,11 +81,43 @@ app.include_router(auth.router)
 app.include_router(admin.router)
 app.include_router(doublons.router)
 app.include_router(attribution.router)
+app.include_router(sync.router)
+app.include_router(photos.router)
+app.include_router(metrics.router)
 app.include_router(zones.router_html)
 app.include_router(zones.router_api)
 
-# 🗃️ Création des tables de la base de données
-Base.metadata.create_all(bind=engine)
+# ⏱️ Tâches planifiées (agrégats statistiques)
+@app.on_event("startup")
+def startup_scheduler():
+    scheduler.demarrer()
+
+@app.on_event("shutdown")
+def shutdown_scheduler():
+    scheduler.arreter()
+
+# 🖼️ Arrêt du pool de génération des miniatures
+@app.on_event("shutdown")
+def shutdown_images():
+    arreter_pool()
+
+# 📡 Arrêt des flux SSE (état de synchronisation, tableau de bord)
+@app.on_event("shutdown")
+def shutdown_sync_status():
+    sync_status.arreter()
+    tableau_de_bord.arreter()
+
+# 🔐 Arrêt du pool de hachage des mots de passe
+@app.on_event("shutdown")
+def shutdown_hachage():
+    security.arreter_pool()
+
+# ⚡ Fermeture des connexions du moteur asynchrone
+@app.on_event("shutdown")
+async def shutdown_async_engine():
+    await fermer_async_engine()
+
+# 🗃️ Le schéma est géré par les migrations Alembic : `alembic upgrade head` avant le démarrage
 
 # 👤 Création automatique du super utilisateur
 def init_super_user():
@@ -0,0 +1,196 @@
+"""
+Métriques par route (format Prometheus, exposées sur /metrics).
+
+- MetricsMiddleware (ASGI pur) : nombre de requêtes, histogramme de latence,
+  nombre d'instructions SQL et temps passé en base, par méthode + gabarit de route
+  ("/familles/{famille_id}" et non l'URL réelle, pour borner le nombre de séries).
+- instrumenter_engine(engine) : compte les instructions SQL exécutées pendant la requête
+  courante (contextvar, propagée aux routes synchrones exécutées dans le pool de threads).
+
+Les compteurs sont propres à chaque processus : avec plusieurs workers, Prometheus
+agrège les cibles.
+"""
+import time
+import threading
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Bornes de l'histogramme de latence (secondes)
+BORNES_LATENCE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MesureRequete:
+    """Compteurs SQL de la requête en cours (scope ASGI gardé pour retrouver la route, voir slow_queries.py)"""
+    __slots__ = ("nb_sql", "duree_sql", "scope")
+
+    def __init__(self, scope=None):
+        self.nb_sql = 0
+        self.duree_sql = 0.0
+        self.scope = scope
+
+
+class StatsRoute:
+    __slots__ = ("requetes", "erreurs", "buckets", "somme_latence", "nb_sql", "duree_sql")
+
+    def __init__(self):
+        self.requetes = 0
+        self.erreurs = 0              # réponses 5xx
+        self.buckets = [0] * len(BORNES_LATENCE)
+        self.somme_latence = 0.0
+        self.nb_sql = 0
+        self.duree_sql = 0.0
+
+
+mesure_courante: ContextVar = ContextVar("mesure_courante", default=None)
+
+_stats: dict = {}                     # (méthode, route) -> StatsRoute
+_lock = threading.Lock()
+_sql_hors_requete = MesureRequete()   # tâches planifiées, scripts, démarrage
+
+
+def gabarit_route(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None:
+        # Application montée (/static, /uploads)
+        return f"{scope.get('root_path', '')}/{{path}}"
+    return "<non_route>"
+
+
+def enregistrer(methode: str, route: str, statut: int, duree: float, mesure: MesureRequete):
+    with _lock:
+        stats = _stats.get((methode, route))
+        if stats is None:
+            stats = _stats[(methode, route)] = StatsRoute()
+        stats.requetes += 1
+        if statut >= 500:
+            stats.erreurs += 1
+        for i, borne in enumerate(BORNES_LATENCE):
+            if duree <= borne:
+                stats.buckets[i] += 1
+                break
+        stats.somme_latence += duree
+        stats.nb_sql += mesure.nb_sql
+        stats.duree_sql += mesure.duree_sql
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mesure = MesureRequete(scope)
+        jeton = mesure_courante.set(mesure)
+        statut = 500
+        debut = time.perf_counter()
+
+        async def send_statut(message):
+            nonlocal statut
+            if message["type"] == "http.response.start":
+                statut = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_statut)
+        finally:
+            mesure_courante.reset(jeton)
+            enregistrer(scope["method"], gabarit_route(scope), statut, time.perf_counter() - debut, mesure)
+
+
+# --- Instrumentation SQLAlchemy ---
+def _avant_execution(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_debut = time.perf_counter()
+
+
+def _apres_execution(conn, cursor, statement, parameters, context, executemany):
+    mesure = mesure_courante.get() or _sql_hors_requete
+    mesure.nb_sql += 1
+    mesure.duree_sql += time.perf_counter() - context._metrics_debut
+
+
+def instrumenter_engine(engine):
+    """À appeler une fois par moteur (principal, réplique…)"""
+    event.listen(engine, "before_cursor_execute", _avant_execution)
+    event.listen(engine, "after_cursor_execute", _apres_execution)
+
+
+# --- Exposition ---
+def _etiquettes(**valeurs) -> str:
+    echappe = {k: str(v).replace("\\", "\\\\").replace('"', '\\"') for k, v in valeurs.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in echappe.items()) + "}"
+
+
+def stats_pool(engine) -> dict:
+    pool = engine.pool
+    stats = {}
+    for nom in ("size", "checkedin", "checkedout", "overflow"):
+        methode = getattr(pool, nom, None)
+        if callable(methode):
+            stats[nom] = methode()
+    return stats
+
+
+def _copie(stats: StatsRoute) -> StatsRoute:
+    copie = StatsRoute()
+    for attribut in StatsRoute.__slots__:
+        valeur = getattr(stats, attribut)
+        setattr(copie, attribut, list(valeur) if isinstance(valeur, list) else valeur)
+    return copie
+
+
+def exporter(moteurs: dict) -> str:
+    """Texte au format d'exposition Prometheus ; `moteurs` : {"principal": engine, ...}"""
+    with _lock:
+        # Copie sous verrou : les compteurs continuent d'évoluer pendant la mise en forme
+        lignes_stats = [(cle, _copie(stats)) for cle, stats in _stats.items()]
+
+    sortie = [
+        "# HELP rgpl_http_requests_total Requêtes HTTP traitées",
+        "# TYPE rgpl_http_requests_total counter",
+    ]
+    for (methode, route), s in lignes_stats:
+        sortie.append(f"rgpl_http_requests_total{_etiquettes(method=methode, route=route)} {s.requetes}")
+
+    sortie += ["# HELP rgpl_http_errors_total Réponses 5xx", "# TYPE rgpl_http_errors_total counter"]
+    for (methode, route), s in lignes_stats:
+        sortie.append(f"rgpl_http_errors_total{_etiquettes(method=methode, route=route)} {s.erreurs}")
+
+    sortie += [
+        "# HELP rgpl_http_request_duration_seconds Latence des requêtes HTTP",
+        "# TYPE rgpl_http_request_duration_seconds histogram",
+    ]
+    for (methode, route), s in lignes_stats:
+        cumul = 0
+        for borne, nb in zip(BORNES_LATENCE, s.buckets):
+            cumul += nb
+            sortie.append(f"rgpl_http_request_duration_seconds_bucket{_etiquettes(method=methode, route=route, le=borne)} {cumul}")
+        sortie.append(f"rgpl_http_request_duration_seconds_bucket{_etiquettes(method=methode, route=route, le='+Inf')} {s.requetes}")
+        sortie.append(f"rgpl_http_request_duration_seconds_sum{_etiquettes(method=methode, route=route)} {s.somme_latence:.6f}")
+        sortie.append(f"rgpl_http_request_duration_seconds_count{_etiquettes(method=methode, route=route)} {s.requetes}")
+
+    sortie += [
+        "# HELP rgpl_db_statements_total Instructions SQL exécutées",
+        "# TYPE rgpl_db_statements_total counter",
+    ]
+    for (methode, route), s in lignes_stats:
+        sortie.append(f"rgpl_db_statements_total{_etiquettes(method=methode, route=route)} {s.nb_sql}")
+    sortie.append(f"rgpl_db_statements_total{_etiquettes(method='', route='<hors_requete>')} {_sql_hors_requete.nb_sql}")
+
+    sortie += [
+        "# HELP rgpl_db_duration_seconds_total Temps passé à exécuter du SQL",
+        "# TYPE rgpl_db_duration_seconds_total counter",
+    ]
+    for (methode, route), s in lignes_stats:
+        sortie.append(f"rgpl_db_duration_seconds_total{_etiquettes(method=methode, route=route)} {s.duree_sql:.6f}")
+    sortie.append(f"rgpl_db_duration_seconds_total{_etiquettes(method='', route='<hors_requete>')} {_sql_hors_requete.duree_sql:.6f}")
+
+    sortie += ["# HELP rgpl_db_pool Connexions du pool SQLAlchemy", "# TYPE rgpl_db_pool gauge"]
+    for nom_moteur, moteur in moteurs.items():
+        for etat, valeur in stats_pool(moteur).items():
+            sortie.append(f"rgpl_db_pool{_etiquettes(engine=nom_moteur, state=etat)} {valeur}")
+
+    return "\n".join(sortie) + "\n"
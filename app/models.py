@@ -1,7 +1,10 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, Date, DateTime, Float, JSON, UniqueConstraint
+from sqlalchemy import Engine, Index, event, func, insert, select, text, update
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.utils.identite import cle_identite, normaliser_date, annee_naissance
+from app.utils.geo import bbox, superficie_km2
 
 # --------- Famille ---------
 class Famille(Base):
@@ -14,6 +17,8 @@ class Famille(Base):
     first_name = Column(String, nullable=True)
     last_name = Column(String, nullable=True)
     date_of_birth = Column(String, nullable=True)
+    birth_date = Column(Date, nullable=True, index=True)     # date_of_birth analysée à l'écriture
+    birth_year = Column(Integer, nullable=True, index=True)
     gender = Column(String, nullable=True)
     nationality = Column(String, nullable=True)
     id_type = Column(String, nullable=True)
@@ -34,7 +39,11 @@ class Famille(Base):
     is_validated = Column(Boolean, default=False)   # familles publiques = False
     is_synced = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    created_by_id = Column(Integer, ForeignKey("utilisateurs.id"), nullable=True)
+    created_by_id = Column(Integer, ForeignKey("utilisateurs.id"), nullable=True, index=True)
+
+    # Synchronisation différentielle : position dans le flux de changements (voir prochain_change_seq)
+    updated_at = Column(DateTime, nullable=True)
+    change_seq = Column(BigInteger, nullable=True)
 
     # Relations
     created_by = relationship("Utilisateur", back_populates="familles")
@@ -51,6 +60,8 @@ class Membre(Base):
     role = Column(String, nullable=True)
 
     date_of_birth = Column(String, nullable=True)
+    birth_date = Column(Date, nullable=True, index=True)     # date_of_birth analysée à l'écriture
+    birth_year = Column(Integer, nullable=True, index=True)
     gender = Column(String, nullable=True)
     nationality = Column(String, nullable=True)
     id_type = Column(String, nullable=True)
@@ -60,9 +71,203 @@ class Membre(Base):
     city = Column(String, nullable=True)
     district = Column(String, nullable=True)
 
-    famille_id = Column(Integer, ForeignKey("familles.id"), nullable=False)
+    # Clé normalisée nom|prénom|date pour la détection des doublons (voir utils/identite.py)
+    identity_key = Column(String, nullable=True, index=True)
+
+    famille_id = Column(Integer, ForeignKey("familles.id"), nullable=False, index=True)
     famille = relationship("Famille", back_populates="membres")
 
+    updated_at = Column(DateTime, nullable=True)
+    change_seq = Column(BigInteger, nullable=True)
+
+
+@event.listens_for(Membre, "before_insert")
+@event.listens_for(Membre, "before_update")
+def maj_identity_key(mapper, connection, target):
+    target.identity_key = cle_identite(target.first_name, target.last_name, target.date_of_birth)
+
+
+@event.listens_for(Famille, "before_insert")
+@event.listens_for(Famille, "before_update")
+@event.listens_for(Membre, "before_insert")
+@event.listens_for(Membre, "before_update")
+def maj_date_naissance(mapper, connection, target):
+    target.birth_date = normaliser_date(target.date_of_birth)
+    target.birth_year = annee_naissance(target.date_of_birth)
+
+
+# --------- Flux de changements (synchronisation différentielle, voir routers/sync.py) ---------
+class SyncCompteur(Base):
+    """Ligne unique (id = 1) : dernier numéro de changement attribué (hors PostgreSQL, voir prochain_change_seq)"""
+    __tablename__ = "sync_compteur"
+
+    id = Column(Integer, primary_key=True)
+    valeur = Column(BigInteger, nullable=False, default=0)
+
+
+class SuppressionSync(Base):
+    """Famille supprimée : transmise aux appareils qui l'avaient reçue"""
+    __tablename__ = "suppressions_sync"
+
+    id = Column(Integer, primary_key=True, index=True)
+    famille_id = Column(Integer, nullable=False)
+    created_by_id = Column(Integer, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    change_seq = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class CurseurSync(Base):
+    """Dernier curseur acquitté par appareil"""
+    __tablename__ = "curseurs_sync"
+
+    utilisateur_id = Column(Integer, ForeignKey("utilisateurs.id", ondelete="CASCADE"), primary_key=True)
+    appareil = Column(String, primary_key=True, default="defaut")
+    change_seq = Column(BigInteger, nullable=False, default=0)
+    famille_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+def prochain_change_seq(connection) -> int:
+    """
+    Numéro de changement de la transaction en cours (un seul par transaction).
+
+    PostgreSQL : identifiant de la transaction (pg_current_xact_id, 64 bits, croissant, sans
+    verrou partagé entre écrivains). Un numéro plus petit peut encore être validé plus tard :
+    les lecteurs s'arrêtent à change_seq_visible(), sous la plus ancienne transaction en cours.
+    Autres bases (SQLite en développement) : ligne sync_compteur, les écritures y sont de
+    toute façon sérialisées par la base.
+    """
+    seq = connection.info.get("change_seq")
+    if seq is None:
+        if connection.dialect.name == "postgresql":
+            seq = connection.execute(text("SELECT pg_current_xact_id()::text::bigint")).scalar_one()
+        else:
+            seq = connection.execute(
+                update(SyncCompteur.__table__).where(SyncCompteur.id == 1)
+                .values(valeur=SyncCompteur.valeur + 1).returning(SyncCompteur.valeur)
+            ).scalar_one()
+        connection.info["change_seq"] = seq
+    return seq
+
+
+def change_seq_visible(connection) -> int:
+    """
+    Plus grand numéro de changement dont toutes les transactions sont terminées : un client qui
+    a lu jusque-là ne recevra jamais plus tard un changement de numéro inférieur.
+    PostgreSQL : juste sous le xmin de l'instantané (plus ancienne transaction en cours) ;
+    une longue transaction d'écriture retarde donc le flux jusqu'à sa fin.
+    """
+    if connection.dialect.name == "postgresql":
+        return connection.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1")).scalar_one()
+    return connection.execute(select(SyncCompteur.valeur).where(SyncCompteur.id == 1)).scalar() or 0
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def oublier_change_seq(connection):
+    connection.info.pop("change_seq", None)
+
+
+@event.listens_for(Famille, "before_insert")
+@event.listens_for(Famille, "before_update")
+def maj_change_famille(mapper, connection, target):
+    target.change_seq = prochain_change_seq(connection)
+    target.updated_at = datetime.datetime.utcnow()
+
+
+@event.listens_for(Membre, "before_insert")
+@event.listens_for(Membre, "before_update")
+@event.listens_for(Membre, "before_delete")
+def maj_change_membre(mapper, connection, target):
+    """Les membres voyagent avec leur famille : la famille est renvoyée à chaque changement de membre"""
+    seq = prochain_change_seq(connection)
+    maintenant = datetime.datetime.utcnow()
+    target.change_seq, target.updated_at = seq, maintenant
+    if target.famille_id is not None:
+        connection.execute(
+            update(Famille.__table__).where(Famille.id == target.famille_id)
+            .values(change_seq=seq, updated_at=maintenant)
+        )
+
+
+@event.listens_for(Famille, "after_delete")
+def journaliser_suppression_famille(mapper, connection, target):
+    connection.execute(insert(SuppressionSync.__table__).values(
+        famille_id=target.id,
+        created_by_id=target.created_by_id,
+        latitude=target.latitude,
+        longitude=target.longitude,
+        change_seq=prochain_change_seq(connection),
+        deleted_at=datetime.datetime.utcnow(),
+    ))
+
+
+# --------- Index des requêtes fréquentes (créés par migrations/versions/0002_index_requetes.py) ---------
+# Liste paginée /familles : tri keyset created_at desc, id desc, avec ou sans filtre agent
+Index("ix_familles_created_at_id", Famille.created_at, Famille.id)
+Index("ix_familles_agent_created_at_id", Famille.created_by_id, Famille.created_at, Famille.id)
+# Enregistrements en attente de synchronisation : index partiel, ne contient que les lignes non synchronisées
+Index(
+    "ix_familles_non_synchronisees", Famille.created_by_id, Famille.id,
+    postgresql_where=text("is_synced = false"), sqlite_where=text("is_synced = 0"),
+)
+# Flux de changements /api/sync/changements : keyset (change_seq, id)
+Index("ix_familles_change_seq_id", Famille.change_seq, Famille.id)
+# Filtres insensibles à la casse (func.lower(...) == valeur.lower())
+Index("ix_familles_lower_province", func.lower(Famille.province))
+Index("ix_familles_lower_city", func.lower(Famille.city))
+Index("ix_familles_lower_district", func.lower(Famille.district))
+Index("ix_membres_lower_province", func.lower(Membre.province))
+Index("ix_membres_lower_city", func.lower(Membre.city))
+
+
+# --------- Candidat doublon (détection approximative, voir dedup.py) ---------
+class CandidatDoublon(Base):
+    __tablename__ = "candidats_doublons"
+    __table_args__ = (UniqueConstraint("membre_a_id", "membre_b_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    membre_a_id = Column(Integer, ForeignKey("membres.id", ondelete="CASCADE"), nullable=False, index=True)
+    membre_b_id = Column(Integer, ForeignKey("membres.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = Column(Float, nullable=False, index=True)
+    score_nom = Column(Float, nullable=True)
+    score_date = Column(Float, nullable=True)
+    statut = Column(String, default="a_verifier", nullable=False)  # a_verifier, confirme, rejete
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    membre_a = relationship("Membre", foreign_keys=[membre_a_id])
+    membre_b = relationship("Membre", foreign_keys=[membre_b_id])
+
+
+# File de revue /doublons/candidats : statut = 'a_verifier' trié par score desc, id
+Index("ix_candidats_doublons_statut_score", CandidatDoublon.statut, CandidatDoublon.score.desc(), CandidatDoublon.id)
+
+
+# --------- Agrégats statistiques précalculés (voir stats.py) ---------
+class StatistiqueAgregat(Base):
+    __tablename__ = "statistiques_agregats"
+
+    dimension = Column(String, primary_key=True)  # totaux, genres, provinces, roles, villes, naissances
+    valeur = Column(String, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class VariationStatistique(Base):
+    """
+    Variation d'un agrégat depuis le dernier recalcul, ajoutée dans la transaction de
+    l'écriture (voir deltas.py) ; lire_agregats additionne agrégats et variations, le
+    recalcul les remet à zéro.
+    """
+    __tablename__ = "statistiques_variations"
+
+    id = Column(Integer, primary_key=True)
+    dimension = Column(String, nullable=False)
+    valeur = Column(String, nullable=False)
+    variation = Column(Integer, nullable=False)
+
 
 # --------- Utilisateur ---------
 class Utilisateur(Base):
@@ -95,7 +300,26 @@ class Zone(Base):
     __tablename__ = "zones"
 
     id = Column(Integer, primary_key=True, index=True)
-    utilisateur_id = Column(Integer, ForeignKey("utilisateurs.id"), nullable=False)
+    utilisateur_id = Column(Integer, ForeignKey("utilisateurs.id"), nullable=False, index=True)
     geometrie = Column(JSON, nullable=False)  # GeoJSON
 
+    # Emprise (lon/lat min-max) et superficie, calculées à l'écriture depuis geometrie
+    lon_min = Column(Float, nullable=True)
+    lat_min = Column(Float, nullable=True)
+    lon_max = Column(Float, nullable=True)
+    lat_max = Column(Float, nullable=True)
+    superficie_km2 = Column(Float, nullable=True)
+
     utilisateur = relationship("Utilisateur", back_populates="zones")
+
+
+# Préfiltre SQL par emprise (créé par migrations/versions/0004_emprise_zones.py)
+Index("ix_zones_emprise", Zone.lon_min, Zone.lat_min, Zone.lon_max, Zone.lat_max)
+
+
+@event.listens_for(Zone, "before_insert")
+@event.listens_for(Zone, "before_update")
+def maj_emprise_zone(mapper, connection, target):
+    emprise = bbox(target.geometrie)
+    target.lon_min, target.lat_min, target.lon_max, target.lat_max = emprise or (None,) * 4
+    target.superficie_km2 = superficie_km2(target.geometrie) if emprise else None
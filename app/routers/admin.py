@@ -4,6 +4,8 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from app import models, database
 from app.routers import auth
+from app.stats import lire_agregats
+from app import slow_queries
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 templates = Jinja2Templates(directory="app/templates")
@@ -18,17 +20,31 @@ def require_super_user(current_user: models.Utilisateur = Depends(auth.get_curre
 @router.get("/dashboard", response_class=HTMLResponse)
 def admin_dashboard(
     request: Request,
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_db),
     current_user: models.Utilisateur = Depends(require_super_user)
 ):
-    total_users = db.query(models.Utilisateur).count()
-    total_familles = db.query(models.Famille).count()
-    total_membres = db.query(models.Membre).count()
+    agregats = lire_agregats(db)
+    totaux = agregats["totaux"]
 
     return templates.TemplateResponse("admin_dashboard.html", {
         "request": request,
         "user": current_user,
-        "total_users": total_users,
-        "total_familles": total_familles,
-        "total_membres": total_membres
+        "total_users": totaux.get("utilisateurs", 0),
+        "total_familles": totaux.get("familles", 0),
+        "total_membres": totaux.get("membres", 0),
+        "provinces": agregats.get("provinces", {}),
+    })
+
+# 🐢 Requêtes SQL lentes (SLOW_QUERY_MS), plus récentes d'abord
+@router.get("/requetes-lentes", response_class=HTMLResponse)
+def requetes_lentes(
+    request: Request,
+    current_user: models.Utilisateur = Depends(require_super_user)
+):
+    return templates.TemplateResponse("requetes_lentes.html", {
+        "request": request,
+        "user": current_user,
+        "actif": slow_queries.actif(),
+        "seuil_ms": slow_queries.SLOW_QUERY_MS,
+        "entrees": list(reversed(slow_queries.entrees)),
     })
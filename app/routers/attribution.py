@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app import database, models
+from app.utils.geo import bbox
 import csv
 import io
 import json
@@ -15,12 +16,27 @@ class AttributionZone(BaseModel):
     geojson: dict  # ou str si tu préfères stocker le GeoJSON en texte
 
 
+def verifier_geojson(geojson: dict):
+    if bbox(geojson) is None:
+        raise HTTPException(status_code=400, detail="Le GeoJSON ne contient aucun polygone")
+
+
+def emprise_zone(zone: models.Zone) -> dict:
+    return {
+        "emprise": [zone.lon_min, zone.lat_min, zone.lon_max, zone.lat_max],
+        "superficie_km2": zone.superficie_km2,
+    }
+
+
 @router.post("/api/attribuer-zone", response_class=JSONResponse)
 def attribuer_zone(data: AttributionZone, db: Session = Depends(database.get_db)):
     utilisateur = db.query(models.Utilisateur).filter(models.Utilisateur.id == data.utilisateur_id).first()
     if not utilisateur:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
+    verifier_geojson(data.geojson)
+
+    # Emprise et superficie calculées à l'écriture (models.maj_emprise_zone)
     zone = models.Zone(
         utilisateur_id=data.utilisateur_id,
         geometrie=data.geojson
@@ -29,7 +45,7 @@ def attribuer_zone(data: AttributionZone, db: Session = Depends(database.get_db)
     db.commit()
     db.refresh(zone)
 
-    return {"message": "Zone attribuée avec succès", "zone_id": zone.id}
+    return {"message": "Zone attribuée avec succès", "zone_id": zone.id, **emprise_zone(zone)}
 
 
 @router.put("/api/zones/{zone_id}", response_class=JSONResponse)
@@ -42,9 +58,11 @@ def mettre_a_jour_zone(
     if not zone:
         raise HTTPException(status_code=404, detail="Zone non trouvée")
 
+    verifier_geojson(data.geojson)
     zone.geometrie = data.geojson
     db.commit()
-    return {"message": "Zone mise à jour avec succès"}
+    db.refresh(zone)
+    return {"message": "Zone mise à jour avec succès", **emprise_zone(zone)}
 
 
 @router.post("/api/importer-zones", response_class=JSONResponse)
@@ -57,6 +75,8 @@ def importer_zones(file: UploadFile = File(...), db: Session = Depends(database.
         try:
             utilisateur_id = int(row["utilisateur_id"])
             geojson = json.loads(row["geojson"])
+            if bbox(geojson) is None:
+                continue
 
             zone = models.Zone(utilisateur_id=utilisateur_id, geometrie=geojson)
             db.add(zone)
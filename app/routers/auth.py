@@ -1,27 +1,33 @@
 from fastapi import APIRouter, Request, Form, Depends, Response, Cookie, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
-from passlib.context import CryptContext
+import random
+import hashlib
+import logging
 from functools import wraps
 from typing import Callable
 
 from app import models, schemas, database, crud
 from app.database import get_db
+from app.security import get_password_hash, HachageSature, HASH_RETRY_AFTER_SECONDS  # 🔐 hash dans un pool de processus borné
+from app.cache import cached, PREFIXE_UTILISATEURS
 
 # 🔐 Variables d'environnement
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
-# 🔐 Hash des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+# ⚡ Cache des utilisateurs authentifiés (évite un SELECT par requête protégée)
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+# 📝 Proportion des authentifications réussies journalisées (niveau DEBUG)
+AUTH_LOG_SAMPLE_RATE = float(os.getenv("AUTH_LOG_SAMPLE_RATE", "0.01"))
+
+logger = logging.getLogger(__name__)
 
 # 📦 Router et templates
 router = APIRouter(tags=["auth"])
@@ -33,41 +39,55 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    print("✅ Token généré :", encoded_jwt)
+    logger.debug("Token généré pour %s", data.get("sub"))
     return encoded_jwt
 
+# ⚡ Colonnes de l'utilisateur mises en cache (pas l'objet ORM, lié à une session)
+def _charger_utilisateur(db: Session, username: str):
+    user = db.query(models.Utilisateur).filter(models.Utilisateur.username == username).first()
+    if user is None:
+        return None
+    return {c.key: getattr(user, c.key) for c in models.Utilisateur.__table__.columns}
+
+def _utilisateur_en_session(db: Session, colonnes: dict) -> models.Utilisateur:
+    """Rattache l'utilisateur en cache à la session de la requête, sans SELECT (relations chargées à la demande)"""
+    user = models.Utilisateur(**colonnes)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
 # 🔐 Récupération de l'utilisateur courant via cookie
 def get_current_user(
     token: str = Cookie(None, alias="access_token"),
     db: Session = Depends(database.get_db)
 ) -> models.Utilisateur:
-    print("🔐 Cookie reçu :", token)
-
     if not token:
-        print("❌ Aucun token trouvé dans le cookie.")
+        logger.debug("Aucun token dans le cookie")
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role_in_token: str = payload.get("role")
-        print("📦 Payload décodé :", payload)
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError as e:
-        print("❌ Erreur de décodage JWT :", str(e))
+        logger.warning("Token JWT refusé : %s", e)
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(models.Utilisateur).filter(models.Utilisateur.username == username).first()
-    if user is None:
-        print("❌ Utilisateur introuvable :", username)
+    # Clé sujet + empreinte du token : une reconnexion ne réutilise pas l'entrée précédente
+    cle = f"{PREFIXE_UTILISATEURS}{username}:{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+    colonnes = cached(cle, lambda: _charger_utilisateur(db, username), ttl=AUTH_CACHE_TTL_SECONDS)
+    if colonnes is None:
+        logger.warning("Utilisateur du token introuvable : %s", username)
         raise HTTPException(status_code=401, detail="User not found")
+    user = _utilisateur_en_session(db, colonnes)
 
     # ⚠️ Alerte si rôle du token ≠ rôle en base (utile pour debug)
     if role_in_token and user.role != role_in_token:
-        print(f"⚠️ Rôle en base ({user.role}) différent du token ({role_in_token})")
+        logger.warning("Rôle en base (%s) différent du token (%s) pour %s", user.role, role_in_token, username)
 
-    print("✅ Utilisateur authentifié :", user.username, "– rôle :", user.role)
+    if random.random() < AUTH_LOG_SAMPLE_RATE:
+        logger.debug("Utilisateur authentifié : %s – rôle : %s", user.username, user.role)
     return user
 
 # 🔐 Page de connexion
@@ -77,13 +97,23 @@ def login_page(request: Request):
 
 # 🔐 Action de connexion (pose le cookie JWT avec rôle)
 @router.post("/login", response_class=HTMLResponse)
-def login_action(
+async def login_action(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    user = crud.authenticate_user(db, username, password)
+    try:
+        user = await crud.authenticate_user_async(db, username, password)
+    except HachageSature:
+        # ⏳ Pic de connexions : refus immédiat plutôt qu'une file d'attente sans fin
+        logger.warning("Connexion refusée (hachage saturé) pour %s", username)
+        return templates.TemplateResponse(
+            "login.html",
+            {"request": request, "error": "Trop de connexions simultanées, réessayez dans quelques secondes"},
+            status_code=503,
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
     if not user:
         return templates.TemplateResponse("login.html", {"request": request, "error": "Identifiants incorrects"})
 
@@ -8,89 +8,187 @@ from fastapi.templating import Jinja2Templates
 router = APIRouter(prefix="/doublons", tags=["doublons"])
 templates = Jinja2Templates(directory="app/templates")
 
-from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi import APIRouter, Request, Depends, HTTPException, Form, BackgroundTasks, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .. import database, models
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, and_, or_
+from itertools import groupby
+from urllib.parse import urlencode
+from .. import database, models, schemas, crud, dedup
 from fastapi.templating import Jinja2Templates
 from app.routers.auth import get_current_user  # 👈 import
+from app.utils.query_budget import budget_requetes
+from app.routers.admin import require_super_user
+from app.cache import invalider_compteurs
 
 router = APIRouter(prefix="/doublons", tags=["doublons"])
 templates = Jinja2Templates(directory="app/templates")
 
+def page_groupes_doublons(db: Session, apres: str = None, limit: int = 50):
+    """
+    Une page de groupes de doublons avec leurs membres, en une seule requête :
+    les clés de la page sont calculées dans une sous-requête puis jointes aux membres.
+    Retourne (groupes, clé à passer en `apres` pour la page suivante).
+    """
+    cles = crud.requete_groupes_doublons(db)
+    if apres:
+        cles = cles.filter(models.Membre.identity_key > apres)
+    cles = cles.order_by(models.Membre.identity_key).limit(limit + 1).subquery()
+
+    lignes = (
+        db.query(models.Membre, cles.c.nb)
+        .join(cles, models.Membre.identity_key == cles.c.identity_key)
+        .order_by(models.Membre.identity_key, models.Membre.id)
+        .all()
+    )
+
+    groupes = []
+    for cle, lignes_groupe in groupby(lignes, key=lambda l: l[0].identity_key):
+        membres = [membre for membre, _ in lignes_groupe]
+        groupes.append({
+            "cle": cle,
+            "nb": len(membres),
+            "nom": membres[0].last_name,
+            "prenom": membres[0].first_name,
+            "date_naissance": membres[0].date_of_birth,
+            "membres": membres
+        })
+
+    suivante = None
+    if len(groupes) > limit:
+        groupes = groupes[:limit]
+        suivante = groupes[-1]["cle"]
+    return groupes, suivante
+
 @router.get("/", response_class=HTMLResponse)
 @router.get("", response_class=HTMLResponse)
+@budget_requetes(2)
 def afficher_doublons(
     request: Request,
-    db: Session = Depends(database.get_db),
+    apres: str = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(database.get_read_db),
     current_user: models.Utilisateur = Depends(get_current_user)  # 👈 ajout
 ):
-    doublons_groupes = (
-        db.query(
-            func.lower(models.Membre.first_name).label("prenom"),
-            func.lower(models.Membre.last_name).label("nom"),
-            models.Membre.date_of_birth,
-            func.count(models.Membre.id).label("nb")
-        )
-        .group_by(
-            func.lower(models.Membre.first_name),
-            func.lower(models.Membre.last_name),
-            models.Membre.date_of_birth
-        )
-        .having(func.count(models.Membre.id) > 1)
-        .all()
-    )
-
-    doublons = []
-    for groupe in doublons_groupes:
-        membres = db.query(models.Membre).filter(
-            func.lower(models.Membre.first_name) == groupe.prenom,
-            func.lower(models.Membre.last_name) == groupe.nom,
-            models.Membre.date_of_birth == groupe.date_of_birth
-        ).all()
-        doublons.append({
-            "nom": groupe.nom,
-            "prenom": groupe.prenom,
-            "date_naissance": groupe.date_of_birth,
-            "membres": membres
-        })
+    doublons, suivante = page_groupes_doublons(db, apres, limit)
 
     return templates.TemplateResponse("doublons.html", {
         "request": request,
         "doublons": doublons,
+        "page_suivante": f"/doublons/?{urlencode({'apres': suivante, 'limit': limit})}" if suivante else None,
+        "premiere_page": bool(apres),
         "current_user": current_user  # 👈 bien placé dans le dict
     })
 
+@router.get("/api", response_model=schemas.PageDoublons)
+@budget_requetes(2)
+def api_doublons(
+    apres: str = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(database.get_read_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    groupes, suivante = page_groupes_doublons(db, apres, limit)
+    return {"groupes": groupes, "apres": suivante}
+
 @router.post("/supprimer/{membre_id}")
 def supprimer_doublon(membre_id: int, db: Session = Depends(database.get_db)):
     membre = db.query(models.Membre).filter(models.Membre.id == membre_id).first()
     if membre:
         db.delete(membre)
         db.commit()
+        invalider_compteurs()
     return RedirectResponse(url="/doublons/", status_code=303)
 
 @router.post("/supprimer-groupe/")
 def supprimer_groupe_doublons(
-    prenom: str,
-    nom: str,
-    date_naissance: str,
+    cle: str = Form(...),
     db: Session = Depends(database.get_db)
 ):
-    membres = db.query(models.Membre).filter(
-        func.lower(models.Membre.first_name) == prenom.lower(),
-        func.lower(models.Membre.last_name) == nom.lower(),
-        models.Membre.date_of_birth == date_naissance
-    ).all()
-
     # Supprimer tous sauf le premier
-    for membre in membres[1:]:
-        db.delete(membre)
-
-    db.commit()
+    crud.resoudre_doublons(db, cle=cle)
     return RedirectResponse(url="/doublons/", status_code=303)
 
+# --- Résolution groupée (tous les groupes, ou ceux d'une province) ---
+@router.post("/api/resoudre")
+def api_resoudre_doublons(
+    province: str = None,
+    survivant: str = Query("ancien", pattern="^(ancien|recent)$"),
+    db: Session = Depends(database.get_db),
+    current_user: models.Utilisateur = Depends(require_super_user)
+):
+    return crud.resoudre_doublons(db, province=province, survivant=survivant)
 
+@router.post("/resoudre")
+def resoudre_doublons_form(
+    province: str = Form(None),
+    survivant: str = Form("ancien"),
+    db: Session = Depends(database.get_db),
+    current_user: models.Utilisateur = Depends(require_super_user)
+):
+    if survivant not in ("ancien", "recent"):
+        raise HTTPException(status_code=400, detail="Survivant invalide")
+    rapport = crud.resoudre_doublons(db, province=province or None, survivant=survivant)
+    msg = f"{rapport['groupes']} groupes résolus, {rapport['membres_supprimes']} doublons supprimés"
+    return RedirectResponse(url=f"/doublons/?{urlencode({'msg': msg})}", status_code=303)
 
 
+# --- Détection approximative (voir app/dedup.py) ---
+@router.post("/analyse")
+def lancer_analyse(
+    background_tasks: BackgroundTasks,
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    background_tasks.add_task(dedup.executer_analyse)
+    return RedirectResponse(url="/doublons/candidats?msg=Analyse+lancée", status_code=303)
 
+@router.get("/candidats", response_class=HTMLResponse)
+@budget_requetes(2)
+def afficher_candidats(
+    request: Request,
+    apres_score: float = None,
+    apres_id: int = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(database.get_read_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """Paires candidates à vérifier, du score le plus élevé au plus faible (pagination par curseur)"""
+    query = (
+        db.query(models.CandidatDoublon)
+        .options(joinedload(models.CandidatDoublon.membre_a), joinedload(models.CandidatDoublon.membre_b))
+        .filter(models.CandidatDoublon.statut == "a_verifier")
+    )
+    if apres_score is not None and apres_id is not None:
+        query = query.filter(or_(
+            models.CandidatDoublon.score < apres_score,
+            and_(models.CandidatDoublon.score == apres_score, models.CandidatDoublon.id > apres_id),
+        ))
+    candidats = query.order_by(models.CandidatDoublon.score.desc(), models.CandidatDoublon.id).limit(limit + 1).all()
+
+    page_suivante = None
+    if len(candidats) > limit:
+        candidats = candidats[:limit]
+        page_suivante = f"/doublons/candidats?apres_score={candidats[-1].score}&apres_id={candidats[-1].id}&limit={limit}"
+
+    return templates.TemplateResponse("doublons_candidats.html", {
+        "request": request,
+        "candidats": candidats,
+        "page_suivante": page_suivante,
+        "current_user": current_user
+    })
+
+@router.post("/candidats/{candidat_id}/statut")
+def changer_statut_candidat(
+    candidat_id: int,
+    statut: str = Form(...),
+    db: Session = Depends(database.get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    if statut not in ("confirme", "rejete"):
+        raise HTTPException(status_code=400, detail="Statut invalide")
+    candidat = db.query(models.CandidatDoublon).filter(models.CandidatDoublon.id == candidat_id).first()
+    if not candidat:
+        raise HTTPException(status_code=404, detail="Paire introuvable")
+    candidat.statut = statut
+    db.commit()
+    return RedirectResponse(url="/doublons/candidats", status_code=303)
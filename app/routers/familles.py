@@ -1,31 +1,96 @@
-import os
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
-from app import models, schemas, database
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas, database, crud
 from app.routers import auth
-from app.utils.files import UPLOAD_DIR, generate_family_filename
-from app.database import get_db
+from app.utils.files import generate_family_filename, recevoir_upload, finaliser_upload, abandonner_upload
+from app.utils.images import planifier_derives
+from app.utils.query_budget import budget_requetes
+from app.cache import invalider_compteurs
+from app.database import get_db, get_read_db, get_async_db
 
 # --- Router unique ---
 router = APIRouter(prefix="/familles", tags=["familles"])
 templates = Jinja2Templates(directory="app/templates")
 
+# --- Filtres et pagination de la liste des familles ---
+def filtres_familles(
+    province: str = None,
+    city: str = None,
+    district: str = None,
+    agent: str = None,
+    is_validated: str = None,
+    curseur: str = None,
+    limit: int = Query(50, ge=1, le=200),
+) -> dict:
+    """Paramètres communs à /familles, /page-familles et /familles/json (champs vides ignorés)"""
+    return {
+        "province": province or None,
+        "city": city or None,
+        "district": district or None,
+        "agent_id": int(agent) if agent and agent.isdigit() else None,
+        "is_validated": {"true": True, "false": False}.get((is_validated or "").lower()),
+        "curseur": curseur or None,
+        "limit": limit,
+    }
+
+
+def charger_page_familles(db: Session, filtres: dict):
+    try:
+        return crud.list_familles(db, **filtres)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+def page_familles_context(db: Session, filtres: dict, base_url: str) -> dict:
+    """Charge une page de familles et prépare les liens de navigation du template"""
+    familles, curseur_suivant = charger_page_familles(db, filtres)
+
+    params = {k: v for k, v in filtres.items() if v is not None and k not in ("curseur", "limit")}
+    if "agent_id" in params:
+        params["agent"] = params.pop("agent_id")
+    if "is_validated" in params:
+        params["is_validated"] = str(params["is_validated"]).lower()
+    if filtres["limit"] != 50:
+        params["limit"] = filtres["limit"]
+
+    return {
+        "familles": familles,
+        "filtres": filtres,
+        "agents": db.query(models.Utilisateur).order_by(models.Utilisateur.username).all(),
+        "premiere_page_url": f"{base_url}?{urlencode(params)}",
+        "page_suivante_url": f"{base_url}?{urlencode({**params, 'curseur': curseur_suivant})}" if curseur_suivant else None,
+    }
+
 # --- Pages HTML protégées ---
 @router.get("/", response_class=HTMLResponse)
+@budget_requetes(5)
 def page_familles(
     request: Request,
-    db: Session = Depends(get_db),
+    filtres: dict = Depends(filtres_familles),
+    db: Session = Depends(get_read_db),
     current_user: models.Utilisateur = Depends(auth.get_current_user)
 ):
-    familles = db.query(models.Famille).options(joinedload(models.Famille.created_by)).all()
     return templates.TemplateResponse("familles.html", {
         "request": request,
-        "familles": familles,
-        "current_user": current_user
+        "current_user": current_user,
+        **page_familles_context(db, filtres, "/familles/"),
     })
 
+@router.get("/json", response_model=schemas.FamillePage)
+@budget_requetes(3)
+def list_familles_json(
+    filtres: dict = Depends(filtres_familles),
+    db: Session = Depends(get_read_db),
+    current_user: models.Utilisateur = Depends(auth.get_current_user)
+):
+    familles, curseur_suivant = charger_page_familles(db, filtres)
+    return {"familles": familles, "curseur_suivant": curseur_suivant}
+
 @router.get("/create", response_class=HTMLResponse)
 def page_create_famille(
     request: Request,
@@ -37,6 +102,7 @@ def page_create_famille(
     })
 
 @router.get("/{famille_id}", response_class=HTMLResponse)
+@budget_requetes(3)
 def voir_famille(
     famille_id: int,
     request: Request,
@@ -108,60 +174,63 @@ async def create_famille(
     latitude: float = Form(None),
     longitude: float = Form(None),
     photo: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Utilisateur = Depends(auth.get_current_user),
 ):
-    db_famille = models.Famille(
-        name=name,
-        first_name=first_name,
-        last_name=last_name,
-        date_of_birth=date_of_birth,
-        gender=gender,
-        nationality=nationality,
-        id_type=id_type,
-        id_number=id_number,
-        place_of_birth=place_of_birth,
-        province=province,
-        city=city,
-        district=district,
-        duree_remplissage=duree_remplissage,
-        latitude=latitude,
-        longitude=longitude,
-        created_by_id=current_user.id,
-        is_validated=True  # côté agent, on suppose validation directe
-    )
-    db.add(db_famille)
-    db.commit()
-    db.refresh(db_famille)
-
-    # Ajouter la personne racine comme membre (Personne cible)
-    db_membre_racine = models.Membre(
-        first_name=first_name,
-        last_name=last_name,
-        date_of_birth=date_of_birth,
-        gender=gender,
-        nationality=nationality,
-        id_type=id_type,
-        id_number=id_number,
-        place_of_birth=place_of_birth,
-        province=province,
-        city=city,
-        district=district,
-        role="Personne cible",
-        famille_id=db_famille.id
-    )
-    db.add(db_membre_racine)
-    db.commit()
-
-    # Photo (optionnelle)
-    if photo:
-        filename = generate_family_filename(db_famille.id, photo.filename)
-        photo_path = os.path.join(UPLOAD_DIR, filename)
-        with open(photo_path, "wb") as buffer:
-            buffer.write(await photo.read())
-        db_famille.photo_path = filename
-        db.commit()
-        db.refresh(db_famille)
+    # Photo reçue d'abord : une photo trop lourde est refusée avant toute écriture en base
+    photo_tmp = await recevoir_upload(photo) if photo and photo.filename else None
+
+    # 🧹 Toute erreur avant le renommage définitif supprime le fichier temporaire (uploads/ est servi)
+    try:
+        db_famille = models.Famille(
+            name=name,
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            nationality=nationality,
+            id_type=id_type,
+            id_number=id_number,
+            place_of_birth=place_of_birth,
+            province=province,
+            city=city,
+            district=district,
+            duree_remplissage=duree_remplissage,
+            latitude=latitude,
+            longitude=longitude,
+            created_by_id=current_user.id,
+            is_validated=True  # côté agent, on suppose validation directe
+        )
+
+        # Ajouter la personne racine comme membre (Personne cible), dans la même transaction
+        db_famille.membres = [models.Membre(
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            nationality=nationality,
+            id_type=id_type,
+            id_number=id_number,
+            place_of_birth=place_of_birth,
+            province=province,
+            city=city,
+            district=district,
+            role="Personne cible",
+        )]
+        db.add(db_famille)
+        await db.commit()
+        invalider_compteurs()
+
+        # Photo (optionnelle)
+        if photo_tmp:
+            db_famille.photo_path = await finaliser_upload(photo_tmp, generate_family_filename(db_famille.id, photo.filename))
+    except Exception:
+        if photo_tmp:
+            await abandonner_upload(photo_tmp)
+        raise
+    if photo_tmp:
+        await db.commit()
+        planifier_derives(db_famille.photo_path)
 
     return db_famille
 
@@ -178,10 +247,12 @@ def add_member(
     db_membre = models.Membre(**membre.dict(), famille_id=famille_id)
     db.add(db_membre)
     db.commit()
+    invalider_compteurs()
     db.refresh(db_membre)
     return db_membre
 
 @router.get("/{famille_id}/members", response_model=list[schemas.MembreResponse])
+@budget_requetes(2)
 def list_members(
     famille_id: int,
     db: Session = Depends(get_db)
@@ -206,6 +277,7 @@ def delete_member(
 
     db.delete(db_membre)
     db.commit()
+    invalider_compteurs()
     return {"message": "Membre supprimé"}
 
 @router.post("/{famille_id}/localisation")
@@ -241,10 +313,10 @@ def update_duree(
 async def update_famille(
     famille_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     form = await request.form()
-    famille = db.query(models.Famille).filter(models.Famille.id == famille_id).first()
+    famille = await db.get(models.Famille, famille_id)
     if not famille:
         raise HTTPException(status_code=404, detail="Famille non trouvée")
 
@@ -254,18 +326,19 @@ async def update_famille(
     famille.district = form.get("district") or famille.district
     famille.province = form.get("province") or famille.province
 
-    db.commit()
+    await db.commit()
+    invalider_compteurs()
     return RedirectResponse(url="/page-familles", status_code=303)
 
 @router.post("/{famille_id}/members/form")
 async def add_member_form_post(
     famille_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     form = await request.form()
 
-    db_famille = db.query(models.Famille).filter(models.Famille.id == famille_id).first()
+    db_famille = await db.get(models.Famille, famille_id)
     if not db_famille:
         raise HTTPException(status_code=404, detail="Famille non trouvée")
 
@@ -286,7 +359,8 @@ async def add_member_form_post(
     )
 
     db.add(membre)
-    db.commit()
+    await db.commit()
+    invalider_compteurs()
 
     return RedirectResponse(url=f"/familles/{famille_id}/edit", status_code=303)
 
@@ -295,14 +369,14 @@ async def update_membre(
     famille_id: int,
     membre_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     form = await request.form()
 
-    membre = db.query(models.Membre).filter(
+    membre = await db.scalar(select(models.Membre).where(
         models.Membre.id == membre_id,
         models.Membre.famille_id == famille_id
-    ).first()
+    ))
 
     if not membre:
         raise HTTPException(status_code=404, detail="Membre non trouvé")
@@ -320,7 +394,8 @@ async def update_membre(
     membre.city = form.get("city")
     membre.district = form.get("district")
 
-    db.commit()
+    await db.commit()
+    invalider_compteurs()
 
     return RedirectResponse(url=f"/familles/{famille_id}/edit", status_code=303)
 
@@ -340,44 +415,48 @@ async def create_famille_public(
     city: str = Form(...),
     district: str = Form(...),
     photo: UploadFile = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    famille = models.Famille(
-        name=name,
-        city=city,
-        district=district,
-        is_validated=False
-    )
-    db.add(famille)
-    db.commit()
-    db.refresh(famille)
-
-    personne = models.Personne(
-        first_name=first_name,
-        last_name=last_name,
-        date_of_birth=date_of_birth,
-        gender=gender,
-        nationality=nationality,
-        id_type=id_type,
-        id_number=id_number,
-        place_of_birth=place_of_birth,
-        province=province,
-        city=city,
-        district=district,
-        famille_id=famille.id
-    )
-    db.add(personne)
-    db.commit()
-
-    # Optionnel: gérer la photo publique si souhaité (stockage uploads)
-    if photo:
-        filename = generate_family_filename(famille.id, photo.filename)
-        photo_path = os.path.join(UPLOAD_DIR, filename)
-        with open(photo_path, "wb") as buffer:
-            buffer.write(await photo.read())
-        famille.photo_path = filename
-        db.commit()
-        db.refresh(famille)
+    photo_tmp = await recevoir_upload(photo) if photo and photo.filename else None
+
+    # 🧹 Toute erreur avant le renommage définitif supprime le fichier temporaire (uploads/ est servi)
+    try:
+        famille = models.Famille(
+            name=name,
+            city=city,
+            district=district,
+            is_validated=False
+        )
+
+        # Personne racine enregistrée comme membre "Personne cible", dans la même transaction
+        famille.membres = [models.Membre(
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+            gender=gender,
+            nationality=nationality,
+            id_type=id_type,
+            id_number=id_number,
+            place_of_birth=place_of_birth,
+            province=province,
+            city=city,
+            district=district,
+            role="Personne cible",
+        )]
+        db.add(famille)
+        await db.commit()
+        invalider_compteurs()
+
+        # Optionnel: gérer la photo publique si souhaité (stockage uploads)
+        if photo_tmp:
+            famille.photo_path = await finaliser_upload(photo_tmp, generate_family_filename(famille.id, photo.filename))
+    except Exception:
+        if photo_tmp:
+            await abandonner_upload(photo_tmp)
+        raise
+    if photo_tmp:
+        await db.commit()
+        planifier_derives(famille.photo_path)
 
     return {"id": famille.id, "name": famille.name, "is_validated": famille.is_validated}
 
@@ -393,6 +472,7 @@ def add_member_public(
     personne = models.Personne(**membre.dict(), famille_id=famille.id)
     db.add(personne)
     db.commit()
+    invalider_compteurs()
     db.refresh(personne)
     return {"message": "Membre ajouté", "id": personne.id}
 
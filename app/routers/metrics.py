@@ -0,0 +1,34 @@
+# app/routers/metrics.py
+import os
+import secrets
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from app.database import engine, read_engine
+from app.metrics import exporter
+from app import security
+
+router = APIRouter(tags=["metrics"])
+
+# Si défini, le collecteur doit envoyer "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics(request: Request):
+    if METRICS_TOKEN:
+        fourni = request.headers.get("authorization", "").removeprefix("Bearer ")
+        if not secrets.compare_digest(fourni, METRICS_TOKEN):
+            raise HTTPException(status_code=403, detail="Accès refusé")
+    moteurs = {"principal": engine}
+    if read_engine is not engine:
+        moteurs["replique"] = read_engine
+    hachage = security.etat_pool()
+    texte = exporter(moteurs) + "\n".join([
+        "# HELP rgpl_password_hash_pending Calculs bcrypt en cours ou en file",
+        "# TYPE rgpl_password_hash_pending gauge",
+        f"rgpl_password_hash_pending {hachage['en_attente']}",
+        "# HELP rgpl_password_hash_rejected_total Calculs bcrypt refusés (file pleine)",
+        "# TYPE rgpl_password_hash_rejected_total counter",
+        f"rgpl_password_hash_rejected_total {hachage['refus']}",
+    ]) + "\n"
+    return PlainTextResponse(texte, media_type="text/plain; version=0.0.4; charset=utf-8")
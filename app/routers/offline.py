@@ -2,12 +2,20 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from app import models
+from app import sync_status as sync_status_diffusion
+from app.database import get_db, get_read_db
 from app.routers.auth import get_current_user
+from app.utils.sse import reponse_sse
 
 templates = Jinja2Templates(directory="app/templates")
 router = APIRouter()
 
+# Nombre de familles en attente listées par /api/sync-status
+SYNC_STATUS_MAX_LIGNES = 20
+
 # -------------------------------
 # Routes HTML publiques
 # -------------------------------
@@ -75,15 +83,45 @@ async def zone_travail(request: Request):
 # APIs protégées
 # -------------------------------
 @router.get("/api/sync-status")
-async def sync_status(current_user: models.Utilisateur = Depends(get_current_user)):
-    # Exemple de données fictives
-    pending = [
-        {"nom": "Famille Nguema", "quartier": "Nzeng-Ayong", "date": "2025-12-27"},
-        {"nom": "Famille Mba", "quartier": "Akebe", "date": "2025-12-26"},
-    ]
-    return {"status": "Connecté ✅", "pending": pending}
-
-@router.post("/api/force-sync")
-async def force_sync(current_user: models.Utilisateur = Depends(get_current_user)):
-    # Ici tu déclenches ta logique réelle de synchronisation
-    return {"message": "Synchronisation forcée lancée 🚀"}
+def sync_status(
+    db: Session = Depends(get_read_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """Familles de l'agent en attente de synchronisation (les plus récentes) et leur nombre"""
+    familles = db.scalars(
+        select(models.Famille)
+        .where(models.Famille.is_synced == False, models.Famille.created_by_id == current_user.id)
+        .order_by(models.Famille.id.desc())
+        .limit(SYNC_STATUS_MAX_LIGNES)
+    ).all()
+    reponse = {
+        "status": "Connecté ✅",
+        "en_attente": sync_status_diffusion.en_attente_agent(db, current_user.id),
+        "pending": [
+            {"nom": f.name, "quartier": f.district, "date": f.created_at.isoformat() if f.created_at else None}
+            for f in familles
+        ],
+    }
+    if current_user.role in sync_status_diffusion.ROLES_SUPERVISION:
+        reponse["totaux"] = sync_status_diffusion.lire_etat()["totaux"]
+    return reponse
+
+@router.get("/api/sync-status/stream")
+async def sync_status_stream(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """
+    Flux SSE : un événement à chaque changement du nombre de familles en attente de l'agent
+    (ou, pour un superviseur, des totaux et du détail par agent). Voir app/sync_status.py.
+    """
+    agent_id = None if current_user.role in sync_status_diffusion.ROLES_SUPERVISION else current_user.id
+    # La session d'authentification ne doit pas garder une connexion du pool pendant tout le flux
+    db.close()
+
+    def ouvrir():
+        abonne = sync_status_diffusion.abonner(agent_id)
+        return abonne.file, lambda: sync_status_diffusion.desabonner(abonne)
+
+    return reponse_sse(request, ouvrir, heartbeat=sync_status_diffusion.SYNC_STATUS_HEARTBEAT)
@@ -1,31 +1,42 @@
 # app/routers/pages.py
-from fastapi import APIRouter, Request, Depends
+import os
+from fastapi import APIRouter, Request, Depends, HTTPException, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app import models, crud, database
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas, crud, database, tableau_de_bord
+from app.stats import lire_agregats
+from app.database import get_db, get_read_db, get_async_db
 from app.routers.auth import get_current_user
+from app.utils.query_budget import budget_requetes
+from app.utils.sse import reponse_sse
+from app.routers.familles import filtres_familles, page_familles_context
 
 router = APIRouter(tags=["pages"])
 templates = Jinja2Templates(directory="app/templates")
 
+# 🔁 Synchronisation forcée : taille des lots et durée maximale d'un appel
+FORCE_SYNC_TAILLE_LOT = int(os.getenv("FORCE_SYNC_TAILLE_LOT", "1000"))
+FORCE_SYNC_DUREE_MAX_SECONDS = float(os.getenv("FORCE_SYNC_DUREE_MAX_SECONDS", "20"))
+
 @router.get("/", response_class=HTMLResponse)
 def root_redirect():
     return RedirectResponse(url="/login")
 
 @router.get("/page-familles", response_class=HTMLResponse)
+@budget_requetes(4)
 def page_familles(
     request: Request,
-    db: Session = Depends(get_db),
+    filtres: dict = Depends(filtres_familles),
+    db: Session = Depends(get_read_db),
     current_user: models.Utilisateur = Depends(get_current_user)
 ):
-    familles = crud.list_familles(db)
     return templates.TemplateResponse("familles.html", {
         "request": request,
-        "familles": familles,
-        "current_user": current_user
+        "current_user": current_user,
+        **page_familles_context(db, filtres, "/page-familles"),
     })
 
 @router.get("/page-utilisateurs", response_class=HTMLResponse)
@@ -44,12 +55,13 @@ def page_utilisateurs(
 @router.get("/page-stats", response_class=HTMLResponse)
 def page_stats(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.Utilisateur = Depends(get_current_user)
 ):
+    totaux = lire_agregats(db)["totaux"]
     stats_globales = {
-        "total_familles": db.query(models.Famille).count(),
-        "total_membres": db.query(models.Membre).count()
+        "total_familles": totaux.get("familles", 0),
+        "total_membres": totaux.get("membres", 0)
     }
     return templates.TemplateResponse("stats.html", {
         "request": request,
@@ -70,33 +82,15 @@ def page_famille_edit(
 @router.get("/home", response_class=HTMLResponse)
 def home_page(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.Utilisateur = Depends(get_current_user)
 ):
-    total_familles = db.query(models.Famille).count()
-    total_membres = db.query(models.Membre).count()
-    libreville_membres = db.query(models.Membre).filter(models.Membre.city.ilike("libreville")).count()
-
-    doublons_groupes = (
-        db.query(
-            func.lower(models.Membre.first_name),
-            func.lower(models.Membre.last_name),
-            models.Membre.date_of_birth
-        )
-        .group_by(
-            func.lower(models.Membre.first_name),
-            func.lower(models.Membre.last_name),
-            models.Membre.date_of_birth
-        )
-        .having(func.count(models.Membre.id) > 1)
-        .all()
-    )
-
+    totaux = lire_agregats(db)["totaux"]
     stats = {
-        "total_familles": total_familles,
-        "total_membres": total_membres,
-        "libreville_membres": libreville_membres,
-        "total_doublons": len(doublons_groupes)
+        "total_familles": totaux.get("familles", 0),
+        "total_membres": totaux.get("membres", 0),
+        "libreville_membres": totaux.get("libreville", 0),
+        "total_doublons": totaux.get("doublons", 0)
     }
 
     return templates.TemplateResponse("index.html", {
@@ -105,30 +99,78 @@ def home_page(
         "current_user": current_user
     })
 
+# 📡 Compteurs du tableau de bord en direct (SSE, voir app/tableau_de_bord.py)
+@router.get("/api/tableau-de-bord/stream")
+async def tableau_de_bord_stream(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    # La session d'authentification ne doit pas garder une connexion du pool pendant tout le flux
+    db.close()
+
+    async def ouvrir():
+        abonne = await tableau_de_bord.abonner()
+        return abonne.file, lambda: tableau_de_bord.desabonner(abonne)
+
+    return reponse_sse(request, ouvrir)
+
 # 🔎 Ajout des routes synchronisation
 @router.get("/synchronisation", response_class=HTMLResponse)
 async def synchronisation(request: Request):
     return templates.TemplateResponse("synchronisation.html", {"request": request})
 
-@router.get("/api/pending-records")
-async def get_pending_records(db: Session = Depends(database.get_db)):
-    familles = db.query(models.Famille).filter(models.Famille.is_synced == False).all()
-    return familles
+@router.get("/api/pending-records", response_model=list[schemas.FamilleEnAttente])
+async def get_pending_records(
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """Familles non synchronisées de l'agent (toutes pour ROLES_SYNC_GLOBALE), les plus anciennes d'abord"""
+    query = select(models.Famille).where(models.Famille.is_synced == False)
+    if current_user.role not in crud.ROLES_SYNC_GLOBALE:
+        query = query.where(models.Famille.created_by_id == current_user.id)
+    familles = await db.scalars(query.order_by(models.Famille.id).limit(limit))
+    return familles.all()
 
 @router.get("/famille-public", response_class=HTMLResponse)
 def famille_public(request: Request):
     return templates.TemplateResponse("famille_public.html", {"request": request})
 
 @router.post("/api/force-sync")
-async def force_sync(db: Session = Depends(database.get_db)):
+def force_sync(
+    agent_id: int = None,
+    zone_id: int = None,
+    apres_id: int = 0,
+    db: Session = Depends(get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
     """
-    Marque toutes les familles en attente comme synchronisées.
+    Marque les familles en attente comme synchronisées, par lots (voir crud.force_synchronisation).
+    Périmètre : un agent (`agent_id`) ou une zone (`zone_id`) ; un agent n'agit que sur ses
+    familles ou ses zones. Au-delà de FORCE_SYNC_DUREE_MAX_SECONDS la route rend la main
+    (termine = False) : rappeler avec apres_id = dernier_id pour continuer.
     """
-    pending_familles = db.query(models.Famille).filter(models.Famille.is_synced == False).all()
-
-    for famille in pending_familles:
-        famille.is_synced = True
-
-    db.commit()
-
-    return {"message": f"{len(pending_familles)} familles synchronisées avec succès ✅"}
+    zone = None
+    if zone_id is not None:
+        zone = db.get(models.Zone, zone_id)
+        if zone is None:
+            raise HTTPException(status_code=404, detail="Zone non trouvée")
+    if current_user.role not in crud.ROLES_SYNC_GLOBALE:
+        if agent_id is not None and agent_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Vous ne pouvez synchroniser que vos familles")
+        if zone is not None and zone.utilisateur_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Zone attribuée à un autre agent")
+        if zone is None:
+            agent_id = current_user.id
+
+    rapport = crud.force_synchronisation(
+        db,
+        agent_id=agent_id,
+        zone=zone.geometrie if zone is not None else None,
+        apres_id=apres_id,
+        taille_lot=FORCE_SYNC_TAILLE_LOT,
+        duree_max=FORCE_SYNC_DUREE_MAX_SECONDS,
+    )
+    suite = "" if rapport["termine"] else " (à poursuivre)"
+    return {"message": f"{rapport['familles']} familles synchronisées avec succès ✅{suite}", **rapport}
@@ -0,0 +1,30 @@
+# app/routers/photos.py
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse
+from app.utils.files import UPLOAD_DIR
+from app.utils.images import TAILLES, obtenir_derive
+
+router = APIRouter(tags=["photos"])
+
+
+@router.get("/photos/{taille}/{filename}")
+async def photo_derivee(taille: str, filename: str, request: Request):
+    """Sert une version réduite (WebP si le navigateur l'accepte, sinon JPEG) d'une photo de /uploads"""
+    if taille not in TAILLES or filename != os.path.basename(filename):
+        raise HTTPException(status_code=404, detail="Photo introuvable")
+    if not os.path.isfile(os.path.join(UPLOAD_DIR, filename)):
+        raise HTTPException(status_code=404, detail="Photo introuvable")
+
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    try:
+        chemin = await obtenir_derive(filename, taille, fmt)
+    except Exception:
+        # Fichier illisible par Pillow : on retombe sur l'original
+        return RedirectResponse(url=f"/uploads/{filename}")
+
+    # Le nom de fichier contient un horodatage : le dérivé ne change jamais
+    return FileResponse(chemin, media_type=f"image/{fmt}", headers={
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Vary": "Accept",
+    })
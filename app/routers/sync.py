@@ -0,0 +1,124 @@
+# app/routers/sync.py
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app import models, schemas, crud
+from app.database import get_db, get_read_db
+from app.routers.auth import get_current_user
+from app.utils.query_budget import budget_requetes
+
+router = APIRouter(prefix="/api/sync", tags=["synchronisation"])
+
+# Nombre maximal d'enregistrements acceptés par appel
+MAX_LOT_SYNC = 500
+# Taille maximale d'une page du flux de changements
+MAX_PAGE_CHANGEMENTS = 500
+
+
+async def lire_enregistrements(request: Request) -> list:
+    """Lit un tableau JSON, ou un flux NDJSON (une famille par ligne) lu au fil de l'eau"""
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type:
+        enregistrements, reste = [], b""
+        async for morceau in request.stream():
+            reste += morceau
+            *lignes, reste = reste.split(b"\n")
+            enregistrements.extend(json.loads(l) for l in lignes if l.strip())
+            if len(enregistrements) > MAX_LOT_SYNC:
+                break
+        if reste.strip():
+            enregistrements.append(json.loads(reste))
+        return enregistrements
+
+    enregistrements = await request.json()
+    if not isinstance(enregistrements, list):
+        raise ValueError("Un tableau de familles est attendu")
+    return enregistrements
+
+
+@router.post("/familles", response_model=schemas.SyncReponse)
+async def synchroniser_familles(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """
+    Reçoit en un seul appel toute la file hors ligne d'un agent.
+    Chaque enregistrement obtient un résultat (cree / erreur) afin que le client
+    puisse vider sa file IndexedDB en un aller-retour.
+    """
+    try:
+        enregistrements = await lire_enregistrements(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Corps invalide : {e}")
+
+    if len(enregistrements) > MAX_LOT_SYNC:
+        raise HTTPException(status_code=413, detail=f"Maximum {MAX_LOT_SYNC} familles par synchronisation")
+
+    resultats, valides = [], []
+    for brut in enregistrements:
+        try:
+            famille = schemas.FamilleSync.model_validate(brut)
+        except ValidationError as e:
+            client_id = brut.get("client_id") if isinstance(brut, dict) else None
+            resultats.append(schemas.SyncResultat(
+                client_id=str(client_id) if client_id is not None else None,
+                statut="erreur",
+                detail=str(e.errors()[0]["msg"]) if e.errors() else "Données invalides",
+            ))
+            continue
+        valides.append(famille)
+
+    famille_ids = await run_in_threadpool(crud.bulk_create_familles, db, valides, current_user.id)
+
+    for famille, famille_id in zip(valides, famille_ids):
+        resultats.append(schemas.SyncResultat(client_id=famille.client_id, statut="cree", famille_id=famille_id))
+
+    return {"crees": len(famille_ids), "erreurs": len(resultats) - len(famille_ids), "resultats": resultats}
+
+
+@router.get("/changements", response_model=schemas.PageChangements)
+@budget_requetes(7)
+def lire_changements(
+    curseur: str = None,
+    appareil: str = "defaut",
+    limit: int = Query(200, ge=1, le=MAX_PAGE_CHANGEMENTS),
+    db: Session = Depends(get_read_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """
+    Familles créées, modifiées ou supprimées depuis `curseur`, dans le périmètre de l'utilisateur
+    (ses familles et celles situées dans ses zones). Sans curseur : reprise au dernier curseur
+    acquitté par l'appareil, ou depuis le début.
+    Le client applique la page, acquitte `curseur` (POST /api/sync/ack) et rappelle tant que `a_suivre`.
+    """
+    try:
+        position = crud.decode_curseur_sync(curseur) if curseur else crud.lire_curseur_sync(db, current_user.id, appareil)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    familles, suppressions, curseur_suivant, a_suivre = crud.changements_depuis(db, current_user, *position, limit=limit)
+    return {
+        "familles": familles,
+        "suppressions": suppressions,
+        "curseur": crud.encode_curseur_sync(*curseur_suivant),
+        "a_suivre": a_suivre,
+    }
+
+
+@router.post("/ack")
+def acquitter_changements(
+    acquittement: schemas.AcquittementSync,
+    db: Session = Depends(get_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """Enregistre le curseur jusqu'où l'appareil a appliqué les changements"""
+    try:
+        position = crud.decode_curseur_sync(acquittement.curseur)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    curseur = crud.acquitter_curseur_sync(db, current_user.id, acquittement.appareil, *position)
+    return {"curseur": crud.encode_curseur_sync(curseur.change_seq, curseur.famille_id)}
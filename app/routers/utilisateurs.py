@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session, joinedload
 from app import models, schemas, database
 from app.routers import auth
 from app.routers.auth import get_current_user
+from app.cache import invalider_utilisateur
 
 # --- Initialisation du router ---
 router = APIRouter(prefix="/utilisateurs", tags=["utilisateurs"])
@@ -142,8 +143,10 @@ def delete_utilisateur_html(
     if not db_user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
+    username = db_user.username
     db.delete(db_user)
     db.commit()
+    invalider_utilisateur(username)
 
     return RedirectResponse(url="/utilisateurs/?msg=Utilisateur+supprimé+✅", status_code=303)
 
@@ -162,6 +165,8 @@ def delete_utilisateur(
     if not db_user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
+    username = db_user.username
     db.delete(db_user)
     db.commit()
+    invalider_utilisateur(username)
     return {"message": "Utilisateur supprimé"}
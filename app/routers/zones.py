@@ -1,13 +1,17 @@
 # app/routers/zones.py
 
-from fastapi import APIRouter, Request, Depends, Query, UploadFile, File
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, UploadFile, File
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
 import pandas as pd
 
-from app import database, models
+from app import database, index_zones, models
 from app.routers.auth import get_current_user
+from app.utils.query_budget import budget_requetes
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -19,13 +23,15 @@ def definir_zone(request: Request, current_user: models.Utilisateur = Depends(ge
     return templates.TemplateResponse("zone_travail.html", {"request": request, "current_user": current_user})
 
 @router_html.get("/api/recherche-utilisateur", response_class=JSONResponse)
-def rechercher_utilisateur(q: str = Query(..., min_length=1), db: Session = Depends(database.get_db), current_user: models.Utilisateur = Depends(get_current_user)):
+def rechercher_utilisateur(q: str = Query(..., min_length=1), db: Session = Depends(database.get_read_db), current_user: models.Utilisateur = Depends(get_current_user)):
     utilisateurs = db.query(models.Utilisateur).filter(models.Utilisateur.username.ilike(f"%{q}%")).all()
     return [{"id": u.id, "nom": u.username, "role": u.role or "rôle non défini"} for u in utilisateurs]
 
 @router_html.get("/zones-attribuees", response_class=HTMLResponse)
-def afficher_zones_attribuees(request: Request, utilisateur_id: int = None, db: Session = Depends(database.get_db), current_user: models.Utilisateur = Depends(get_current_user)):
-    query = db.query(models.Zone).join(models.Utilisateur)
+@budget_requetes(3)
+def afficher_zones_attribuees(request: Request, utilisateur_id: int = None, db: Session = Depends(database.get_read_db), current_user: models.Utilisateur = Depends(get_current_user)):
+    # L'utilisateur de chaque zone vient de la jointure (le gabarit lit zone.utilisateur)
+    query = db.query(models.Zone).join(models.Zone.utilisateur).options(contains_eager(models.Zone.utilisateur))
     if utilisateur_id:
         query = query.filter(models.Zone.utilisateur_id == utilisateur_id)
     zones = query.all()
@@ -36,17 +42,40 @@ def afficher_zones_attribuees(request: Request, utilisateur_id: int = None, db:
 router_api = APIRouter(prefix="/api", tags=["zones"])
 
 @router_api.post("/import-zones")
-async def import_zones(file: UploadFile = File(...), db: Session = Depends(database.get_db)):
-    if file.filename.endswith(".csv"):
-        df = pd.read_csv(file.file)
-    else:
-        df = pd.read_excel(file.file)
+async def import_zones(file: UploadFile = File(...), db: AsyncSession = Depends(database.get_async_db)):
+    # Lecture du fichier (pandas, bloquant) hors de la boucle d'événements
+    lecteur = pd.read_csv if file.filename.endswith(".csv") else pd.read_excel
+    df = await run_in_threadpool(lecteur, file.file)
 
     zones = []
     for _, row in df.iterrows():
-        zone = models.Zone(utilisateur_id=row["utilisateur_id"], geojson=row["geojson"], is_synced=False)
-        db.add(zone)
-        zones.append({"utilisateur_id": row["utilisateur_id"], "geojson": row["geojson"]})
+        geometrie = json.loads(row["geojson"]) if isinstance(row["geojson"], str) else row["geojson"]
+        db.add(models.Zone(utilisateur_id=int(row["utilisateur_id"]), geometrie=geometrie))
+        zones.append({"utilisateur_id": int(row["utilisateur_id"]), "geojson": geometrie})
 
-    db.commit()
+    await db.commit()
     return {"message": f"{len(zones)} zones importées ✅", "zones": zones}
+
+
+def _zone_resume(zone: index_zones.ZonePreparee) -> dict:
+    return {"zone_id": zone.id, "utilisateur_id": zone.utilisateur_id}
+
+@router_api.get("/zones/contenant")
+@budget_requetes(3)
+def zones_contenant(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    db: Session = Depends(database.get_read_db),
+    current_user: models.Utilisateur = Depends(get_current_user)
+):
+    """Zones dont le polygone contient le point (index spatial en mémoire, voir index_zones.py)"""
+    return [_zone_resume(zone) for zone in index_zones.zones_contenant(db, lon, lat)]
+
+@router_api.get("/zones/{zone_id}/chevauchements")
+@budget_requetes(4)
+def zones_chevauchantes(zone_id: int, db: Session = Depends(database.get_read_db), current_user: models.Utilisateur = Depends(get_current_user)):
+    """Autres zones ayant une partie commune avec la zone (bord commun compris)"""
+    zone = db.get(models.Zone, zone_id)
+    if zone is None:
+        raise HTTPException(status_code=404, detail="Zone non trouvée")
+    return [_zone_resume(autre) for autre in index_zones.zones_chevauchant(db, zone)]
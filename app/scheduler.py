@@ -0,0 +1,41 @@
+import os
+import logging
+import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
+from app.database import SessionLocal
+from app import stats
+
+logger = logging.getLogger(__name__)
+
+# Fréquence de rafraîchissement des agrégats statistiques (secondes)
+STATS_REFRESH_SECONDS = int(os.getenv("STATS_REFRESH_SECONDS", "300"))
+
+scheduler = BackgroundScheduler(timezone="UTC")
+
+def rafraichir_statistiques():
+    db = SessionLocal()
+    try:
+        # Un planificateur par worker : le calcul n'est fait qu'une fois par intervalle, tous workers confondus
+        stats.rafraichir_agregats(db, age_min=STATS_REFRESH_SECONDS / 2)
+    except Exception:
+        logger.exception("Échec du rafraîchissement des agrégats statistiques")
+        db.rollback()
+    finally:
+        db.close()
+
+def demarrer():
+    scheduler.add_job(
+        rafraichir_statistiques,
+        "interval",
+        seconds=STATS_REFRESH_SECONDS,
+        id="rafraichir_statistiques",
+        next_run_time=datetime.datetime.now(datetime.timezone.utc),
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    scheduler.start()
+
+def arreter():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
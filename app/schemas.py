@@ -84,6 +84,76 @@ class FamilleResponse(FamilleBase):
         orm_mode = True
 
 
+# --- Doublons ---
+class GroupeDoublons(BaseModel):
+    cle: str
+    nb: int
+    membres: List[MembreResponse] = []
+
+
+class PageDoublons(BaseModel):
+    groupes: List[GroupeDoublons] = []
+    apres: Optional[str] = None  # à renvoyer pour obtenir la page suivante
+
+
+# --- Synchronisation groupée (file hors ligne) ---
+class FamilleSync(FamilleCreate):
+    client_id: str  # clé de l'enregistrement dans la file IndexedDB
+
+
+class SyncResultat(BaseModel):
+    client_id: Optional[str] = None
+    statut: str  # "cree" ou "erreur"
+    famille_id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class SyncReponse(BaseModel):
+    crees: int
+    erreurs: int
+    resultats: List[SyncResultat] = []
+
+
+# --- Synchronisation différentielle (flux de changements) ---
+class FamilleChangement(FamilleBase):
+    id: int
+    created_at: datetime.datetime
+    created_by_id: Optional[int] = None
+    updated_at: Optional[datetime.datetime] = None
+    change_seq: int
+    membres: List[Membre] = []
+
+    class Config:
+        from_attributes = True
+
+
+class PageChangements(BaseModel):
+    familles: List[FamilleChangement] = []
+    suppressions: List[int] = []   # identifiants des familles supprimées
+    curseur: str                   # à acquitter une fois la page appliquée, puis à renvoyer
+    a_suivre: bool                 # True : rappeler immédiatement avec `curseur`
+
+
+class AcquittementSync(BaseModel):
+    curseur: str
+    appareil: str = "defaut"
+
+
+class FamilleEnAttente(BaseModel):
+    id: int
+    name: str
+    city: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class FamillePage(BaseModel):
+    familles: List[FamilleResponse] = []
+    curseur_suivant: Optional[str] = None
+
+
 # --- Utilisateurs ---
 class UtilisateurBase(BaseModel):
     username: str
@@ -1,9 +1,111 @@
+"""
+Hachage des mots de passe (bcrypt) hors des threads de requêtes.
+
+bcrypt est volontairement coûteux en CPU : à la prise de poste, des centaines de
+connexions simultanées saturaient le pool de threads et bloquaient les autres pages.
+Le calcul est confié à un pool de processus dédié (HASH_WORKERS) ; au-delà de
+HASH_MAX_EN_ATTENTE calculs en cours ou en file, la demande est refusée tout de suite
+(HachageSature -> 503 + Retry-After) plutôt que d'allonger la file.
+
+Un hash dont le coût diffère de BCRYPT_ROUNDS est recalculé à la connexion suivante
+(verify_and_update), sans intervention.
+"""
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_EN_ATTENTE = int(os.getenv("HASH_MAX_EN_ATTENTE", "64"))
+HASH_RETRY_AFTER_SECONDS = 2
 
-def get_password_hash(password: str) -> str:
+# min = max = coût configuré : tout autre coût (plus faible ou plus élevé) est à recalculer
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_pool = None
+_en_cours = 0
+_refus = 0          # demandes refusées depuis le démarrage (exposé sur /metrics)
+_lock = threading.Lock()
+
+
+class HachageSature(Exception):
+    """Trop de calculs de hash en attente : réessayer dans quelques secondes"""
+
+
+# --- Fonctions exécutées dans les processus du pool ---
+def _hacher(password: str) -> str:
     return pwd_context.hash(password)
 
+def _verifier(plain_password: str, hashed_password: str):
+    """(mot de passe valide, nouveau hash ou None si le hash actuel est au bon coût)"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# --- Pool borné ---
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Pas de fork : le pool naît d'un thread de requête, dans un processus qui a déjà
+            # d'autres threads (pool uvicorn, planificateur, pools SQLAlchemy) ; un fork hériterait
+            # de leurs verrous (journalisation...) et pourrait bloquer le processus fils.
+            # forkserver : les fils partent d'un processus serveur mono-thread.
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+def _liberer(future):
+    global _en_cours
+    with _lock:
+        _en_cours -= 1
+
+def _soumettre(fonction, *args):
+    global _en_cours, _refus
+    with _lock:
+        if _en_cours >= HASH_MAX_EN_ATTENTE:
+            _refus += 1
+            raise HachageSature()
+        _en_cours += 1
+    try:
+        future = _get_pool().submit(fonction, *args)
+    except Exception:
+        _liberer(None)
+        raise
+    future.add_done_callback(_liberer)
+    return future
+
+def etat_pool() -> dict:
+    return {"en_attente": _en_cours, "refus": _refus}
+
+def arreter_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# --- API synchrone (routes def, scripts) : le thread attend sans calculer ---
+def get_password_hash(password: str) -> str:
+    return _soumettre(_hacher, password).result()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _soumettre(_verifier, plain_password, hashed_password).result()[0]
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    return _soumettre(_verifier, plain_password, hashed_password).result()
+
+
+# --- API asynchrone (routes async) : ni la boucle ni un thread ne sont occupés ---
+async def get_password_hash_async(password: str) -> str:
+    return await asyncio.wrap_future(_soumettre(_hacher, password))
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    return await asyncio.wrap_future(_soumettre(_verifier, plain_password, hashed_password))
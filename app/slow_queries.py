@@ -0,0 +1,131 @@
+"""
+Journal des requêtes SQL lentes (optionnel : activé si SLOW_QUERY_MS est défini).
+
+Chaque instruction plus longue que le seuil est enregistrée avec ses paramètres
+masqués, la route appelante et le plan d'exécution (EXPLAIN sans ANALYZE : la requête
+n'est pas rejouée). Le plan est calculé sur un thread d'arrière-plan, une seule fois
+par texte SQL sur la fenêtre EXPLAIN_TTL_SECONDS, pour ne pas ralentir la requête.
+
+Sorties : fichier tournant SLOW_QUERY_LOG et page /admin/requetes-lentes
+(les SLOW_QUERY_KEEP dernières entrées, en mémoire du processus).
+"""
+import os
+import time
+import datetime
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import event
+from app.metrics import mesure_courante, gabarit_route
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))             # 0 : désactivé
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/requetes_lentes.log")
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "200"))
+EXPLAIN_TTL_SECONDS = 600
+
+logger = logging.getLogger("rgpl.requetes_lentes")
+
+entrees = deque(maxlen=SLOW_QUERY_KEEP)   # plus récentes à droite
+_plans = {}                               # texte SQL -> (horodatage, plan)
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+
+
+def masquer(parametres):
+    """Garde les nombres et booléens, remplace le texte (noms, dates de naissance…) par son type et sa longueur"""
+    if isinstance(parametres, dict):
+        return {cle: masquer(valeur) for cle, valeur in parametres.items()}
+    if isinstance(parametres, (list, tuple)):
+        return [masquer(valeur) for valeur in parametres]
+    if parametres is None or isinstance(parametres, (bool, int, float)):
+        return parametres
+    if isinstance(parametres, (str, bytes)):
+        return f"<{type(parametres).__name__}:{len(parametres)}>"
+    return f"<{type(parametres).__name__}>"
+
+
+def _expliquer(engine, statement: str, parametres) -> str:
+    with engine.connect() as conn:
+        conn = conn.execution_options(requete_lente_explain=True)
+        if engine.dialect.name == "postgresql":
+            # Paramètres DBAPI d'origine : le texte SQL est déjà au format du pilote
+            lignes = conn.exec_driver_sql(f"EXPLAIN (ANALYZE off) {statement}", parametres).all()
+            return "\n".join(ligne[0] for ligne in lignes)
+        if engine.dialect.name == "sqlite":
+            lignes = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parametres).all()
+            return "\n".join(ligne[-1] for ligne in lignes)
+        return ""
+
+
+def _completer_plan(engine, entree: dict, parametres):
+    statement = entree["sql"]
+    with _lock:
+        connu = _plans.get(statement)
+    if connu and time.time() - connu[0] < EXPLAIN_TTL_SECONDS:
+        plan = connu[1]
+    else:
+        try:
+            plan = _expliquer(engine, statement, parametres)
+        except Exception as e:
+            plan = f"EXPLAIN impossible : {e}"
+        with _lock:
+            if len(_plans) >= 1000:
+                _plans.clear()
+            _plans[statement] = (time.time(), plan)
+    entree["plan"] = plan
+    _journaliser(entree)
+
+
+def _journaliser(entree: dict):
+    logger.warning(
+        "%.0f ms | %s | params=%s\n%s\n%s",
+        entree["duree_ms"], entree["route"], entree["parametres"], entree["sql"], entree["plan"] or "",
+    )
+
+
+def _avant_execution(conn, cursor, statement, parameters, context, executemany):
+    context._lente_debut = time.perf_counter()
+
+
+def _apres_execution(conn, cursor, statement, parameters, context, executemany):
+    duree_ms = (time.perf_counter() - context._lente_debut) * 1000
+    if duree_ms < SLOW_QUERY_MS or context.execution_options.get("requete_lente_explain"):
+        return
+    mesure = mesure_courante.get()
+    entree = {
+        "horodatage": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "duree_ms": round(duree_ms, 1),
+        "route": gabarit_route(mesure.scope) if mesure and mesure.scope else "<hors_requete>",
+        "sql": statement,
+        "parametres": masquer(parameters),
+        "plan": None,
+    }
+    entrees.append(entree)
+    # Plan uniquement pour les lectures (pas d'EXPLAIN sur les insertions groupées executemany)
+    if statement.lstrip().upper().startswith(("SELECT", "WITH")) and not executemany:
+        _executor.submit(_completer_plan, conn.engine, entree, parameters)
+    else:
+        entree["plan"] = ""
+        _journaliser(entree)
+
+
+def activer(engine):
+    """Branche le journal sur `engine` si SLOW_QUERY_MS est défini (appelé par database.py)"""
+    if SLOW_QUERY_MS <= 0:
+        return False
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+        handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+    event.listen(engine, "before_cursor_execute", _avant_execution)
+    event.listen(engine, "after_cursor_execute", _apres_execution)
+    return True
+
+
+def actif() -> bool:
+    return SLOW_QUERY_MS > 0
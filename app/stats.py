@@ -1,6 +1,10 @@
+import time
+import datetime
+import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from . import models
+from sqlalchemy import func, delete, insert, literal, select, tuple_, union_all
+from . import models, crud, events
+from .cache import cached, invalider_compteurs, PREFIXE_COMPTEURS
 
 def get_global_stats(db: Session):
     total_familles = db.query(models.Famille).count()
@@ -27,3 +31,187 @@ def get_stats_par_agent(db: Session):
     )
 
     return [{"agent": agent, "familles_renseignees": count} for agent, count in stats_agents]
+
+
+# --- Répartitions des membres (page statistiques) ---
+DIMENSIONS = {
+    "genres": models.Membre.gender,
+    "provinces": models.Membre.province,
+    "roles": models.Membre.role,
+    "villes": models.Membre.city,
+}
+
+def filtrer_membres(query, annee: int = None, depuis: int = None):
+    """Filtres sur birth_year (colonne indexée) : parcours d'intervalle sur l'index"""
+    if annee:
+        query = query.filter(models.Membre.birth_year == annee)
+    elif depuis:
+        annee_min = datetime.datetime.now().year - depuis
+        query = query.filter(models.Membre.birth_year >= annee_min)
+    return query
+
+def _repartitions_grouping_sets(db: Session, annee: int = None, depuis: int = None) -> dict:
+    """PostgreSQL : toutes les répartitions en un seul parcours avec GROUPING SETS"""
+    colonnes = {**DIMENSIONS, "naissances": models.Membre.birth_year}
+    labels = {nom: colonne.label(nom) for nom, colonne in colonnes.items()}
+
+    query = filtrer_membres(db.query(models.Membre), annee, depuis).with_entities(
+        *labels.values(),
+        *[func.grouping(colonne).label(f"g_{nom}") for nom, colonne in colonnes.items()],
+        func.count().label("nb"),
+    ).group_by(func.grouping_sets(*[tuple_(colonne) for colonne in colonnes.values()], tuple_()))
+
+    repartitions = {nom: {} for nom in colonnes}
+    repartitions["total_membres"] = 0
+    for ligne in query.all():
+        groupees = [nom for nom in colonnes if getattr(ligne, f"g_{nom}") == 0]
+        if not groupees:
+            repartitions["total_membres"] = ligne.nb  # ensemble vide () : total
+            continue
+        nom = groupees[0]
+        valeur = getattr(ligne, nom)
+        if valeur not in (None, ""):
+            repartitions[nom][valeur] = ligne.nb
+    repartitions["naissances"] = dict(sorted(repartitions["naissances"].items()))
+    return repartitions
+
+def _repartitions_pandas(db: Session, annee: int = None, depuis: int = None, taille_lot: int = 50000) -> dict:
+    """Autres bases : une seule lecture en flux, agrégée par lots avec pandas"""
+    colonnes = {**DIMENSIONS, "naissances": models.Membre.birth_year}
+    query = filtrer_membres(db.query(models.Membre), annee, depuis).with_entities(
+        *[colonne.label(nom) for nom, colonne in colonnes.items()]
+    )
+
+    compteurs = {nom: pd.Series(dtype="int64") for nom in colonnes}
+    total = 0
+    resultat = db.execute(query.statement.execution_options(stream_results=True, yield_per=taille_lot))
+    for lot in resultat.partitions():
+        df = pd.DataFrame(lot, columns=list(colonnes))
+        total += len(df)
+        for nom in colonnes:
+            valeurs = df[nom][df[nom].notna() & (df[nom] != "")]
+            compteurs[nom] = compteurs[nom].add(valeurs.value_counts(), fill_value=0)
+
+    repartitions = {nom: {k: int(v) for k, v in serie.items()} for nom, serie in compteurs.items()}
+    repartitions["naissances"] = {int(k): v for k, v in sorted(repartitions["naissances"].items())}
+    repartitions["total_membres"] = total
+    return repartitions
+
+def calculer_repartitions(db: Session, annee: int = None, depuis: int = None) -> dict:
+    """
+    Total des membres et répartitions par genre, province, rôle, ville et année de naissance,
+    calculés en un seul parcours de la table (filtres annee / depuis optionnels).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _repartitions_grouping_sets(db, annee, depuis)
+    return _repartitions_pandas(db, annee, depuis)
+
+
+# --- Agrégats précalculés (rafraîchis par le planificateur, voir app/scheduler.py) ---
+def calculer_agregats(db: Session) -> list:
+    repartitions = calculer_repartitions(db)
+    totaux = {
+        "familles": db.query(models.Famille).count(),
+        "membres": repartitions.pop("total_membres"),
+        "utilisateurs": db.query(models.Utilisateur).count(),
+        "libreville": db.query(models.Membre).filter(func.lower(models.Membre.city) == "libreville").count(),
+        "doublons": crud.requete_groupes_doublons(db).count(),
+    }
+
+    maintenant = datetime.datetime.utcnow()
+    lignes = [{"dimension": "totaux", "valeur": k, "total": v, "updated_at": maintenant} for k, v in totaux.items()]
+    for dimension, valeurs in repartitions.items():
+        lignes += [
+            {"dimension": dimension, "valeur": str(k), "total": v, "updated_at": maintenant}
+            for k, v in valeurs.items()
+        ]
+    return lignes
+
+# Verrou consultatif PostgreSQL : un seul worker recalcule les agrégats à la fois
+VERROU_AGREGATS = 910009
+
+def _prendre_rafraichissement(db: Session, age_min: float) -> bool:
+    """
+    Chaque worker a son planificateur : le premier qui prend le verrou recalcule, les autres
+    passent leur tour, de même que si le dernier calcul a moins de `age_min` secondes.
+    Verrou de transaction : libéré au commit / rollback.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        if not db.scalar(select(func.pg_try_advisory_xact_lock(VERROU_AGREGATS))):
+            return False
+    if age_min:
+        dernier = db.scalar(select(func.max(models.StatistiqueAgregat.updated_at)))
+        if dernier and datetime.datetime.utcnow() - dernier < datetime.timedelta(seconds=age_min):
+            return False
+    return True
+
+def rafraichir_agregats(db: Session, age_min: float = 0) -> bool:
+    """
+    Recalcule tous les agrégats et remet à zéro les variations dans une seule transaction
+    (les lecteurs voient l'ancien jeu jusqu'au commit).
+    PostgreSQL : transaction REPEATABLE READ, le calcul et la remise à zéro portent sur le même
+    instantané ; une variation validée pendant le calcul n'y figure pas et reste en table.
+    Retourne False si un autre worker s'en charge ou l'a fait depuis moins de `age_min` secondes.
+    """
+    # Repère des tableaux de bord : les variations reçues après cet instant peuvent manquer au calcul
+    instant = time.monotonic()
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    rafraichi = _prendre_rafraichissement(db, age_min)
+    if rafraichi:
+        lignes = calculer_agregats(db)
+        db.execute(delete(models.StatistiqueAgregat))
+        db.execute(insert(models.StatistiqueAgregat), lignes)
+        db.execute(delete(models.VariationStatistique))
+        db.commit()
+        agregats = _agregats_depuis_lignes((l["dimension"], l["valeur"], l["total"]) for l in lignes)
+    else:
+        db.rollback()
+        instant = time.monotonic()
+        agregats = _charger_agregats(db, calcul_si_vide=False)
+    invalider_compteurs()
+    if not agregats["totaux"]:
+        return rafraichi  # table pas encore remplie par le worker qui a le verrou
+    # 📡 Valeurs exactes pour recaler les tableaux de bord en direct de ce worker (voir tableau_de_bord.py)
+    events.publier("agregats", {"totaux": agregats["totaux"], "provinces": agregats["provinces"], "instant": instant})
+    return rafraichi
+
+def lire_agregats(db: Session, en_cache: bool = True) -> dict:
+    """
+    {"totaux": {...}, "genres": {...}, ...} : agrégats du dernier recalcul plus les variations
+    enregistrées depuis par les écritures (voir deltas.py), mis en cache (TTL, vidé à chaque écriture)
+    """
+    if not en_cache:
+        return _charger_agregats(db)
+    return cached(f"{PREFIXE_COMPTEURS}agregats", lambda: _charger_agregats(db))
+
+def _charger_agregats(db: Session, calcul_si_vide: bool = True) -> dict:
+    # Une seule instruction : agrégats et variations lus dans le même instantané
+    # (un recalcul validé entre deux lectures compterait les variations deux fois)
+    agregat, variation = models.StatistiqueAgregat, models.VariationStatistique
+    union = union_all(
+        select(agregat.dimension, agregat.valeur, agregat.total.label("total"), literal(1).label("recalcul")),
+        select(variation.dimension, variation.valeur, variation.variation.label("total"), literal(0).label("recalcul")),
+    ).subquery()
+    resultat = db.execute(
+        select(union.c.dimension, union.c.valeur, func.sum(union.c.total), func.max(union.c.recalcul))
+        .group_by(union.c.dimension, union.c.valeur)
+    ).all()
+    if any(recalcul for *_, recalcul in resultat):
+        lignes = [(dimension, valeur, int(total)) for dimension, valeur, total, _ in resultat]
+    elif calcul_si_vide:
+        # Table pas encore remplie par le planificateur : calcul à la volée, sans écriture
+        # (la session peut venir de la réplique en lecture seule)
+        lignes = [(l["dimension"], l["valeur"], l["total"]) for l in calculer_agregats(db)]
+    else:
+        lignes = []
+    return _agregats_depuis_lignes(lignes)
+
+def _agregats_depuis_lignes(lignes) -> dict:
+    agregats = {"totaux": {}, **{dimension: {} for dimension in DIMENSIONS}, "naissances": {}}
+    for dimension, valeur, total in lignes:
+        # Valeur disparue depuis le recalcul (dernier membre supprimé) : plus affichée
+        if total or dimension == "totaux":
+            agregats.setdefault(dimension, {})[valeur] = total
+    agregats["naissances"] = dict(sorted(agregats["naissances"].items()))
+    return agregats
@@ -0,0 +1,123 @@
+"""
+État de synchronisation diffusé en temps réel (Server-Sent Events, /api/sync-status/stream).
+
+Une seule tâche par processus interroge la base toutes les SYNC_STATUS_INTERVALLE secondes
+(un COUNT groupé par agent sur l'index partiel ix_familles_non_synchronisees) et ne pousse
+aux abonnés que ce qui a changé : un agent reçoit son nombre de familles en attente, un
+superviseur les totaux et le détail par agent. Le coût en base ne dépend donc pas du
+nombre de navigateurs ouverts ; la tâche s'arrête quand le dernier abonné se déconnecte.
+"""
+import os
+import asyncio
+import logging
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+from app import database, models
+from app.stats import lire_agregats
+from app.utils.sse import HEARTBEAT_SECONDS
+
+SYNC_STATUS_INTERVALLE = float(os.getenv("SYNC_STATUS_INTERVALLE", "2"))
+# Commentaire SSE périodique : garde la connexion ouverte derrière les proxys
+SYNC_STATUS_HEARTBEAT = float(os.getenv("SYNC_STATUS_HEARTBEAT", str(HEARTBEAT_SECONDS)))
+# Rôles qui suivent tous les agents
+ROLES_SUPERVISION = ("super_admin", "super_utilisateur", "superviseur_provincial")
+
+logger = logging.getLogger(__name__)
+
+
+class Abonne:
+    """File d'un flux SSE : seul le dernier état compte, un client lent ne reçoit que le plus récent"""
+
+    def __init__(self, agent_id: int = None):
+        self.agent_id = agent_id          # None : superviseur (totaux + détail par agent)
+        self.file = asyncio.Queue(maxsize=1)
+        self.derniere_vue = None
+
+    def pousser(self, etat: dict):
+        """Met l'état en file s'il diffère du dernier envoyé à cet abonné"""
+        nouvelle_vue = vue(etat, self)
+        if nouvelle_vue == self.derniere_vue:
+            return
+        self.derniere_vue = nouvelle_vue
+        if self.file.full():
+            self.file.get_nowait()
+        self.file.put_nowait(nouvelle_vue)
+
+
+_abonnes: set = set()
+_dernier_etat: dict = None
+_tache: asyncio.Task = None
+
+
+def en_attente_par_agent(db) -> dict:
+    """{agent_id: nombre de familles non synchronisées} (parcours de l'index partiel)"""
+    lignes = db.execute(
+        select(models.Famille.created_by_id, func.count())
+        .where(models.Famille.is_synced == False)
+        .group_by(models.Famille.created_by_id)
+    ).all()
+    return {agent_id: nb for agent_id, nb in lignes}
+
+
+def en_attente_agent(db, agent_id: int) -> int:
+    return db.scalar(
+        select(func.count()).select_from(models.Famille)
+        .where(models.Famille.is_synced == False, models.Famille.created_by_id == agent_id)
+    )
+
+
+def lire_etat() -> dict:
+    db = database.ReadSessionLocal()
+    try:
+        agents = en_attente_par_agent(db)
+        totaux = {
+            "familles": lire_agregats(db)["totaux"].get("familles", 0),
+            "en_attente": sum(agents.values()),
+        }
+        return {"totaux": totaux, "agents": agents}
+    finally:
+        db.close()
+
+
+def vue(etat: dict, abonne: Abonne) -> dict:
+    if abonne.agent_id is None:
+        return {"totaux": etat["totaux"], "agents": {str(k): v for k, v in etat["agents"].items()}}
+    return {"en_attente": etat["agents"].get(abonne.agent_id, 0)}
+
+
+async def _surveiller():
+    global _dernier_etat
+    while _abonnes:
+        try:
+            etat = await run_in_threadpool(lire_etat)
+        except Exception as e:
+            logger.warning("Lecture de l'état de synchronisation impossible : %s", e)
+        else:
+            _dernier_etat = etat
+            for abonne in list(_abonnes):
+                abonne.pousser(etat)
+        await asyncio.sleep(SYNC_STATUS_INTERVALLE)
+
+
+def abonner(agent_id: int = None) -> Abonne:
+    global _tache
+    abonne = Abonne(agent_id)
+    _abonnes.add(abonne)
+    if _dernier_etat is not None:
+        abonne.pousser(_dernier_etat)  # état connu tout de suite, sans attendre le prochain tour
+    if _tache is None or _tache.done():
+        _tache = asyncio.create_task(_surveiller())
+    return abonne
+
+
+def desabonner(abonne: Abonne):
+    global _dernier_etat
+    _abonnes.discard(abonne)
+    if not _abonnes:
+        _dernier_etat = None  # la tâche s'arrête : l'état gardé ne serait plus tenu à jour
+
+
+def arreter():
+    if _tache is not None:
+        _tache.cancel()
+    _abonnes.clear()
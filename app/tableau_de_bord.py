@@ -0,0 +1,171 @@
+"""
+Compteurs en direct des tableaux de bord (/home, /admin/dashboard) : flux SSE
+/api/tableau-de-bord/stream.
+
+À la connexion, le client reçoit un événement "etat" (valeurs absolues, lues une fois dans
+les agrégats). Ensuite, les variations publiées par les écritures (sujet "compteurs",
+voir deltas.py) sont cumulées et envoyées groupées toutes les TABLEAU_DE_BORD_COALESCE_SECONDS
+en un événement "delta" : une rafale de synchronisations ne produit qu'un message par période,
+et aucune requête de comptage n'est rejouée, quel que soit le nombre de superviseurs connectés.
+
+Chaque rafraîchissement des agrégats (sujet "agregats", planificateur) renvoie un "etat"
+exact : les écritures traitées par un autre worker y sont rattrapées. Les variations reçues
+depuis le début de la lecture (champ "instant", time.monotonic) sont gardées dans un journal
+et rejouées sur les valeurs lues : une écriture validée pendant le calcul n'est pas perdue.
+
+Le worker n'écoute le sujet "compteurs" que tant qu'un client est connecté : sans tableau de
+bord ouvert, deltas.py ne calcule ni ne publie rien.
+"""
+import os
+import copy
+import time
+import asyncio
+import threading
+from collections import deque
+from starlette.concurrency import run_in_threadpool
+from app import database, deltas, events
+from app.stats import lire_agregats
+
+TABLEAU_DE_BORD_COALESCE_SECONDS = float(os.getenv("TABLEAU_DE_BORD_COALESCE_SECONDS", "1"))
+COMPTEURS = ("familles", "membres", "utilisateurs", "libreville", "doublons")
+TABLEAU_DE_BORD_JOURNAL_MAX = int(os.getenv("TABLEAU_DE_BORD_JOURNAL_MAX", "10000"))
+
+
+class Abonne:
+    def __init__(self):
+        self.file = asyncio.Queue(maxsize=100)
+
+    def pousser(self, type_: str, donnees: dict):
+        if self.file.full():
+            # Client trop lent : on remplace les variations en retard par l'état complet
+            while not self.file.empty():
+                self.file.get_nowait()
+            type_, donnees = "etat", copy.deepcopy(_etat)
+        self.file.put_nowait((type_, donnees))
+
+
+_abonnes: set = set()
+_etat: dict = None           # valeurs absolues connues, None sans abonné
+_en_attente: dict = {}       # variations reçues depuis le dernier envoi
+_journal = deque(maxlen=TABLEAU_DE_BORD_JOURNAL_MAX)  # (instant, variation) depuis la dernière lecture
+_recaler = False             # un "etat" complet est à envoyer au prochain tour
+_lock = threading.Lock()
+_tache: asyncio.Task = None
+_a_l_ecoute = False          # _recevoir_compteurs abonné au bus
+
+
+def fusionner(cible: dict, delta: dict):
+    for cle, valeur in delta.items():
+        if isinstance(valeur, dict):
+            fusionner(cible.setdefault(cle, {}), valeur)
+        else:
+            cible[cle] = cible.get(cle, 0) + valeur
+
+
+def etat_depuis_agregats(totaux: dict, provinces: dict) -> dict:
+    return {**{cle: totaux.get(cle, 0) for cle in COMPTEURS}, "provinces": {k: int(v) for k, v in provinces.items()}}
+
+
+def _charger_etat() -> tuple:
+    """(instant, agrégats lus hors cache) : une valeur en cache pourrait précéder l'instant"""
+    db = database.ReadSessionLocal()
+    try:
+        instant = time.monotonic()
+        return instant, lire_agregats(db, en_cache=False)
+    finally:
+        db.close()
+
+
+def _recaler_etat(totaux: dict, provinces: dict, instant: float):
+    """
+    Nouvel état absolu : valeurs lues à partir de `instant`, plus les variations reçues depuis
+    (absentes de la lecture). À appeler sous _lock.
+    """
+    global _etat, _en_attente, _journal
+    etat = etat_depuis_agregats(totaux, provinces)
+    _journal = deque(((recu, delta) for recu, delta in _journal if recu >= instant), maxlen=TABLEAU_DE_BORD_JOURNAL_MAX)
+    for _, delta in _journal:
+        fusionner(etat, delta)
+    _etat, _en_attente = etat, {}
+
+
+# --- Abonnements au bus (appelés dans le thread de l'écriture) ---
+def _recevoir_compteurs(delta: dict):
+    with _lock:
+        _journal.append((time.monotonic(), delta))
+        fusionner(_en_attente, delta)
+
+
+def _recevoir_agregats(donnees: dict):
+    global _recaler
+    with _lock:
+        if _etat is not None:
+            _recaler_etat(donnees["totaux"], donnees["provinces"], donnees["instant"])
+            _recaler = True
+
+
+def _ecouter(actif: bool):
+    """(Dés)abonne _recevoir_compteurs ; appelé depuis la boucle async uniquement"""
+    global _a_l_ecoute
+    if actif and not _a_l_ecoute:
+        events.abonner(deltas.SUJET, _recevoir_compteurs)
+    elif not actif and _a_l_ecoute:
+        events.desabonner(deltas.SUJET, _recevoir_compteurs)
+    _a_l_ecoute = actif
+
+
+events.abonner("agregats", _recevoir_agregats)
+
+
+async def _diffuser():
+    global _en_attente, _recaler
+    while _abonnes:
+        await asyncio.sleep(TABLEAU_DE_BORD_COALESCE_SECONDS)
+        with _lock:
+            if _etat is None:
+                continue
+            delta, _en_attente = _en_attente, {}
+            recaler, _recaler = _recaler, False
+            fusionner(_etat, delta)
+            if recaler:
+                for abonne in list(_abonnes):
+                    abonne.pousser("etat", copy.deepcopy(_etat))
+            elif delta:
+                for abonne in list(_abonnes):
+                    abonne.pousser("delta", delta)
+
+
+async def abonner() -> Abonne:
+    global _tache
+    if _etat is None:
+        # 👂 Écoute avant la lecture : les variations validées pendant celle-ci vont au journal
+        _ecouter(True)
+        instant, agregats = await run_in_threadpool(_charger_etat)
+        with _lock:
+            if _etat is None:
+                _recaler_etat(agregats["totaux"], agregats.get("provinces", {}), instant)
+    abonne = Abonne()
+    with _lock:
+        abonne.pousser("etat", copy.deepcopy(_etat))
+    _abonnes.add(abonne)
+    if _tache is None or _tache.done():
+        _tache = asyncio.create_task(_diffuser())
+    return abonne
+
+
+def desabonner(abonne: Abonne):
+    global _etat, _en_attente
+    _abonnes.discard(abonne)
+    if not _abonnes:
+        _ecouter(False)
+        with _lock:
+            # Plus personne à tenir à jour : le prochain abonné relira les agrégats
+            _etat, _en_attente = None, {}
+            _journal.clear()
+
+
+def arreter():
+    if _tache is not None:
+        _tache.cancel()
+    _abonnes.clear()
+    _ecouter(False)
@@ -1,13 +1,55 @@
 import os
 import time
 import uuid
+import tempfile
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Lecture par morceaux : la mémoire utilisée par upload reste constante
+CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "10")) * 1024 * 1024
+
 def generate_family_filename(famille_id: int, original_filename: str) -> str:
     ext = os.path.splitext(original_filename)[1]
     unique_name = f"famille_{famille_id}_{int(time.time())}{ext}"
     return unique_name
 
+def _supprimer(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def recevoir_upload(upload: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> str:
+    """
+    Copie l'upload par morceaux dans un fichier temporaire de UPLOAD_DIR, hors de la
+    boucle d'événements, et retourne son chemin. Lève 413 dès que la limite est dépassée.
+    """
+    fd, tmp_path = await run_in_threadpool(tempfile.mkstemp, dir=UPLOAD_DIR, prefix=".upload_", suffix=".part")
+    taille = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await upload.read(CHUNK_SIZE):
+                taille += len(chunk)
+                if taille > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Photo trop volumineuse (maximum {max_size // (1024 * 1024)} Mo)"
+                    )
+                await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(_supprimer, tmp_path)
+        raise
+    return tmp_path
+
+async def finaliser_upload(tmp_path: str, filename: str) -> str:
+    """Renomme atomiquement le fichier temporaire vers son nom définitif"""
+    await run_in_threadpool(os.replace, tmp_path, os.path.join(UPLOAD_DIR, filename))
+    return filename
+
+async def abandonner_upload(tmp_path: str):
+    await run_in_threadpool(_supprimer, tmp_path)
@@ -0,0 +1,130 @@
+"""
+Géométrie des zones de travail (GeoJSON stocké dans zones.geometrie).
+
+Coordonnées GeoJSON : [longitude, latitude]. Les zones font quelques kilomètres :
+calcul plan, sans projection.
+"""
+import math
+
+# Longueur d'un degré de latitude (et de longitude à l'équateur)
+KM_PAR_DEGRE = 111.32
+
+
+def polygones(geojson) -> list:
+    """
+    Liste des polygones d'un GeoJSON (Polygon, MultiPolygon, Feature, FeatureCollection,
+    GeometryCollection) ; chaque polygone est une liste d'anneaux, le premier extérieur,
+    les suivants des trous.
+    """
+    if not isinstance(geojson, dict):
+        return []
+    type_ = geojson.get("type")
+    if type_ == "Feature":
+        return polygones(geojson.get("geometry"))
+    if type_ == "FeatureCollection":
+        return [p for feature in geojson.get("features") or [] for p in polygones(feature)]
+    if type_ == "GeometryCollection":
+        return [p for geometrie in geojson.get("geometries") or [] for p in polygones(geometrie)]
+    if type_ == "Polygon":
+        return [geojson.get("coordinates") or []]
+    if type_ == "MultiPolygon":
+        return list(geojson.get("coordinates") or [])
+    return []
+
+
+def bbox(geojson):
+    """(lon_min, lat_min, lon_max, lat_max), ou None si le GeoJSON ne contient aucun polygone"""
+    points = [point for polygone in polygones(geojson) for anneau in polygone[:1] for point in anneau]
+    if not points:
+        return None
+    lons = [float(p[0]) for p in points]
+    lats = [float(p[1]) for p in points]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _dans_anneau(lon: float, lat: float, anneau) -> bool:
+    """Lancer de rayon (règle pair-impair)"""
+    dedans = False
+    j = len(anneau) - 1
+    for i in range(len(anneau)):
+        xi, yi = float(anneau[i][0]), float(anneau[i][1])
+        xj, yj = float(anneau[j][0]), float(anneau[j][1])
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            dedans = not dedans
+        j = i
+    return dedans
+
+
+def point_dans_polygone(lon: float, lat: float, polygone) -> bool:
+    if not polygone or not _dans_anneau(lon, lat, polygone[0]):
+        return False
+    return not any(_dans_anneau(lon, lat, trou) for trou in polygone[1:])
+
+
+def point_dans_zone(lon: float, lat: float, geojson) -> bool:
+    if lon is None or lat is None:
+        return False
+    return any(point_dans_polygone(lon, lat, p) for p in polygones(geojson))
+
+
+def superficie_km2(geojson) -> float:
+    """
+    Superficie approchée (km²) : formule du lacet après projection équirectangulaire
+    autour de la latitude moyenne, trous déduits.
+    """
+    emprise = bbox(geojson)
+    if emprise is None:
+        return 0.0
+    cos_lat = math.cos(math.radians((emprise[1] + emprise[3]) / 2))
+    total = 0.0
+    for polygone in polygones(geojson):
+        for rang, anneau in enumerate(polygone):
+            aire = abs(sum(
+                float(a[0]) * float(b[1]) - float(b[0]) * float(a[1])
+                for a, b in zip(anneau, list(anneau[1:]) + list(anneau[:1]))
+            )) / 2
+            total += aire if rang == 0 else -aire
+    return max(total, 0.0) * KM_PAR_DEGRE ** 2 * cos_lat
+
+
+def emprises_se_coupent(a, b) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _orientation(p, q, r) -> float:
+    return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+
+def segments_se_coupent(p1, p2, q1, q2) -> bool:
+    """Intersection (contact compris) des segments [p1 p2] et [q1 q2]"""
+    d1, d2 = _orientation(q1, q2, p1), _orientation(q1, q2, p2)
+    d3, d4 = _orientation(p1, p2, q1), _orientation(p1, p2, q2)
+    if ((d1 > 0) != (d2 > 0) and d1 and d2) and ((d3 > 0) != (d4 > 0) and d3 and d4):
+        return True
+
+    def sur_segment(a, b, c):
+        return min(a[0], b[0]) <= c[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= c[1] <= max(a[1], b[1])
+
+    return (
+        (d1 == 0 and sur_segment(q1, q2, p1)) or (d2 == 0 and sur_segment(q1, q2, p2))
+        or (d3 == 0 and sur_segment(p1, p2, q1)) or (d4 == 0 and sur_segment(p1, p2, q2))
+    )
+
+
+def polygones_se_chevauchent(a, b) -> bool:
+    """
+    Deux polygones (anneaux de points [lon, lat]) ont une partie commune : deux bords se
+    coupent, ou l'un contient un sommet de l'autre (inclusion complète).
+    """
+    if not a or not b or not a[0] or not b[0]:
+        return False
+    for anneau_a in a:
+        for pa1, pa2 in zip(anneau_a, list(anneau_a[1:]) + list(anneau_a[:1])):
+            for anneau_b in b:
+                for pb1, pb2 in zip(anneau_b, list(anneau_b[1:]) + list(anneau_b[:1])):
+                    if segments_se_coupent(pa1, pa2, pb1, pb2):
+                        return True
+    return (
+        point_dans_polygone(float(a[0][0][0]), float(a[0][0][1]), b)
+        or point_dans_polygone(float(b[0][0][0]), float(b[0][0][1]), a)
+    )
@@ -0,0 +1,44 @@
+import re
+import datetime
+import unicodedata
+
+# Formats de date rencontrés dans les saisies terrain
+FORMATS_DATE = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%y")
+
+def normaliser_nom(valeur: str) -> str:
+    """'  Éloïse-Marie ' -> 'eloise marie' (sans accents, casse repliée, séparateurs unifiés)"""
+    if not valeur:
+        return ""
+    decompose = unicodedata.normalize("NFKD", valeur)
+    sans_accents = "".join(c for c in decompose if not unicodedata.combining(c))
+    return re.sub(r"[\W_]+", " ", sans_accents.casefold()).strip()
+
+def normaliser_date(valeur: str):
+    """Retourne un datetime.date, ou None si la chaîne n'est pas une date reconnue"""
+    if not valeur:
+        return None
+    valeur = valeur.strip()
+    for fmt in FORMATS_DATE:
+        try:
+            return datetime.datetime.strptime(valeur, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def annee_naissance(valeur: str):
+    """Année d'une date reconnue, ou d'une saisie limitée à l'année ('1987')"""
+    date = normaliser_date(valeur)
+    if date:
+        return date.year
+    if valeur and re.fullmatch(r"\s*\d{4}\s*", valeur):
+        return int(valeur)
+    return None
+
+def cle_identite(first_name: str, last_name: str, date_of_birth: str) -> str:
+    """
+    Clé de regroupement des doublons : nom|prénom|date ISO.
+    Une date non reconnue est gardée telle quelle (normalisée) pour ne pas fusionner des groupes distincts.
+    """
+    date = normaliser_date(date_of_birth)
+    date_cle = date.isoformat() if date else normaliser_nom(date_of_birth)
+    return f"{normaliser_nom(last_name)}|{normaliser_nom(first_name)}|{date_cle}"
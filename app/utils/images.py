@@ -0,0 +1,67 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from app.utils.files import UPLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+DERIVES_DIR = os.path.join(UPLOAD_DIR, "derives")
+os.makedirs(DERIVES_DIR, exist_ok=True)
+
+# Côté le plus long (en pixels) de chaque dérivé
+TAILLES = {"miniature": 240, "moyenne": 960}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 72, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 75, "optimize": True, "progressive": True}),
+}
+
+_pool = None
+
+def chemin_derive(filename: str, taille: str, fmt: str) -> str:
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(DERIVES_DIR, f"{stem}_{taille}.{fmt}")
+
+def generer_derives(filename: str) -> list:
+    """Crée toutes les tailles/formats d'une photo (exécuté dans un processus du pool)"""
+    crees = []
+    with Image.open(os.path.join(UPLOAD_DIR, filename)) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for taille, cote in TAILLES.items():
+            copie = img.copy()
+            copie.thumbnail((cote, cote))
+            for fmt, (format_pil, options) in FORMATS.items():
+                destination = chemin_derive(filename, taille, fmt)
+                tmp = f"{destination}.{os.getpid()}.part"
+                copie.save(tmp, format_pil, **options)
+                os.replace(tmp, destination)  # jamais de dérivé à moitié écrit
+                crees.append(destination)
+    return crees
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=int(os.getenv("IMAGE_WORKERS", "2")))
+    return _pool
+
+def _journaliser_echec(future):
+    if future.exception():
+        logger.warning("Génération des dérivés impossible : %s", future.exception())
+
+def planifier_derives(filename: str):
+    """Lance la génération des dérivés en arrière-plan, sans attendre le résultat"""
+    _get_pool().submit(generer_derives, filename).add_done_callback(_journaliser_echec)
+
+async def obtenir_derive(filename: str, taille: str, fmt: str) -> str:
+    """Retourne le chemin du dérivé, en le générant à la demande (anciennes photos)"""
+    chemin = chemin_derive(filename, taille, fmt)
+    if not os.path.exists(chemin):
+        await asyncio.get_running_loop().run_in_executor(_get_pool(), generer_derives, filename)
+    return chemin
+
+def arreter_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,116 @@
+"""
+Budget de requêtes SQL par route, pour repérer les N+1 dans les tests.
+
+Une route déclare le nombre maximal d'instructions SQL qu'elle peut émettre,
+quel que soit le volume de données :
+
+    @router.get("/familles/")
+    @budget_requetes(6)
+    def page_familles(...): ...
+
+Dans les tests, activer_budgets(app) remplace database.get_db, database.get_read_db et
+database.get_async_db : la session de la requête est liée à une connexion dédiée dont les
+instructions sont comptées, et la requête échoue avec QueryBudgetExceeded (SQL fautif inclus)
+si le budget est dépassé. Les routes async (get_async_db) sont comptées de la même façon.
+
+    activer_budgets(app)
+    client = TestClient(app)   # raise_server_exceptions=True par défaut
+    ...
+    desactiver_budgets(app)
+
+Voir tests/test_budgets_requetes.py : chaque route budgétée est appelée avec 1 puis N familles.
+
+Hors tests, les budgets ne coûtent rien : seul un attribut est posé sur la fonction.
+"""
+from fastapi import Request
+from sqlalchemy import event
+from app import database
+
+ATTRIBUT_BUDGET = "__budget_requetes__"
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, route: str, budget: int, instructions: list):
+        self.route, self.budget, self.instructions = route, budget, instructions
+        detail = "\n".join(f"  {i + 1}. {sql}" for i, sql in enumerate(instructions))
+        super().__init__(f"{route} : {len(instructions)} requêtes SQL pour un budget de {budget}\n{detail}")
+
+
+def budget_requetes(maximum: int):
+    """Déclare le nombre maximal d'instructions SQL de la route décorée"""
+    def decorator(func):
+        setattr(func, ATTRIBUT_BUDGET, maximum)
+        return func
+    return decorator
+
+
+def budget_de_la_route(request: Request, defaut: int = None):
+    route = request.scope.get("route")
+    endpoint = getattr(route, "endpoint", None)
+    return getattr(endpoint, ATTRIBUT_BUDGET, defaut)
+
+
+def _instructions_de_la_requete(request: Request) -> list:
+    # Liste partagée par les sessions de la requête (get_db pour l'authentification, get_read_db…)
+    if not hasattr(request.state, "instructions_sql"):
+        request.state.instructions_sql = []
+    return request.state.instructions_sql
+
+
+def _compteur(instructions: list):
+    def compter(conn, cursor, statement, parameters, context, executemany):
+        instructions.append(" ".join(statement.split()))
+    return compter
+
+
+def _verifier_budget(request: Request, defaut: int, instructions: list):
+    budget = budget_de_la_route(request, defaut)
+    if budget is not None and len(instructions) > budget:
+        raise QueryBudgetExceeded(getattr(request.scope.get("route"), "path", request.url.path), budget, instructions)
+
+
+def get_db_avec_budget(defaut: int = None):
+    """Fabrique la dépendance qui remplace database.get_db ; `defaut` s'applique aux routes sans budget"""
+    def get_db(request: Request):
+        instructions = _instructions_de_la_requete(request)
+        compter = _compteur(instructions)
+        connexion = database.engine.connect()
+        event.listen(connexion, "before_cursor_execute", compter)
+        db = database.SessionLocal(bind=connexion)
+        try:
+            yield db
+        finally:
+            db.close()
+            event.remove(connexion, "before_cursor_execute", compter)
+            connexion.close()
+        _verifier_budget(request, defaut, instructions)
+    return get_db
+
+
+def get_async_db_avec_budget(defaut: int = None):
+    """Même chose pour database.get_async_db (routes async)"""
+    async def get_async_db(request: Request):
+        instructions = _instructions_de_la_requete(request)
+        compter = _compteur(instructions)
+        async with database.get_async_engine().connect() as connexion:
+            event.listen(connexion.sync_connection, "before_cursor_execute", compter)
+            try:
+                async with database.AsyncSessionLocal(bind=connexion) as db:
+                    yield db
+            finally:
+                event.remove(connexion.sync_connection, "before_cursor_execute", compter)
+        _verifier_budget(request, defaut, instructions)
+    return get_async_db
+
+
+def activer_budgets(app, defaut: int = None):
+    get_db = get_db_avec_budget(defaut)
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[database.get_read_db] = get_db
+    app.dependency_overrides[database.get_async_db] = get_async_db_avec_budget(defaut)
+
+
+def desactiver_budgets(app):
+    app.dependency_overrides.pop(database.get_db, None)
+    app.dependency_overrides.pop(database.get_read_db, None)
+    app.dependency_overrides.pop(database.get_async_db, None)
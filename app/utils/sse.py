@@ -0,0 +1,40 @@
+import json
+import asyncio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+# Commentaire périodique : garde la connexion ouverte derrière les proxys
+HEARTBEAT_SECONDS = 15
+
+
+def reponse_sse(request: Request, ouvrir, heartbeat: float = HEARTBEAT_SECONDS) -> StreamingResponse:
+    """
+    Flux Server-Sent Events. `ouvrir()` (fonction ou coroutine) est appelée au début du flux et
+    retourne (file, fin) : chaque élément de `file` est un dict (événement "message") ou un
+    tuple (nom d'événement, dict) ; `fin()` est appelée à la déconnexion.
+    """
+    async def evenements():
+        ouverture = ouvrir()
+        if asyncio.iscoroutine(ouverture):
+            ouverture = await ouverture
+        file, fin = ouverture
+        try:
+            while not await request.is_disconnected():
+                try:
+                    element = await asyncio.wait_for(file.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if isinstance(element, tuple):
+                    nom, donnees = element
+                    yield f"event: {nom}\ndata: {json.dumps(donnees)}\n\n"
+                else:
+                    yield f"data: {json.dumps(element)}\n\n"
+        finally:
+            fin()
+
+    return StreamingResponse(
+        evenements(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
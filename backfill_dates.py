@@ -0,0 +1,52 @@
+import csv
+from sqlalchemy import text, update
+from app.database import SessionLocal
+from app.models import Famille, Membre
+from app.utils.identite import normaliser_date, annee_naissance
+
+TAILLE_LOT = 1000
+RAPPORT_CSV = "dates_non_reconnues.csv"
+
+def backfill_dates(modele) -> list:
+    """Analyse date_of_birth par lots de TAILLE_LOT ; retourne les valeurs non reconnues (table, id, valeur)"""
+    table = modele.__tablename__
+    db = SessionLocal()
+    dernier_id, total, non_reconnues = 0, 0, []
+    while True:
+        lot = db.execute(
+            text(f"SELECT id, date_of_birth FROM {table} WHERE id > :dernier ORDER BY id LIMIT :n"),
+            {"dernier": dernier_id, "n": TAILLE_LOT},
+        ).all()
+        if not lot:
+            break
+        lignes = []
+        for ligne in lot:
+            date, annee = normaliser_date(ligne.date_of_birth), annee_naissance(ligne.date_of_birth)
+            if ligne.date_of_birth and ligne.date_of_birth.strip() and annee is None:
+                non_reconnues.append((table, ligne.id, ligne.date_of_birth))
+            lignes.append({"id": ligne.id, "birth_date": date, "birth_year": annee})
+        db.execute(update(modele), lignes)
+        db.commit()
+        dernier_id = lot[-1].id
+        total += len(lot)
+        print(f"… {table} : {total} lignes traitées")
+    db.close()
+    print(f"✅ {table} : dates renseignées pour {total} lignes")
+    return non_reconnues
+
+def rapporter(non_reconnues: list):
+    """Les dates dont même l'année est illisible restent en texte ; la liste est écrite en CSV pour correction manuelle"""
+    if not non_reconnues:
+        print("✅ Toutes les dates de naissance ont été reconnues")
+        return
+    with open(RAPPORT_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["table", "id", "date_of_birth"])
+        writer.writerows(non_reconnues)
+    print(f"⚠️ {len(non_reconnues)} dates non reconnues (détail dans {RAPPORT_CSV}), exemples :")
+    for table, id_, valeur in non_reconnues[:10]:
+        print(f"   {table}#{id_} : {valeur!r}")
+
+# À lancer une fois après `alembic upgrade head` (qui ajoute les colonnes et index) : python backfill_dates.py
+if __name__ == "__main__":
+    rapporter(backfill_dates(Famille) + backfill_dates(Membre))
@@ -0,0 +1,33 @@
+from sqlalchemy import text, update
+from app.database import SessionLocal
+from app.models import Membre
+from app.utils.identite import cle_identite
+
+TAILLE_LOT = 1000
+
+def backfill_identity_keys():
+    """Calcule identity_key par lots de TAILLE_LOT membres (parcours par id croissant)"""
+    db = SessionLocal()
+    dernier_id, total = 0, 0
+    while True:
+        lot = db.execute(
+            text("SELECT id, first_name, last_name, date_of_birth FROM membres "
+                 "WHERE id > :dernier ORDER BY id LIMIT :n"),
+            {"dernier": dernier_id, "n": TAILLE_LOT},
+        ).all()
+        if not lot:
+            break
+        db.execute(update(Membre), [
+            {"id": m.id, "identity_key": cle_identite(m.first_name, m.last_name, m.date_of_birth)}
+            for m in lot
+        ])
+        db.commit()
+        dernier_id = lot[-1].id
+        total += len(lot)
+        print(f"… {total} membres traités")
+    db.close()
+    print(f"✅ identity_key renseignée pour {total} membres")
+
+# À lancer une fois après `alembic upgrade head` (qui ajoute les colonnes et index) : python backfill_identity.py
+if __name__ == "__main__":
+    backfill_identity_keys()
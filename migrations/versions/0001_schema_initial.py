@@ -0,0 +1,160 @@
+"""Schéma initial (tables jusqu'ici créées par Base.metadata.create_all)
+
+Les bases déjà en service ont été créées par create_all puis complétées par
+backfill_identity.py / backfill_dates.py : seules les tables et colonnes
+absentes sont ajoutées, la migration peut donc s'appliquer sur une base existante.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _colonnes(table):
+    return {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    tables = _tables()
+
+    if "provinces" not in tables:
+        op.create_table(
+            "provinces",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("nom", sa.String, nullable=False, unique=True),
+        )
+        op.create_index("ix_provinces_id", "provinces", ["id"])
+
+    if "utilisateurs" not in tables:
+        op.create_table(
+            "utilisateurs",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("username", sa.String, nullable=False),
+            sa.Column("hashed_password", sa.String, nullable=False),
+            sa.Column("role", sa.String, nullable=False),
+            sa.Column("province_id", sa.Integer, sa.ForeignKey("provinces.id"), nullable=True),
+        )
+        op.create_index("ix_utilisateurs_id", "utilisateurs", ["id"])
+        op.create_index("ix_utilisateurs_username", "utilisateurs", ["username"], unique=True)
+
+    if "familles" not in tables:
+        op.create_table(
+            "familles",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String, nullable=False),
+            sa.Column("first_name", sa.String),
+            sa.Column("last_name", sa.String),
+            sa.Column("date_of_birth", sa.String),
+            sa.Column("birth_date", sa.Date),
+            sa.Column("birth_year", sa.Integer),
+            sa.Column("gender", sa.String),
+            sa.Column("nationality", sa.String),
+            sa.Column("id_type", sa.String),
+            sa.Column("id_number", sa.String),
+            sa.Column("place_of_birth", sa.String),
+            sa.Column("province", sa.String),
+            sa.Column("city", sa.String),
+            sa.Column("district", sa.String),
+            sa.Column("localisation", sa.String),
+            sa.Column("latitude", sa.Float),
+            sa.Column("longitude", sa.Float),
+            sa.Column("photo_path", sa.String),
+            sa.Column("duree_remplissage", sa.Integer),
+            sa.Column("is_validated", sa.Boolean),
+            sa.Column("is_synced", sa.Boolean),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("created_by_id", sa.Integer, sa.ForeignKey("utilisateurs.id"), nullable=True),
+        )
+        op.create_index("ix_familles_id", "familles", ["id"])
+        op.create_index("ix_familles_name", "familles", ["name"])
+
+    if "membres" not in tables:
+        op.create_table(
+            "membres",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("first_name", sa.String, nullable=False),
+            sa.Column("last_name", sa.String, nullable=False),
+            sa.Column("role", sa.String),
+            sa.Column("date_of_birth", sa.String),
+            sa.Column("birth_date", sa.Date),
+            sa.Column("birth_year", sa.Integer),
+            sa.Column("gender", sa.String),
+            sa.Column("nationality", sa.String),
+            sa.Column("id_type", sa.String),
+            sa.Column("id_number", sa.String),
+            sa.Column("place_of_birth", sa.String),
+            sa.Column("province", sa.String),
+            sa.Column("city", sa.String),
+            sa.Column("district", sa.String),
+            sa.Column("identity_key", sa.String),
+            sa.Column("famille_id", sa.Integer, sa.ForeignKey("familles.id"), nullable=False),
+        )
+        op.create_index("ix_membres_id", "membres", ["id"])
+
+    if "zones" not in tables:
+        op.create_table(
+            "zones",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("utilisateur_id", sa.Integer, sa.ForeignKey("utilisateurs.id"), nullable=False),
+            sa.Column("geometrie", sa.JSON, nullable=False),
+        )
+        op.create_index("ix_zones_id", "zones", ["id"])
+
+    if "candidats_doublons" not in tables:
+        op.create_table(
+            "candidats_doublons",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("membre_a_id", sa.Integer, sa.ForeignKey("membres.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("membre_b_id", sa.Integer, sa.ForeignKey("membres.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("score", sa.Float, nullable=False),
+            sa.Column("score_nom", sa.Float),
+            sa.Column("score_date", sa.Float),
+            sa.Column("statut", sa.String, nullable=False),
+            sa.Column("created_at", sa.DateTime),
+            sa.UniqueConstraint("membre_a_id", "membre_b_id"),
+        )
+        op.create_index("ix_candidats_doublons_id", "candidats_doublons", ["id"])
+        op.create_index("ix_candidats_doublons_membre_a_id", "candidats_doublons", ["membre_a_id"])
+        op.create_index("ix_candidats_doublons_membre_b_id", "candidats_doublons", ["membre_b_id"])
+        op.create_index("ix_candidats_doublons_score", "candidats_doublons", ["score"])
+
+    if "statistiques_agregats" not in tables:
+        op.create_table(
+            "statistiques_agregats",
+            sa.Column("dimension", sa.String, primary_key=True),
+            sa.Column("valeur", sa.String, primary_key=True),
+            sa.Column("total", sa.Integer, nullable=False),
+            sa.Column("updated_at", sa.DateTime),
+        )
+
+    # Colonnes ajoutées après coup (auparavant par les scripts backfill_*.py)
+    for table, colonne, type_ in (
+        ("membres", "identity_key", sa.String),
+        ("membres", "birth_date", sa.Date),
+        ("membres", "birth_year", sa.Integer),
+        ("familles", "birth_date", sa.Date),
+        ("familles", "birth_year", sa.Integer),
+    ):
+        if colonne not in _colonnes(table):
+            op.add_column(table, sa.Column(colonne, type_, nullable=True))
+
+    op.create_index("ix_membres_identity_key", "membres", ["identity_key"], if_not_exists=True)
+    for table in ("familles", "membres"):
+        op.create_index(f"ix_{table}_birth_date", table, ["birth_date"], if_not_exists=True)
+        op.create_index(f"ix_{table}_birth_year", table, ["birth_year"], if_not_exists=True)
+
+
+def downgrade():
+    for table in ("statistiques_agregats", "candidats_doublons", "zones", "membres", "familles", "utilisateurs", "provinces"):
+        op.drop_table(table)
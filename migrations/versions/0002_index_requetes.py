@@ -0,0 +1,52 @@
+"""Index des requêtes fréquentes (listes, filtres, synchronisation, doublons)
+
+Déclarés aussi dans app/models.py. Vérification du plan : python verifier_index.py
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (nom, table, colonnes ou expressions)
+INDEX = [
+    # Clés étrangères parcourues par les jointures et les chargements de relations
+    ("ix_membres_famille_id", "membres", ["famille_id"]),
+    ("ix_familles_created_by_id", "familles", ["created_by_id"]),
+    ("ix_zones_utilisateur_id", "zones", ["utilisateur_id"]),
+    # Liste paginée /familles (keyset created_at desc, id desc), avec ou sans filtre agent
+    ("ix_familles_created_at_id", "familles", ["created_at", "id"]),
+    ("ix_familles_agent_created_at_id", "familles", ["created_by_id", "created_at", "id"]),
+    # Filtres insensibles à la casse : func.lower(colonne) == valeur.lower()
+    ("ix_familles_lower_province", "familles", [sa.text("lower(province)")]),
+    ("ix_familles_lower_city", "familles", [sa.text("lower(city)")]),
+    ("ix_familles_lower_district", "familles", [sa.text("lower(district)")]),
+    ("ix_membres_lower_province", "membres", [sa.text("lower(province)")]),
+    ("ix_membres_lower_city", "membres", [sa.text("lower(city)")]),
+    # File de revue des candidats doublons
+    ("ix_candidats_doublons_statut_score", "candidats_doublons", ["statut", sa.text("score DESC"), "id"]),
+]
+
+
+def upgrade():
+    for nom, table, colonnes in INDEX:
+        op.create_index(nom, table, colonnes, if_not_exists=True)
+
+    # Index partiel : seules les familles non synchronisées y figurent, il reste petit
+    op.create_index(
+        "ix_familles_non_synchronisees", "familles", ["created_by_id", "id"],
+        postgresql_where=sa.text("is_synced = false"), sqlite_where=sa.text("is_synced = 0"),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_familles_non_synchronisees", table_name="familles")
+    for nom, table, _ in reversed(INDEX):
+        op.drop_index(nom, table_name=table)
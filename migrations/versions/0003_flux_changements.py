@@ -0,0 +1,69 @@
+"""Flux de changements pour la synchronisation différentielle
+
+updated_at / change_seq sur familles et membres, compteur de changements,
+suppressions de familles et curseurs acquittés par appareil.
+Les lignes existantes reçoivent le numéro 1 : un appareil sans curseur les reçoit toutes.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("familles", "membres"):
+        with op.batch_alter_table(table) as batch:
+            batch.add_column(sa.Column("updated_at", sa.DateTime, nullable=True))
+            batch.add_column(sa.Column("change_seq", sa.BigInteger, nullable=True))
+    op.execute("UPDATE familles SET change_seq = 1, updated_at = created_at")
+    op.execute("UPDATE membres SET change_seq = 1")
+    op.create_index("ix_familles_change_seq_id", "familles", ["change_seq", "id"])
+
+    compteur = op.create_table(
+        "sync_compteur",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("valeur", sa.BigInteger, nullable=False),
+    )
+    op.bulk_insert(compteur, [{"id": 1, "valeur": 1}])
+
+    op.create_table(
+        "suppressions_sync",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("famille_id", sa.Integer, nullable=False),
+        sa.Column("created_by_id", sa.Integer, nullable=True),
+        sa.Column("latitude", sa.Float, nullable=True),
+        sa.Column("longitude", sa.Float, nullable=True),
+        sa.Column("change_seq", sa.BigInteger, nullable=False),
+        sa.Column("deleted_at", sa.DateTime),
+    )
+    op.create_index("ix_suppressions_sync_id", "suppressions_sync", ["id"])
+    op.create_index("ix_suppressions_sync_change_seq", "suppressions_sync", ["change_seq"])
+
+    op.create_table(
+        "curseurs_sync",
+        sa.Column("utilisateur_id", sa.Integer, sa.ForeignKey("utilisateurs.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("appareil", sa.String, primary_key=True),
+        sa.Column("change_seq", sa.BigInteger, nullable=False),
+        sa.Column("famille_id", sa.Integer, nullable=False),
+        sa.Column("updated_at", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("curseurs_sync")
+    op.drop_index("ix_suppressions_sync_change_seq", table_name="suppressions_sync")
+    op.drop_index("ix_suppressions_sync_id", table_name="suppressions_sync")
+    op.drop_table("suppressions_sync")
+    op.drop_table("sync_compteur")
+    op.drop_index("ix_familles_change_seq_id", table_name="familles")
+    for table in ("membres", "familles"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("change_seq")
+            batch.drop_column("updated_at")
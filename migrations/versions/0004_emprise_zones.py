@@ -0,0 +1,45 @@
+"""Emprise et superficie des zones
+
+Colonnes lon_min / lat_min / lon_max / lat_max / superficie_km2 sur zones, calculées
+depuis le GeoJSON pour les zones existantes (ensuite : models.maj_emprise_zone).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utils.geo import bbox, superficie_km2
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+COLONNES = ("lon_min", "lat_min", "lon_max", "lat_max", "superficie_km2")
+
+
+def upgrade():
+    with op.batch_alter_table("zones") as batch:
+        for nom in COLONNES:
+            batch.add_column(sa.Column(nom, sa.Float, nullable=True))
+    op.create_index("ix_zones_emprise", "zones", ["lon_min", "lat_min", "lon_max", "lat_max"])
+
+    zones = sa.table("zones", sa.column("id", sa.Integer), sa.column("geometrie", sa.JSON),
+                     *(sa.column(nom, sa.Float) for nom in COLONNES))
+    connexion = op.get_bind()
+    for zone_id, geometrie in connexion.execute(sa.select(zones.c.id, zones.c.geometrie)).all():
+        emprise = bbox(geometrie)
+        if emprise is None:
+            continue
+        connexion.execute(
+            zones.update().where(zones.c.id == zone_id)
+            .values(**dict(zip(COLONNES, (*emprise, superficie_km2(geometrie)))))
+        )
+
+
+def downgrade():
+    op.drop_index("ix_zones_emprise", table_name="zones")
+    with op.batch_alter_table("zones") as batch:
+        for nom in COLONNES:
+            batch.drop_column(nom)
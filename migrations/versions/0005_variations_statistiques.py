@@ -0,0 +1,31 @@
+"""Variations des agrégats statistiques entre deux recalculs
+
+Chaque écriture sur familles, membres ou utilisateurs ajoute ses variations (totaux,
+provinces, genres...) dans sa propre transaction : les tableaux de bord sont à jour sans
+attendre le planificateur, et sans ligne partagée à verrouiller.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "statistiques_variations",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("dimension", sa.String, nullable=False),
+        sa.Column("valeur", sa.String, nullable=False),
+        sa.Column("variation", sa.Integer, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("statistiques_variations")
@@ -48,8 +48,7 @@ function saveRecord(formElement) {
         };
         pendingFiles--;
         if (pendingFiles === 0) {
-          storeRecord(record);
-          sendToServer(record); // 🚀 envoi vers Render
+          storeRecord(record).then(syncPendingRecords); // 🚀 envoi vers Render
         }
       };
       reader.readAsDataURL(value);
@@ -59,33 +58,96 @@ function saveRecord(formElement) {
   }
 
   if (!hasFile) {
-    storeRecord(record);
-    sendToServer(record); // 🚀 envoi vers Render
+    storeRecord(record).then(syncPendingRecords); // 🚀 envoi vers Render
   }
 }
 
 function storeRecord(data) {
-  openDatabase().then(db => {
+  return openDatabase().then(db => new Promise((resolve, reject) => {
     const tx = db.transaction([STORE_NAME], 'readwrite');
     const store = tx.objectStore(STORE_NAME);
     store.add(data);
-    console.log("✅ Donnée enregistrée localement :", data);
-  });
+    tx.oncomplete = () => {
+      console.log("✅ Donnée enregistrée localement :", data);
+      resolve();
+    };
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+// 📋 Liste les enregistrements en attente avec leur clé IndexedDB
+function getAllRecords() {
+  return openDatabase().then(db => new Promise((resolve, reject) => {
+    const records = [];
+    const request = db.transaction([STORE_NAME], 'readonly').objectStore(STORE_NAME).openCursor();
+    request.onsuccess = event => {
+      const cursor = event.target.result;
+      if (cursor) {
+        records.push({ ...cursor.value, _key: cursor.key });
+        cursor.continue();
+      } else {
+        resolve(records);
+      }
+    };
+    request.onerror = () => reject(request.error);
+  }));
+}
+
+function deleteRecords(keys) {
+  return openDatabase().then(db => new Promise((resolve, reject) => {
+    const tx = db.transaction([STORE_NAME], 'readwrite');
+    const store = tx.objectStore(STORE_NAME);
+    keys.forEach(key => store.delete(key));
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+  }));
 }
 
-// 🚀 Nouvelle fonction : envoi vers ton API FastAPI (Render)
-async function sendToServer(data) {
+// 🚀 Envoie toute la file en un seul appel groupé (/api/sync/familles)
+// Les enregistrements avec photo passent encore par le formulaire multipart /familles/
+let syncEnCours = false;
+
+async function syncPendingRecords() {
+  if (syncEnCours || !navigator.onLine) return;
+  syncEnCours = true;
   try {
-    const response = await fetch("/api/force-sync", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(data)
-    });
-
-    if (!response.ok) throw new Error("Erreur serveur");
-    const result = await response.json();
-    console.log("✅ Donnée envoyée au serveur :", result);
+    const records = await getAllRecords();
+    const avecPhoto = records.filter(r => r.photo && r.photo.data);
+    const sansPhoto = records.filter(r => !(r.photo && r.photo.data));
+    const aSupprimer = [];
+
+    if (sansPhoto.length > 0) {
+      const lot = sansPhoto.map(({ _key, photo, ...champs }) => ({ ...champs, client_id: String(_key) }));
+      const response = await fetch('/api/sync/familles', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(lot)
+      });
+      if (!response.ok) throw new Error('Erreur serveur');
+      const result = await response.json();
+      result.resultats
+        .filter(r => r.statut === 'cree')
+        .forEach(r => aSupprimer.push(Number(r.client_id)));
+      console.log(`✅ ${result.crees} famille(s) synchronisée(s), ${result.erreurs} erreur(s)`);
+    }
+
+    for (const record of avecPhoto) {
+      const formData = new FormData();
+      Object.entries(record).forEach(([key, value]) => {
+        if (key !== '_key' && key !== 'photo') formData.append(key, value);
+      });
+      const blob = await (await fetch(record.photo.data)).blob();
+      formData.append('photo', blob, record.photo.name);
+      const response = await fetch('/familles/', { method: 'POST', body: formData });
+      if (response.ok) aSupprimer.push(record._key);
+    }
+
+    await deleteRecords(aSupprimer);
   } catch (err) {
-    console.warn("❌ Impossible d'envoyer au serveur, donnée gardée en local :", err);
+    console.warn("❌ Impossible d'envoyer au serveur, données gardées en local :", err);
+  } finally {
+    syncEnCours = false;
   }
 }
+
+window.addEventListener('online', syncPendingRecords);
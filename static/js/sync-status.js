@@ -63,11 +63,17 @@ document.addEventListener('DOMContentLoaded', () => {
   // 🔁 Forcer la synchronisation
   syncBtn.addEventListener('click', async () => {
     try {
-      const response = await fetch("/api/force-sync", { method: "POST" });
-      if (!response.ok) throw new Error("Erreur lors de la synchronisation");
+      // Traitement par lots côté serveur : rappeler tant que termine est faux
+      let apresId = 0, total = 0, data;
+      do {
+        const response = await fetch(`/api/force-sync?apres_id=${apresId}`, { method: "POST" });
+        if (!response.ok) throw new Error("Erreur lors de la synchronisation");
 
-      const data = await response.json();
-      alert(data.message);
+        data = await response.json();
+        total += data.familles;
+        apresId = data.dernier_id;
+      } while (!data.termine);
+      alert(`${total} familles synchronisées avec succès ✅`);
 
       // Recharger après synchro
       loadData();
@@ -76,9 +82,28 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
+  // 📡 Mises à jour poussées par le serveur (SSE) au lieu d'interroger /api/sync-status
+  const compteur = document.getElementById('en-attente-serveur')?.querySelector('strong');
+  let dernierCompte = null;
+  function suivreEtat() {
+    const source = new EventSource("/api/sync-status/stream");
+    source.onmessage = (event) => {
+      const etat = JSON.parse(event.data);
+      const enAttente = etat.totaux ? etat.totaux.en_attente : etat.en_attente;
+      if (compteur) compteur.textContent = etat.totaux
+        ? `${enAttente} (sur ${etat.totaux.familles} familles)`
+        : enAttente;
+      // Le nombre a changé : la liste détaillée est rechargée
+      if (dernierCompte !== null && enAttente !== dernierCompte) loadData();
+      dernierCompte = enAttente;
+    };
+    // EventSource se reconnecte seul après une coupure réseau
+  }
+
   // Initialisation
   updateConnectionStatus();
   loadData();
+  suivreEtat();
 
   window.addEventListener('online', updateConnectionStatus);
   window.addEventListener('offline', updateConnectionStatus);
@@ -0,0 +1,37 @@
+// 📡 Compteurs du tableau de bord mis à jour en direct (SSE /api/tableau-de-bord/stream)
+// Éléments concernés : data-compteur="familles", "membres", … ou "provinces.<nom>"
+document.addEventListener('DOMContentLoaded', () => {
+  if (!window.EventSource || !document.querySelector('[data-compteur]')) return;
+
+  let etat = null;
+
+  function valeur(chemin) {
+    return chemin.split('.').reduce((objet, cle) => (objet ? objet[cle] : undefined), etat);
+  }
+
+  function afficher() {
+    document.querySelectorAll('[data-compteur]').forEach((el) => {
+      const v = valeur(el.dataset.compteur);
+      if (v !== undefined) el.textContent = v;
+    });
+  }
+
+  function ajouter(cible, delta) {
+    Object.entries(delta).forEach(([cle, v]) => {
+      if (typeof v === 'object') ajouter(cible[cle] = cible[cle] || {}, v);
+      else cible[cle] = (cible[cle] || 0) + v;
+    });
+  }
+
+  const source = new EventSource('/api/tableau-de-bord/stream');
+  source.addEventListener('etat', (event) => {
+    etat = JSON.parse(event.data);
+    afficher();
+  });
+  source.addEventListener('delta', (event) => {
+    if (!etat) return;
+    ajouter(etat, JSON.parse(event.data));
+    afficher();
+  });
+  // EventSource se reconnecte seul ; un nouvel "etat" complet est reçu à la reconnexion
+});
@@ -67,22 +67,31 @@ async function syncPendingData() {
   const db = await openDB('rgpl-db', 1);
   const tx = db.transaction('pending', 'readonly');
   const store = tx.objectStore('pending');
+  const keys = await store.getAllKeys();
   const allData = await store.getAll();
 
-  for (const item of allData) {
-    try {
-      await fetch('/api/sync', {
-        method: 'POST',
-        body: JSON.stringify(item),
-        headers: {
-          'Content-Type': 'application/json'
-        }
-      });
-    } catch (err) {
-      console.error('Sync échoué pour un élément', err);
-    }
-  }
+  // Envoi groupé : un seul appel pour toute la file (les photos restent pour le formulaire)
+  const lot = allData
+    .map((item, i) => ({ ...item, client_id: String(keys[i]) }))
+    .filter(item => !(item.photo && item.photo.data));
+  if (lot.length === 0) return;
 
-  const clearTx = db.transaction('pending', 'readwrite');
-  clearTx.objectStore('pending').clear();
+  try {
+    const response = await fetch('/api/sync/familles', {
+      method: 'POST',
+      body: JSON.stringify(lot),
+      headers: {
+        'Content-Type': 'application/json'
+      }
+    });
+    if (!response.ok) throw new Error('Erreur serveur');
+    const result = await response.json();
+
+    const clearTx = db.transaction('pending', 'readwrite');
+    result.resultats
+      .filter(r => r.statut === 'cree')
+      .forEach(r => clearTx.objectStore('pending').delete(Number(r.client_id)));
+  } catch (err) {
+    console.error('Synchronisation groupée échouée', err);
+  }
 }
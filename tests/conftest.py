@@ -0,0 +1,84 @@
+"""
+Tests sur une base SQLite temporaire, schéma créé par les migrations Alembic.
+
+    python -m pytest -q
+
+Les variables sont posées avant le premier import de l'application (database.py lit
+DATABASE_URL à l'import ; load_dotenv ne remplace pas une variable déjà définie).
+"""
+import os
+import tempfile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='rgpl-tests-'), 'tests.db')}"
+os.environ["DATABASE_REPLICA_URL"] = ""
+os.environ.setdefault("SECRET_KEY", "cle-de-test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["BCRYPT_ROUNDS"] = "4"  # coût minimal : les tests ne mesurent pas bcrypt
+os.chdir(RACINE)  # alembic.ini, app/templates et static sont relatifs à la racine
+
+import pytest
+from alembic.config import main as alembic_main
+
+alembic_main(["-q", "upgrade", "head"])
+
+from fastapi.testclient import TestClient
+from app import models, security
+from app.database import SessionLocal
+from app.main import app as application
+from app.routers.auth import create_access_token
+
+
+@pytest.fixture(scope="session")
+def app():
+    yield application
+    security.arreter_pool()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def _utilisateur(username: str, role: str) -> models.Utilisateur:
+    session = SessionLocal()
+    try:
+        utilisateur = session.query(models.Utilisateur).filter_by(username=username).first()
+        if utilisateur is None:
+            # Le mot de passe n'est pas utilisé : les clients reçoivent directement un token
+            utilisateur = models.Utilisateur(username=username, hashed_password="-", role=role)
+            session.add(utilisateur)
+            session.commit()
+            session.refresh(utilisateur)
+        session.expunge(utilisateur)
+        return utilisateur
+    finally:
+        session.close()
+
+
+def _client(app, utilisateur: models.Utilisateur) -> TestClient:
+    client = TestClient(app)
+    client.cookies.set("access_token", create_access_token({"sub": utilisateur.username, "role": utilisateur.role}))
+    return client
+
+
+@pytest.fixture
+def superviseur():
+    return _utilisateur("superviseur-tests", "super_utilisateur")
+
+
+@pytest.fixture
+def agent():
+    return _utilisateur("agent-tests", "agent")
+
+
+@pytest.fixture
+def client(app, superviseur):
+    return _client(app, superviseur)
+
+
+@pytest.fixture
+def client_agent(app, agent):
+    return _client(app, agent)
@@ -0,0 +1,92 @@
+"""
+Budgets de requêtes SQL (app/utils/query_budget.py) : chaque route budgétée est appelée
+avec 1 puis N familles ; le nombre d'instructions ne doit pas croître avec les données.
+Les routes à paramètre reçoivent les identifiants créés par peupler().
+"""
+import pytest
+from app import index_zones, models
+from app.utils.query_budget import ATTRIBUT_BUDGET, QueryBudgetExceeded, activer_budgets, desactiver_budgets
+
+# Zone de l'agent (Libreville) et point à l'intérieur
+ZONE = {"type": "Polygon", "coordinates": [[[9.4, 0.35], [9.5, 0.35], [9.5, 0.45], [9.4, 0.45], [9.4, 0.35]]]}
+LON, LAT = 9.45, 0.39
+
+ROUTES = [
+    "/familles/",
+    "/familles/json",
+    "/familles/{famille_id}",
+    "/familles/{famille_id}/members",
+    "/page-familles",
+    "/doublons/",
+    "/doublons/api",
+    "/doublons/candidats",
+    "/api/sync/changements",
+    "/zones-attribuees",
+    f"/api/zones/contenant?lon={LON}&lat={LAT}",
+    "/api/zones/{zone_id}/chevauchements",
+]
+
+
+@pytest.fixture
+def budgets(app):
+    activer_budgets(app)
+    yield
+    desactiver_budgets(app)
+
+
+def peupler(db, agent, superviseur, nb: int) -> dict:
+    """
+    `nb` familles de deux membres, en double d'une famille à l'autre (et paires candidates),
+    moitié agent moitié superviseur, plus une zone chevauchant ZONE par famille.
+    Retourne les identifiants attendus par les routes à paramètre.
+    """
+    zone = db.query(models.Zone).filter_by(utilisateur_id=agent.id).first()
+    if zone is None:
+        zone = models.Zone(utilisateur_id=agent.id, geometrie=ZONE)
+        db.add(zone)
+    precedent = None
+    for i in range(nb):
+        createur = agent if i % 2 else superviseur
+        famille = models.Famille(
+            name=f"Famille {i}", province="Estuaire", city="Libreville",
+            latitude=LAT, longitude=LON, created_by_id=createur.id,
+        )
+        db.add(famille)
+        db.flush()
+        membres = [
+            models.Membre(
+                famille_id=famille.id, first_name=prenom, last_name="Mba", date_of_birth="1990-01-01",
+                province="Estuaire", city="Libreville",
+            )
+            for prenom in ("Jean", "Marie")
+        ]
+        db.add_all(membres)
+        db.flush()
+        if precedent is not None:
+            db.add(models.CandidatDoublon(membre_a_id=precedent.id, membre_b_id=membres[0].id, score=0.9))
+        precedent = membres[0]
+        decalage = 0.001 * i
+        db.add(models.Zone(utilisateur_id=createur.id, geometrie={"type": "Polygon", "coordinates": [[
+            [LON + decalage, LAT], [LON + 0.1, LAT], [LON + 0.1, LAT + 0.1], [LON + decalage, LAT + 0.1], [LON + decalage, LAT],
+        ]]}))
+    db.commit()
+    return {"famille_id": famille.id, "zone_id": zone.id}
+
+
+@pytest.mark.parametrize("nb_familles", [1, 40])
+@pytest.mark.parametrize("route", ROUTES)
+def test_budget_respecte(budgets, db, agent, superviseur, client, client_agent, route, nb_familles):
+    ids = peupler(db, agent, superviseur, nb_familles)
+    for c in (client, client_agent):
+        index_zones.oublier()  # index spatial rechargé : sa lecture compte dans le budget
+        reponse = c.get(route.format(**ids))
+        assert reponse.status_code == 200, reponse.text
+
+
+def test_budget_depasse(budgets, app, db, agent, superviseur, client, monkeypatch):
+    peupler(db, agent, superviseur, 1)
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/doublons/api")
+    monkeypatch.setattr(route.endpoint, ATTRIBUT_BUDGET, 0)
+    with pytest.raises(QueryBudgetExceeded) as erreur:
+        client.get("/doublons/api")
+    assert "SELECT" in str(erreur.value)
@@ -0,0 +1,68 @@
+"""
+Routes async (database.get_async_db) : moteur asynchrone aiosqlite sur la base de test.
+"""
+import os
+import pytest
+from app import models
+from app.routers import familles
+from app.utils import files
+
+FORMULAIRE = {
+    "name": "Famille async", "first_name": "Paul", "last_name": "Ondo", "date_of_birth": "1985-03-12",
+    "gender": "M", "nationality": "Gabonaise", "id_type": "CNI", "id_number": "A123",
+    "place_of_birth": "Oyem", "province": "Woleu-Ntem", "city": "Oyem", "district": "Centre",
+}
+
+
+def test_creation_puis_familles_en_attente(client_agent, client, db, agent):
+    # Base partagée : les familles des autres tests ne doivent pas remplir la page (plus anciennes d'abord)
+    db.query(models.Famille).update({"is_synced": True})
+    db.commit()
+    reponse = client_agent.post("/familles/", data=FORMULAIRE)
+    assert reponse.status_code == 200, reponse.text
+    famille_id = reponse.json()["id"]
+
+    famille = db.get(models.Famille, famille_id)
+    assert famille.created_by_id == agent.id
+    assert [m.role for m in famille.membres] == ["Personne cible"]
+
+    en_attente = [f["id"] for f in client_agent.get("/api/pending-records").json()]
+    assert famille_id in en_attente
+    # Un superviseur voit les familles en attente de tous les agents
+    assert famille_id in [f["id"] for f in client.get("/api/pending-records").json()]
+
+
+def test_modification_famille_et_membre(client_agent, db):
+    famille_id = client_agent.post("/familles/", data=FORMULAIRE).json()["id"]
+
+    reponse = client_agent.post(f"/familles/{famille_id}/update", data={"name": "Famille renommée"}, follow_redirects=False)
+    assert reponse.status_code == 303, reponse.text
+
+    membre = {"first_name": "Léa", "last_name": "Ondo", "role": "Enfant", "city": "Oyem", "province": "Woleu-Ntem"}
+    reponse = client_agent.post(f"/familles/{famille_id}/members/form", data=membre, follow_redirects=False)
+    assert reponse.status_code == 303, reponse.text
+    membre_id = db.query(models.Membre.id).filter_by(famille_id=famille_id, first_name="Léa").scalar()
+
+    reponse = client_agent.post(
+        f"/familles/{famille_id}/members/{membre_id}/update", data={**membre, "city": "Bitam"}, follow_redirects=False,
+    )
+    assert reponse.status_code == 303, reponse.text
+
+    db.expire_all()
+    assert db.get(models.Famille, famille_id).name == "Famille renommée"
+    assert db.get(models.Membre, membre_id).city == "Bitam"
+
+
+def fichiers_temporaires() -> set:
+    return {nom for nom in os.listdir(files.UPLOAD_DIR) if nom.startswith(".upload_")}
+
+
+def test_photo_temporaire_supprimee_si_ecriture_echoue(client_agent, monkeypatch):
+    avant = fichiers_temporaires()
+
+    def echec():
+        raise RuntimeError("écriture interrompue")
+    monkeypatch.setattr(familles, "invalider_compteurs", echec)  # après le commit, avant le renommage
+    with pytest.raises(RuntimeError):
+        client_agent.post("/familles/", data=FORMULAIRE, files={"photo": ("photo.jpg", b"\xff\xd8" + b"0" * 1024, "image/jpeg")})
+    assert fichiers_temporaires() == avant
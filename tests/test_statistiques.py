@@ -0,0 +1,63 @@
+"""
+Compteurs des tableaux de bord : agrégats du planificateur + variations des écritures
+(deltas.py) ; une écriture est visible au chargement suivant, sans attendre le recalcul.
+"""
+import re
+import pytest
+from app import models, stats
+from app.database import SessionLocal
+
+
+def compteurs(client, page: str = "/home") -> dict:
+    reponse = client.get(page)
+    assert reponse.status_code == 200
+    return {cle: int(valeur) for cle, valeur in re.findall(r'data-compteur="([\w.]+)">(\d+)<', reponse.text)}
+
+
+@pytest.fixture
+def agregats_recalcules():
+    db = SessionLocal()
+    try:
+        stats.rafraichir_agregats(db)
+    finally:
+        db.close()
+
+
+def test_creation_visible_au_chargement_suivant(agregats_recalcules, client):
+    avant = compteurs(client)
+    familles = [
+        {"client_id": str(i), "name": f"Sync {i}", "membres": [
+            {"first_name": "Paul", "last_name": f"Nze {i}", "city": "Libreville", "province": "Estuaire"},
+        ]}
+        for i in range(3)
+    ]
+    assert client.post("/api/sync/familles", json=familles).json()["crees"] == 3
+
+    apres = compteurs(client)
+    assert apres["familles"] == avant["familles"] + 3
+    assert apres["membres"] == avant["membres"] + 3
+    assert apres["libreville"] == avant["libreville"] + 3
+
+
+def test_ajout_et_suppression_de_membre(agregats_recalcules, client, db):
+    famille = models.Famille(name="Famille membres")
+    db.add(famille)
+    db.commit()
+    avant = compteurs(client)
+
+    reponse = client.post(f"/familles/{famille.id}/members", json={"first_name": "Zoé", "last_name": "Koumba", "city": "Oyem"})
+    assert reponse.status_code == 200
+    assert compteurs(client)["membres"] == avant["membres"] + 1
+
+    client.post(f"/doublons/supprimer/{reponse.json()['id']}", follow_redirects=False)
+    assert compteurs(client)["membres"] == avant["membres"]
+
+
+def test_recalcul_absorbe_les_variations(agregats_recalcules, client, db):
+    client.post("/api/sync/familles", json=[{"client_id": "r", "name": "Recalcul", "membres": []}])
+    avant = compteurs(client)
+    assert db.query(models.VariationStatistique).count() > 0
+
+    stats.rafraichir_agregats(db)
+    assert db.query(models.VariationStatistique).count() == 0
+    assert compteurs(client) == avant
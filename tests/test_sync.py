@@ -0,0 +1,137 @@
+"""
+Synchronisation différentielle (/api/sync/changements, /api/sync/ack) : pagination keyset sur
+(change_seq, id), curseur de fin (ID_MAX), suppressions, acquittement et périmètre des agents.
+
+La base est partagée entre les tests : chaque test part de la fin du flux courant.
+"""
+import pytest
+from app import crud, models
+
+# Zone triangulaire de l'agent : (10.8, 1.8) est dans son emprise mais hors du triangle
+TRIANGLE = {"type": "Polygon", "coordinates": [[[10, 1], [11, 1], [10, 2], [10, 1]]]}
+DEDANS, EMPRISE_SEULE, DEHORS = (10.2, 1.2), (10.8, 1.8), (12.0, 3.0)
+
+
+def page(client, curseur=None, **params) -> dict:
+    if curseur:
+        params["curseur"] = curseur
+    reponse = client.get("/api/sync/changements", params=params)
+    assert reponse.status_code == 200, reponse.text
+    return reponse.json()
+
+
+def fin_du_flux(client, curseur=None) -> str:
+    """Curseur après le dernier changement visible"""
+    while True:
+        resultat = page(client, curseur, limit=500)
+        curseur = resultat["curseur"]
+        if not resultat["a_suivre"]:
+            return curseur
+
+
+def creer_familles(db, createur, positions) -> list:
+    """Familles créées dans une seule transaction (même numéro de changement), ids dans l'ordre"""
+    familles = [
+        models.Famille(name=f"Sync {i}", created_by_id=createur.id, longitude=lon, latitude=lat)
+        for i, (lon, lat) in enumerate(positions)
+    ]
+    db.add_all(familles)
+    db.commit()
+    return [famille.id for famille in familles]
+
+
+@pytest.fixture
+def zone_agent(db, agent):
+    zone = models.Zone(utilisateur_id=agent.id, geometrie=TRIANGLE)
+    db.add(zone)
+    db.commit()
+    yield zone
+    db.delete(zone)
+    db.commit()
+
+
+def test_pagination_keyset(client, db, superviseur):
+    curseur = fin_du_flux(client)
+    ids = creer_familles(db, superviseur, [DEHORS] * 5)
+
+    pages = []
+    while True:
+        resultat = page(client, curseur, limit=2)
+        pages.append(resultat)
+        curseur = resultat["curseur"]
+        if not resultat["a_suivre"]:
+            break
+
+    assert [len(p["familles"]) for p in pages] == [2, 2, 1]
+    assert [p["a_suivre"] for p in pages] == [True, True, False]
+    # Même numéro de changement pour les 5 : l'id départage, sans doublon ni trou
+    assert [f["id"] for p in pages for f in p["familles"]] == ids
+    assert len({f["change_seq"] for p in pages for f in p["familles"]}) == 1
+
+
+def test_curseur_de_fin(client, db, superviseur):
+    curseur = fin_du_flux(client)
+    change_seq, famille_id = crud.decode_curseur_sync(curseur)
+    assert famille_id == crud.ID_MAX
+
+    # Rien de neuf : page vide, curseur inchangé
+    resultat = page(client, curseur)
+    assert resultat == {"familles": [], "suppressions": [], "curseur": curseur, "a_suivre": False}
+
+    # Un changement postérieur a un numéro plus grand : il n'est pas masqué par ID_MAX
+    ids = creer_familles(db, superviseur, [DEHORS])
+    resultat = page(client, curseur)
+    assert [f["id"] for f in resultat["familles"]] == ids
+    assert crud.decode_curseur_sync(resultat["curseur"]) > (change_seq, famille_id)
+
+
+def test_suppression_et_modification_de_membre(client, db, superviseur):
+    famille_id, = creer_familles(db, superviseur, [DEHORS])
+    curseur = fin_du_flux(client)
+
+    # Un membre ajouté renvoie sa famille, avec le membre
+    reponse = client.post(f"/familles/{famille_id}/members", json={"first_name": "Ines", "last_name": "Obame"})
+    assert reponse.status_code == 200
+    resultat = page(client, curseur)
+    assert [f["id"] for f in resultat["familles"]] == [famille_id]
+    assert [m["first_name"] for m in resultat["familles"][0]["membres"]] == ["Ines"]
+    curseur = resultat["curseur"]
+
+    db.delete(db.get(models.Famille, famille_id))
+    db.commit()
+    resultat = page(client, curseur)
+    assert resultat["familles"] == []
+    assert resultat["suppressions"] == [famille_id]
+    assert page(client, resultat["curseur"])["suppressions"] == []
+
+
+def test_acquittement_ne_recule_jamais(client, db, superviseur):
+    appareil = "tablette-ack"
+    ancien = fin_du_flux(client)
+    creer_familles(db, superviseur, [DEHORS])
+    recent = fin_du_flux(client, ancien)
+
+    assert client.post("/api/sync/ack", json={"curseur": recent, "appareil": appareil}).json()["curseur"] == recent
+    # Page rejouée (réseau instable) : l'acquittement d'un curseur plus ancien est ignoré
+    assert client.post("/api/sync/ack", json={"curseur": ancien, "appareil": appareil}).json()["curseur"] == recent
+    # Sans curseur, la lecture reprend au dernier curseur acquitté par l'appareil
+    assert page(client, appareil=appareil)["curseur"] == recent
+
+    reponse = client.post("/api/sync/ack", json={"curseur": "invalide", "appareil": appareil})
+    assert reponse.status_code == 400
+
+
+def test_perimetre_agent(client, client_agent, db, agent, superviseur, zone_agent):
+    curseur_agent, curseur_superviseur = fin_du_flux(client_agent), fin_du_flux(client)
+    dedans, emprise_seule, dehors = creer_familles(db, superviseur, [DEDANS, EMPRISE_SEULE, DEHORS])
+    a_lui, = creer_familles(db, agent, [DEHORS])
+
+    # L'agent : ses familles et celles de ses zones (test exact, pas seulement l'emprise)
+    resultat = page(client_agent, curseur_agent)
+    assert [f["id"] for f in resultat["familles"]] == [dedans, a_lui]
+    assert [f["id"] for f in page(client, curseur_superviseur)["familles"]] == [dedans, emprise_seule, dehors, a_lui]
+
+    for famille_id in (dedans, dehors):
+        db.delete(db.get(models.Famille, famille_id))
+    db.commit()
+    assert page(client_agent, resultat["curseur"])["suppressions"] == [dedans]
@@ -0,0 +1,82 @@
+"""
+Vérifie que le planificateur utilise les index des requêtes fréquentes (migrations 0002 et 0003).
+
+    python verifier_index.py
+
+Chaque requête est passée à EXPLAIN (PostgreSQL) ou EXPLAIN QUERY PLAN (SQLite) et le plan
+doit mentionner l'index attendu. Sur PostgreSQL, enable_seqscan est désactivé pour la vérification :
+sur une petite base le parcours séquentiel gagne toujours, on vérifie ici que l'index est utilisable.
+Code de sortie 1 si un index n'est pas utilisé.
+"""
+import sys
+import datetime
+from sqlalchemy import func, text
+from app import models
+from app.database import SessionLocal
+
+
+def requetes(db):
+    """(description, requête, index attendu) — calquées sur crud.py, stats.py et les routeurs"""
+    Famille, Membre = models.Famille, models.Membre
+    page = lambda q: q.order_by(Famille.created_at.desc(), Famille.id.desc()).limit(21)
+    return [
+        ("/familles : page par défaut", page(db.query(Famille)), "ix_familles_created_at_id"),
+        ("/familles : filtre agent", page(db.query(Famille).filter(Famille.created_by_id == 1)), "ix_familles_agent_created_at_id"),
+        ("/familles : filtre province", page(db.query(Famille).filter(func.lower(Famille.province) == "estuaire")), "ix_familles_lower_province"),
+        ("/familles : filtre ville", page(db.query(Famille).filter(func.lower(Famille.city) == "libreville")), "ix_familles_lower_city"),
+        ("/familles : filtre quartier", page(db.query(Famille).filter(func.lower(Famille.district) == "akanda")), "ix_familles_lower_district"),
+        ("détail famille : membres", db.query(Membre).filter(Membre.famille_id == 1), "ix_membres_famille_id"),
+        ("synchronisation : familles en attente d'un agent",
+         db.query(Famille).filter(Famille.created_by_id == 1, Famille.is_synced == False), "ix_familles_non_synchronisees"),
+        ("synchronisation : en attente par agent (flux SSE)",
+         db.query(Famille.created_by_id, func.count()).filter(Famille.is_synced == False).group_by(Famille.created_by_id),
+         "ix_familles_non_synchronisees"),
+        ("synchronisation : flux de changements", db.query(Famille).filter(Famille.change_seq > 1)
+         .order_by(Famille.change_seq, Famille.id).limit(201), "ix_familles_change_seq_id"),
+        ("synchronisation : suppressions", db.query(models.SuppressionSync).filter(models.SuppressionSync.change_seq > 1),
+         "ix_suppressions_sync_change_seq"),
+        ("zones d'un agent", db.query(models.Zone).filter(models.Zone.utilisateur_id == 1), "ix_zones_utilisateur_id"),
+        ("zones : préfiltre par emprise", db.query(models.Zone.id).filter(
+            models.Zone.lon_min <= 9.45, models.Zone.lat_min <= 0.39,
+            models.Zone.lon_max >= 9.45, models.Zone.lat_max >= 0.39), "ix_zones_emprise"),
+        ("/doublons : groupes", db.query(Membre.identity_key).filter(Membre.identity_key > "")
+         .group_by(Membre.identity_key).order_by(Membre.identity_key).limit(51), "ix_membres_identity_key"),
+        ("/doublons : résolution par province", db.query(Membre.id).filter(func.lower(Membre.province) == "estuaire"), "ix_membres_lower_province"),
+        ("/doublons/candidats", db.query(models.CandidatDoublon).filter(models.CandidatDoublon.statut == "a_verifier")
+         .order_by(models.CandidatDoublon.score.desc(), models.CandidatDoublon.id).limit(51), "ix_candidats_doublons_statut_score"),
+        ("statistiques : année de naissance", db.query(func.count()).select_from(Membre).filter(Membre.birth_year == 1990), "ix_membres_birth_year"),
+        ("statistiques : depuis N ans", db.query(func.count()).select_from(Membre)
+         .filter(Membre.birth_year >= datetime.datetime.now().year - 18), "ix_membres_birth_year"),
+        ("statistiques : Libreville", db.query(func.count()).select_from(Membre).filter(func.lower(Membre.city) == "libreville"), "ix_membres_lower_city"),
+    ]
+
+
+def plan(db, requete) -> str:
+    dialecte = db.get_bind().dialect
+    sql = str(requete.statement.compile(dialect=dialecte, compile_kwargs={"literal_binds": True}))
+    if dialecte.name == "postgresql":
+        return "\n".join(ligne[0] for ligne in db.execute(text(f"EXPLAIN {sql}")))
+    return "\n".join(ligne[-1] for ligne in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def verifier() -> bool:
+    db = SessionLocal()
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+    ok = True
+    try:
+        for description, requete, index in requetes(db):
+            resultat = plan(db, requete)
+            if index in resultat:
+                print(f"✅ {description} : {index}")
+            else:
+                ok = False
+                print(f"❌ {description} : {index} non utilisé\n   {resultat.replace(chr(10), chr(10) + '   ')}")
+    finally:
+        db.rollback()
+        db.close()
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if verifier() else 1)